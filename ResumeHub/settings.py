@@ -45,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hub.middleware.PrecompressedStaticMiddleware',
+    'hub.middleware.MetricsMiddleware',
+    'hub.middleware.TextGZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'hub.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'ResumeHub.urls'
@@ -88,6 +92,72 @@ DATABASES = {
     }
 }
 
+# PRAGMA statements run on every new SQLite connection (hub.db.configure_sqlite)
+HUB_SQLITE_PRAGMAS = {}
+
+# Production database profile (HUB_DATABASE_PROFILE=production in the environment):
+# WAL (readers don't wait for writers), persistent connections, and the reads
+# of the read-only views from a replica copied by the sync_replica command
+if os.environ.get('HUB_DATABASE_PROFILE') == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['hub.routers.ReplicaRouter']
+
+    HUB_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        # with WAL only a power loss (not a crash) can lose the last commits
+        'synchronous': 'NORMAL',
+        # wait for locks instead of failing with "database is locked" (ms)
+        'busy_timeout': 5000,
+        # page cache per connection (negative: KiB)
+        'cache_size': -20000,
+        'temp_store': 'MEMORY',
+        'mmap_size': 256 * 1024 * 1024,
+    }
+
+# Views (URL names) whose reads go to the replica, if there's one
+HUB_REPLICA_VIEWS = ('hub:index', 'hub:resume', 'hub:about')
+
+# Seconds that fragments rendered from the replica stay in the cache
+# (about the interval of sync_replica, they may be behind the primary)
+HUB_REPLICA_CACHE_TIMEOUT = 60
+
+# Seconds that the reads of a client who wrote something go to the primary
+# (longer than the interval of sync_replica, so writers see their changes)
+HUB_READ_PRIMARY_AFTER_WRITE = 2 * 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# (use a shared cache like memcached when running several worker processes,
+# with LocMemCache the jobs of the queue run in the web processes)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'resume-hub',
+    }
+}
+
+# The production profile shares the cache between the web and run_workers processes
+if os.environ.get('HUB_DATABASE_PROFILE') == 'production':
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+
+# Seconds that a rendered resume page fragment stays in the cache
+HUB_RESUME_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds that a rendered feed card or comment stays in the cache
+# (keyed by what it shows, a changed one is rendered again)
+HUB_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -132,5 +202,76 @@ STATICFILES_DIRS = [
     STATIC_DIR,
 ]
 
+# collectstatic optimizes the images, fingerprints the file names and writes
+# .gz/.br siblings (Brotli package) of the text files, which
+# hub.middleware.PrecompressedStaticMiddleware serves from STATIC_ROOT
+# (the static_report command shows the bytes saved per page)
+if not DEBUG:
+    STATICFILES_STORAGE = 'hub.staticfiles.CompressedManifestStaticFilesStorage'
+
+# Seconds that browsers cache the static files without a fingerprint in their names
+# (fingerprinted ones are cached for a year, as immutable)
+HUB_STATIC_MAX_AGE = 60 * 60
+
+# Text responses smaller than this aren't gzipped (hub.middleware.TextGZipMiddleware, bytes);
+# the CSRF tokens in the pages are masked per response, which compression can't leak (BREACH)
+HUB_GZIP_MIN_BYTES = 1024
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Size limits of uploaded resume files and profile pictures (bytes)
+HUB_UPLOAD_MAX_RESUME_BYTES = 10 * 1024 * 1024
+HUB_UPLOAD_MAX_PICTURE_BYTES = 5 * 1024 * 1024
+
+# Resume downloads are handed off to the front web server with this header:
+# 'X-Accel-Redirect' (nginx, with an internal location at HUB_SENDFILE_URL_PREFIX
+# that aliases MEDIA_ROOT) or 'X-Sendfile' (Apache, lighttpd),
+# None streams the files from Django
+HUB_SENDFILE_HEADER = None
+HUB_SENDFILE_URL_PREFIX = '/protected-media/'
+
+
+# Background work
+# (text extraction and image processing are jobs of the queue in the database, see hub.jobs)
+
+# Number of worker processes of the run_workers command, 0 runs the jobs in
+# the web process right after the request's transaction (so does a cache that
+# isn't shared by the processes, see CACHES)
+HUB_JOB_WORKERS = 2
+
+# Failed jobs are retried after HUB_JOB_RETRY_DELAY seconds, doubled on each attempt
+# up to HUB_JOB_MAX_RETRY_DELAY; jobs running for longer than HUB_JOB_TIMEOUT seconds
+# are queued again (their worker died); done jobs are deleted after HUB_JOB_KEEP_DONE seconds
+HUB_JOB_RETRY_DELAY = 10
+HUB_JOB_MAX_RETRY_DELAY = 60 * 60
+HUB_JOB_TIMEOUT = 10 * 60
+HUB_JOB_KEEP_DONE = 24 * 60 * 60
+
+# Seconds that idle workers wait before looking for jobs again
+HUB_JOB_POLL_INTERVAL = 1
+
+# Limits of the text extraction from uploaded resume files
+HUB_EXTRACTION_MAX_BYTES = 20 * 1024 * 1024
+HUB_EXTRACTION_MAX_CHARS = 200000
+HUB_EXTRACTION_MAX_PDF_PAGES = 50
+
+# Similar resumes shown on the page of a resume (hub.similar, rebuilt by the
+# rebuild_similar_resumes command), and their minimum cosine similarity (0 to 1)
+HUB_SIMILAR_RESUMES = 5
+HUB_SIMILAR_MIN_SCORE = 0.1
+
+# Profile pictures with more pixels than this are rejected (decompression bombs)
+HUB_AVATAR_MAX_PIXELS = 40 * 1000 * 1000
+
+
+# Request metrics (hub.middleware.MetricsMiddleware, served at /metrics/)
+# Fraction of the requests whose SQL queries are captured (0 to 1),
+# the slowest HUB_METRICS_SLOW_REQUESTS of them are kept
+HUB_METRICS_SLOW_SAMPLE_RATE = 0.01
+HUB_METRICS_SLOW_REQUESTS = 20
+
+# Addresses (REMOTE_ADDR) that can read /metrics/ without logging in, like the
+# one of a Prometheus server; special users and staff always can. Loopback
+# addresses aren't trusted by default: behind a local proxy they are everyone.
+HUB_METRICS_ALLOWED_IPS = ()
@@ -3,4 +3,5 @@ from hub.models import *
 
 
 admin.site.register(UserProfile)
-admin.site.register(Comment)
\ No newline at end of file
+admin.site.register(Comment)
+admin.site.register(Job)
\ No newline at end of file
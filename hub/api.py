@@ -0,0 +1,201 @@
+'''
+Read-only JSON API (version 1) of the feed, resumes and comments
+
+Resources are built from .values() rows with only the columns of the
+requested fields (?fields=id,fullname,...), and every response has an
+ETag computed before the body (weak once gzipped), so If-None-Match
+requests of unchanged resources get a 304 without serializing anything.
+'''
+from django.conf import settings
+from django.http import HttpResponseNotModified, JsonResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
+from hub.models import *
+from hub.caching import resume_version, resume_versions
+from hub.conditional import make_etag
+from hub.feed import feed_queryset, keyset_page, clean_cursor, FEED_ORDERS, FEED_SIZE, COMMENTS_PAGE_SIZE
+from hub.images import avatar_name
+
+
+def media_url(name):
+    return settings.MEDIA_URL + name if name else None
+
+def full_name(first_name, last_name):
+    return ' '.join(name for name in (first_name, last_name) if name)
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+def picture_urls(picture, variants):
+    ''' URL of a picture and of its resized variants (once they exist, see hub.images) '''
+    if not picture:
+        return None
+
+    urls = {'original': media_url(picture)}
+    if variants == picture:
+        for slot in ('small', 'normal', 'big'):
+            urls[slot] = media_url(avatar_name(picture, slot, 'jpg'))
+
+    return urls
+
+
+# Fields of a resume: (columns of UserProfile.objects.values(), value of a row)
+RESUME_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'fullname': (('user__first_name', 'user__last_name'), lambda row: full_name(row['user__first_name'], row['user__last_name'])),
+    'summary': (('summary',), lambda row: row['summary']),
+    'description': (('description',), lambda row: row['description']),
+    'picture': (('picture', 'picture_variants'), lambda row: picture_urls(row['picture'], row['picture_variants'])),
+    'resume_url': (('id', 'resume_file'), lambda row: reverse('hub:download_resume', args=[row['id']]) if row['resume_file'] else None),
+    'comment_count': (('comment_count',), lambda row: row['comment_count']),
+    'last_comment_at': (('last_comment_at',), lambda row: isoformat(row['last_comment_at'])),
+    'updated_at': (('updated_at',), lambda row: isoformat(row['updated_at'])),
+}
+
+# Fields of the resumes of the feed unless ?fields= is given
+FEED_FIELDS = ('id', 'fullname', 'summary', 'picture', 'comment_count', 'last_comment_at', 'updated_at')
+
+# Fields of a comment: (columns of Comment.objects.values(), value of a row)
+COMMENT_FIELDS = {
+    'id': (('id',), lambda row: row['id']),
+    'fullname': (('user__first_name', 'user__last_name'), lambda row: full_name(row['user__first_name'], row['user__last_name'])),
+    'picture': (
+        ('user__userprofile__picture', 'user__userprofile__picture_variants'),
+        lambda row: picture_urls(row['user__userprofile__picture'], row['user__userprofile__picture_variants'])
+    ),
+    'content': (('content',), lambda row: row['content']),
+    'created_at': (('created_at',), lambda row: isoformat(row['created_at'])),
+}
+
+
+class FieldsError(ValueError):
+    ''' unknown fields in ?fields= '''
+
+
+def requested_fields(request, available, default):
+    ''' the fields of ?fields= (comma-separated) or default, raises FieldsError '''
+    fields = request.GET.get('fields')
+    if not fields:
+        return tuple(default)
+
+    fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise FieldsError('Unknown fields: {0}'.format(', '.join(unknown)))
+
+    return fields
+
+def columns(fields, available, *extra):
+    ''' the columns needed for the fields (and extra ones), each once '''
+    needed = list(extra)
+    for field in fields:
+        needed += available[field][0]
+
+    return list(dict.fromkeys(needed))
+
+def serialize(rows, fields, available):
+    getters = [(field, available[field][1]) for field in fields]
+    return [{field: getter(row) for field, getter in getters} for row in rows]
+
+def json_response(data, etag):
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+    response['ETag'] = etag
+    return response
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+def not_modified(request, etag):
+    '''
+    the 304 response if the client has this version, else None. The
+    comparison is weak: TextGZipMiddleware makes the ETags of the
+    compressed responses weak (W/"..."), the 304 returns the one the client has.
+    '''
+    for client_etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        if client_etag == '*' or strip_weak(client_etag) == strip_weak(etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = client_etag if client_etag != '*' else etag
+            return response
+
+    return None
+
+def strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def resumes(request):
+    '''
+    Pages of the feed: ?order= (recent, discussed, active), ?before= (the
+    next cursor of the previous page) and ?fields=
+    '''
+    order = request.GET.get('order', 'recent')
+    if order not in FEED_ORDERS:
+        return error_response('Unknown order: {0}'.format(order))
+
+    try:
+        fields = requested_fields(request, RESUME_FIELDS, FEED_FIELDS)
+    except FieldsError as error:
+        return error_response(str(error))
+
+    cursor = clean_cursor(request.GET.get('before'))
+    sort_field = FEED_ORDERS[order]
+
+    queryset = feed_queryset(order).values(*columns(fields, RESUME_FIELDS, 'id', 'updated_at', sort_field))
+    rows, next_cursor = keyset_page(queryset, sort_field, cursor, FEED_SIZE)
+
+    # names (and pictures) change without updated_at, the versions of the resume cache follow them too
+    versions = resume_versions([row['id'] for row in rows])
+    etag = make_etag('resumes', order, cursor, fields, next_cursor, [(row['id'], row['updated_at'], versions[row['id']]) for row in rows])
+
+    return not_modified(request, etag) or json_response({
+        'results': serialize(rows, fields, RESUME_FIELDS),
+        'next': next_cursor,
+    }, etag)
+
+def resume(request, user_profile_id):
+    ''' A resume (all fields unless ?fields= is given) '''
+    try:
+        fields = requested_fields(request, RESUME_FIELDS, RESUME_FIELDS)
+    except FieldsError as error:
+        return error_response(str(error))
+
+    # only the version first, the resource is loaded if the client doesn't have it
+    updated_at = UserProfile.objects.filter(pk=user_profile_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return error_response('Not found', status=404)
+
+    etag = make_etag('resume', user_profile_id, fields, updated_at, resume_version(user_profile_id))
+    response = not_modified(request, etag)
+    if response:
+        return response
+
+    row = UserProfile.objects.filter(pk=user_profile_id).values(*columns(fields, RESUME_FIELDS)).first()
+    if row is None:
+        return error_response('Not found', status=404)
+
+    return json_response(serialize([row], fields, RESUME_FIELDS)[0], etag)
+
+def comments(request, user_profile_id):
+    ''' Pages of the comments on a resume, newest first: ?after= (the next cursor) and ?fields= '''
+    try:
+        fields = requested_fields(request, COMMENT_FIELDS, COMMENT_FIELDS)
+    except FieldsError as error:
+        return error_response(str(error))
+
+    if not UserProfile.objects.filter(pk=user_profile_id).exists():
+        return error_response('Not found', status=404)
+
+    # comments (and their users) bump the version of the resume
+    cursor = clean_cursor(request.GET.get('after'))
+    etag = make_etag('comments', user_profile_id, cursor, fields, resume_version(user_profile_id))
+    response = not_modified(request, etag)
+    if response:
+        return response
+
+    queryset = Comment.objects.filter(resume_id=user_profile_id).values(*columns(fields, COMMENT_FIELDS, 'id', 'created_at'))
+    rows, next_cursor = keyset_page(queryset, 'created_at', cursor, COMMENTS_PAGE_SIZE)
+
+    return json_response({
+        'results': serialize(rows, fields, COMMENT_FIELDS),
+        'next': next_cursor,
+    }, etag)
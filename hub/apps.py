@@ -1,5 +1,25 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def seed_users(sender, plan=None, **kwargs):
+    ''' creates the specific users when the database is created (first migration of hub) '''
+    if plan and any(migration.app_label == 'hub' and migration.initial and not backwards for migration, backwards in plan):
+        from hub.models import init_users
+        init_users()
 
 
 class HubConfig(AppConfig):
     name = 'hub'
+
+    def ready(self):
+        # connect signal receivers
+        import hub.signals
+        # register the jobs (see hub.jobs)
+        import hub.tasks
+
+        post_migrate.connect(seed_users, sender=self)
+
+        from hub.db import configure_sqlite
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,15 @@
+'''
+Benchmarks of Resume Hub (run by the bench_* management commands)
+'''
+import math
+
+
+def percentile(values, percent):
+    ''' percentile of a list of numbers (nearest rank) '''
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(int(math.ceil(percent / 100 * len(values))) - 1, 0)
+
+    return values[rank]
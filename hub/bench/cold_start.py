@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+
+# Runs in a new Python process: loads the WSGI application and serves one request
+FIRST_REQUEST_SCRIPT = '''
+import io, json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ResumeHub.settings')
+from ResumeHub.wsgi import application
+loaded = time.time()
+
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2], 'wsgi.errors': io.StringIO()}
+setup_testing_defaults(environ)
+result = {}
+def start_response(status, headers, exc_info=None):
+    result['status'] = status
+body = b''.join(application(environ, start_response))
+served = time.time()
+
+print(json.dumps({'loaded': loaded, 'served': served, 'status': result['status'], 'bytes': len(body)}))
+'''
+
+
+def measure_cold_start(path='/', host='localhost'):
+    '''
+    Starts a new process that serves one request for path through
+    ResumeHub.wsgi.application, returns the seconds from process start to the
+    application being loaded and to the first response
+    '''
+    started = time.time()
+    output = subprocess.check_output(
+        [sys.executable, '-c', FIRST_REQUEST_SCRIPT, path, host],
+        cwd=settings.BASE_DIR,
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'ResumeHub.settings')),
+    )
+    result = json.loads(output.decode().strip().splitlines()[-1])
+
+    return {
+        'load': result['loaded'] - started,
+        'first_response': result['served'] - started,
+        'status': result['status'],
+        'bytes': result['bytes'],
+    }
@@ -0,0 +1,133 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from hub.models import *
+from hub.blobs import acquire
+from hub.counters import recount_comments
+from hub.search import search_enabled, rebuild_index
+from hub.storage import blob_storage
+
+
+# Usernames of the generated users start with this (see clear_dataset())
+USERNAME_PREFIX = 'bench_'
+
+# Password of the generated users
+PASSWORD = 'changeit'
+
+FIRST_NAMES = ('Ali', 'Sara', 'Reza', 'Maryam', 'John', 'Anna', 'Omid', 'Lena', 'Amir', 'Nina', 'Hossein', 'Eva')
+LAST_NAMES = ('Karimi', 'Smith', 'Ahmadi', 'Muller', 'Rahimi', 'Rossi', 'Tehrani', 'Novak', 'Moradi', 'Berg')
+WORDS = (
+    'python django developer engineer software backend frontend data analyst database sql linux '
+    'docker cloud testing research machine learning teacher student project team lead manager '
+    'design web mobile api security network university experience skills english persian java '
+    'javascript react performance cache search server deployment support writing teaching'
+).split()
+
+# Tiny PDF that every generated profile shares as resume file (a single blob)
+RESUME_PDF = b'%PDF-1.1\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+
+
+def zipf_weights(count, skew):
+    ''' weights of ranks 1..count of a Zipf distribution (skew 0 is uniform) '''
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+def sentence(rng, length):
+    ''' random text of `length` words, common words are more frequent '''
+    return ' '.join(rng.choices(WORDS, cum_weights=zipf_weights(len(WORDS), 1.0), k=length))
+
+
+def generate_dataset(users=1000, comments=10000, skew=1.1, seed=0, batch_size=500, progress=None):
+    '''
+    Bulk-creates users with profiles (and resume files) and comments on
+    their resumes. The number of comments per resume and per commenter
+    follows a Zipf distribution with the given skew, like real traffic
+    where a few resumes get most of the attention.
+    Returns the ids of the created profiles, most popular first.
+    '''
+    rng = random.Random(seed)
+    # hashing is slow on purpose, every user gets the same hash
+    password = make_password(PASSWORD)
+
+    start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    usernames = ['{0}{1:07d}'.format(USERNAME_PREFIX, start + i) for i in range(users)]
+
+    resume_name = blob_storage.save('resume.pdf', ContentFile(RESUME_PDF))
+
+    with transaction.atomic():
+        User.objects.bulk_create((
+            User(
+                username=username,
+                password=password,
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                email='{0}@example.com'.format(username),
+            )
+            for username in usernames
+        ), batch_size=batch_size)
+
+        # bulk_create() doesn't set the ids on all databases
+        user_ids = list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True))
+
+        profiles = []
+        for user_id in user_ids:
+            description = sentence(rng, rng.randint(10, 60))
+            profiles.append(UserProfile(
+                user_id=user_id,
+                resume_file=resume_name,
+                description=description,
+                summary=summarize(description),
+                resume_text=sentence(rng, rng.randint(200, 800)),
+                text_status=UserProfile.TEXT_DONE,
+            ))
+        UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+
+        # bulk_create() doesn't send the signals, count the references of the shared file here
+        acquire(resume_name)
+        Blob.objects.filter(name=resume_name).update(refcount=F('refcount') + len(user_ids) - 1)
+
+        profile_ids = list(UserProfile.objects.filter(user_id__in=user_ids).order_by('id').values_list('id', flat=True))
+        if progress:
+            progress('{0} users created'.format(len(profile_ids)))
+
+        # popular resumes and active commenters in random order
+        rng.shuffle(profile_ids)
+        commenter_ids = rng.sample(user_ids, len(user_ids))
+
+        resume_weights = zipf_weights(len(profile_ids), skew)
+        commenter_weights = zipf_weights(len(commenter_ids), skew)
+
+        created = 0
+        while created < comments:
+            count = min(batch_size, comments - created)
+            resumes = rng.choices(profile_ids, cum_weights=resume_weights, k=count)
+            commenters = rng.choices(commenter_ids, cum_weights=commenter_weights, k=count)
+            Comment.objects.bulk_create(
+                Comment(resume_id=resume_id, user_id=user_id, content=sentence(rng, rng.randint(3, 30)))
+                for resume_id, user_id in zip(resumes, commenters)
+            )
+            created += count
+            if progress:
+                progress('{0} comments created'.format(created))
+
+        # bulk_create() doesn't send post_save, count the comments at once
+        recount_comments(UserProfile.objects.filter(id__in=profile_ids))
+
+    if search_enabled():
+        rebuild_index(batch_size=batch_size, progress=progress and (lambda indexed: progress('{0} profiles indexed'.format(indexed))))
+
+    return profile_ids
+
+def clear_dataset():
+    ''' deletes the generated users (and their profiles and comments) '''
+    with transaction.atomic():
+        profiles = UserProfile.objects.filter(user__username__startswith=USERNAME_PREFIX)
+        Comment.objects.filter(resume__in=profiles).delete()
+        Comment.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+        deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    return deleted
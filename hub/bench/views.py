@@ -0,0 +1,241 @@
+import itertools
+import random
+import string
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from hub.models import *
+from hub.bench import percentile
+from hub.bench.dataset import WORDS
+
+
+class Scenario:
+    ''' requests of one view: name, how to build a request, whether it needs a logged-in user '''
+
+    def __init__(self, name, path, login=False, method='GET', data=None):
+        self.name = name
+        self.path = path
+        self.login = login
+        self.method = method
+        self.data = data
+
+    def request(self, rng, context):
+        ''' (method, path, data) of the next request '''
+        return self.method, self.path(rng, context), self.data(rng, context) if self.data else None
+
+
+def popular_resume(rng, context):
+    return rng.choices(context['profile_ids'], cum_weights=context['weights'])[0]
+
+SCENARIOS = [
+    Scenario('index', lambda rng, context: reverse('hub:index')),
+    Scenario('search', lambda rng, context: reverse('hub:search') + '?q=' + rng.choice(WORDS)),
+    Scenario('resume', lambda rng, context: reverse('hub:resume', args=[popular_resume(rng, context)])),
+    Scenario('comments', lambda rng, context: reverse('hub:comments', args=[popular_resume(rng, context)]) + '?format=json'),
+    Scenario('download_resume', lambda rng, context: reverse('hub:download_resume', args=[popular_resume(rng, context)])),
+    Scenario('register', lambda rng, context: reverse('hub:register')),
+    Scenario('login', lambda rng, context: reverse('hub:login')),
+    Scenario('about', lambda rng, context: reverse('hub:about')),
+    Scenario('dashboard', lambda rng, context: reverse('hub:dashboard'), login=True),
+    Scenario('change_profile_pic', lambda rng, context: reverse('hub:change_profile_pic'), login=True),
+    Scenario('change_password', lambda rng, context: reverse('hub:change_password'), login=True),
+    Scenario(
+        'comment', lambda rng, context: reverse('hub:comment'), login=True, method='POST',
+        data=lambda rng, context: {'resume_id': popular_resume(rng, context), 'content': ' '.join(rng.sample(WORDS, 8))}
+    ),
+]
+
+
+def summarize_timings(timings, elapsed, queries=None, errors=0):
+    ''' latency percentiles (ms), throughput (requests/s) and query counts of a view '''
+    milliseconds = [timing * 1000 for timing in timings]
+
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': percentile(milliseconds, 50),
+        'p95_ms': percentile(milliseconds, 95),
+        'p99_ms': percentile(milliseconds, 99),
+        'mean_ms': sum(milliseconds) / len(milliseconds) if milliseconds else None,
+        'throughput_rps': len(timings) / elapsed if elapsed else None,
+        'queries_mean': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+class ClientRunner:
+    '''
+    Runs the requests in this process through the Django test client
+    (one at a time), with the SQL queries of each request counted
+    '''
+
+    def __init__(self, user):
+        self.anonymous = Client(HTTP_HOST='localhost')
+        self.logged_in = Client(HTTP_HOST='localhost')
+        self.logged_in.force_login(user)
+
+    def run(self, scenario, rng, context, count, warmup):
+        client = self.logged_in if scenario.login else self.anonymous
+
+        for i in range(warmup):
+            self.send(client, *scenario.request(rng, context))
+
+        timings = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+
+        for i in range(count):
+            method, path, data = scenario.request(rng, context)
+            with CaptureQueriesContext(connection) as captured:
+                before = time.perf_counter()
+                status = self.send(client, method, path, data)
+                timings.append(time.perf_counter() - before)
+            queries.append(len(captured.captured_queries))
+            errors += status >= 400
+
+        return summarize_timings(timings, time.perf_counter() - started, queries, errors)
+
+    def send(self, client, method, path, data):
+        if method == 'POST':
+            response = client.post(path, data)
+        else:
+            response = client.get(path)
+
+        # read streamed responses (downloads) as a real client would
+        if response.streaming:
+            b''.join(response.streaming_content)
+        response.close()
+
+        return response.status_code
+
+
+class LiveRunner:
+    '''
+    Runs the requests against a running server (e.g. runserver or gunicorn)
+    from `concurrency` threads. Query counts aren't known from outside.
+    '''
+
+    def __init__(self, base_url, user, concurrency):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+
+        # a session of the user, so no login request (and password hashing) is needed
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+
+        self.csrf_token = ''.join(random.SystemRandom().choice(string.ascii_letters + string.digits) for i in range(64))
+        self.session_cookie = '{0}={1}'.format(settings.SESSION_COOKIE_NAME, session.session_key)
+
+    def run(self, scenario, rng, context, count, warmup):
+        requests = [scenario.request(rng, context) for i in range(warmup + count)]
+
+        for request in requests[:warmup]:
+            self.send(scenario, *request)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(lambda request: self.send(scenario, *request), requests[warmup:]))
+            elapsed = time.perf_counter() - started
+
+        timings = [timing for timing, status in results]
+        errors = sum(status >= 400 for timing, status in results)
+
+        return summarize_timings(timings, elapsed, errors=errors)
+
+    def send(self, scenario, method, path, data):
+        cookies = ['{0}={1}'.format(settings.CSRF_COOKIE_NAME, self.csrf_token)]
+        if scenario.login:
+            cookies.append(self.session_cookie)
+
+        body = urllib.parse.urlencode(data).encode() if data else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers={
+            'Cookie': '; '.join(cookies),
+            'X-CSRFToken': self.csrf_token,
+        })
+
+        # redirects are answers too (e.g. after posting a comment), don't follow them
+        opener = urllib.request.build_opener(NoRedirect)
+        before = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            status = error.code
+
+        return time.perf_counter() - before, status
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def benchmark_context(limit=1000):
+    '''
+    Resumes that the scenarios request, requested as often as they are
+    commented on (the most commented `limit` resumes)
+    '''
+    resumes = list(
+        UserProfile.objects.exclude(resume_file='')
+        .order_by('-comment_count', 'id')
+        .values_list('id', 'comment_count')[:limit]
+    )
+    if not resumes:
+        raise ValueError('There are no resumes to request, see the generate_dataset command.')
+
+    return {
+        'profile_ids': [profile_id for profile_id, count in resumes],
+        'weights': list(itertools.accumulate(count + 1 for profile_id, count in resumes)),
+    }
+
+def run_benchmark(runner, context, names=None, count=100, warmup=5, seed=0, progress=None):
+    ''' runs the scenarios (or the named ones), returns the results of each view '''
+    rng = random.Random(seed)
+    results = {}
+
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+
+        results[scenario.name] = runner.run(scenario, rng, context, count, warmup)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+
+    return results
+
+def compare(baseline, results, threshold=10, metric='p95_ms'):
+    '''
+    Compares results with a baseline, returns the views whose metric is
+    more than threshold percent worse (or that do more queries) as
+    (view, metric, baseline value, new value)
+    '''
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+        if not old:
+            continue
+
+        if old.get(metric) and result.get(metric) and result[metric] > old[metric] * (1 + threshold / 100):
+            regressions.append((name, metric, old[metric], result[metric]))
+
+        if old.get('queries_max') is not None and result.get('queries_max') is not None and result['queries_max'] > old['queries_max']:
+            regressions.append((name, 'queries_max', old['queries_max'], result['queries_max']))
+
+    return regressions
@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from hub.models import *
+from hub.storage import blob_storage, is_blob_name
+
+
+# Unreferenced blobs written (or re-uploaded) more recently than this are
+# not deleted right away, an upload of the same content may be about to use them
+BLOB_GRACE_SECONDS = 60 * 60
+
+
+def acquire(name):
+    ''' adds a reference to a blob (names of other files are ignored) '''
+    if not is_blob_name(name):
+        return
+
+    if Blob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        return
+
+    try:
+        with transaction.atomic():
+            Blob.objects.create(name=name, size=blob_storage.size(name), refcount=1)
+    except IntegrityError:
+        # created by another request meanwhile
+        Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+def release(name):
+    '''
+    Removes a reference to a blob, unreferenced blobs are deleted once the
+    current transaction is committed
+    '''
+    if not is_blob_name(name):
+        return
+
+    Blob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: delete_if_unreferenced(name))
+
+def delete_if_unreferenced(name):
+    deleted, _ = Blob.objects.filter(name=name, refcount__lte=0).delete()
+    if not deleted:
+        return
+
+    path = blob_storage.path(name)
+    try:
+        if time.time() - os.path.getmtime(path) > BLOB_GRACE_SECONDS:
+            os.remove(path)
+        # else it's left to the media garbage collection (the collect_orphaned_media command)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,178 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+from hub.routers import reading_from_replica, replica_synced_at
+
+
+# How long a rendered resume fragment stays in the cache (seconds)
+RESUME_CACHE_TIMEOUT = getattr(settings, 'HUB_RESUME_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Fragments rendered from the read replica may miss the latest changes,
+# they are cached for about the sync interval of the replica only
+REPLICA_CACHE_TIMEOUT = getattr(settings, 'HUB_REPLICA_CACHE_TIMEOUT', 60)
+
+# How long the fragment of a feed card or of a comment stays in the cache (seconds)
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'HUB_FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+class CacheStats():
+    ''' Thread-safe hit/miss counters of a cache (per process) '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else None,
+            }
+
+
+resume_cache_stats = CacheStats()
+fragment_cache_stats = CacheStats()
+
+
+def shared_cache():
+    ''' whether the processes share the cache (a LocMemCache is in the memory of each process) '''
+    return not isinstance(caches['default'], LocMemCache)
+
+def new_version():
+    ''' a new version token: the current time in microseconds '''
+    return int(time.time() * 10**6)
+
+def version_key(profile_id):
+    return 'hub:resume:{0}:version'.format(profile_id)
+
+# Version of the feed, bumped with the version of any resume (its cards show them)
+FEED_VERSION_KEY = 'hub:feed:version'
+
+def current_version(key):
+    '''
+    Current version stored at a key, a missing (or evicted) version is
+    replaced by a new one so old fragments can never be served again
+    '''
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        if not cache.add(key, version, None):
+            # another process created it first
+            version = cache.get(key, version)
+
+    return version
+
+def resume_version(profile_id):
+    ''' current version of a resume page '''
+    return current_version(version_key(profile_id))
+
+def feed_version():
+    ''' current version of the pages of the feed '''
+    return current_version(FEED_VERSION_KEY)
+
+def resume_versions(profile_ids):
+    ''' current versions of several resumes (see resume_version()) in one cache round trip '''
+    keys = {version_key(profile_id): profile_id for profile_id in profile_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+
+    for profile_id in profile_ids:
+        if profile_id not in versions:
+            versions[profile_id] = resume_version(profile_id)
+
+    return versions
+
+def bump_resume_versions(profile_ids):
+    ''' invalidates the cached fragments of the given resumes (and the feed) '''
+    version = new_version()
+    versions = {version_key(profile_id): version for profile_id in set(profile_ids)}
+    versions[FEED_VERSION_KEY] = version
+    cache.set_many(versions, None)
+
+def replica_behind(version):
+    '''
+    whether the replica may miss the change that made a version: a fragment
+    rendered from it isn't cached under that version then
+    '''
+    synced = replica_synced_at()
+    if synced is None:
+        # not copied by sync_replica, assume it's behind by up to REPLICA_CACHE_TIMEOUT
+        synced = new_version() - REPLICA_CACHE_TIMEOUT * 10**6
+
+    return version > synced
+
+def cached_resume_fragment(profile_id, render, part='page'):
+    '''
+    Returns the cached fragment of a resume page (or of a part of it, like a
+    page of comments), or calls render() and caches what it returns.
+    render() must only depend on data that bumps the version.
+    '''
+    version = resume_version(profile_id)
+    key = 'hub:resume:{0}:{1}:{2}'.format(profile_id, version, part)
+
+    fragment = cache.get(key)
+    if fragment is None:
+        resume_cache_stats.miss()
+        fragment = render()
+        if not reading_from_replica():
+            cache.set(key, fragment, RESUME_CACHE_TIMEOUT)
+        elif not replica_behind(version):
+            cache.set(key, fragment, REPLICA_CACHE_TIMEOUT)
+    else:
+        resume_cache_stats.hit()
+
+    return fragment
+
+# sha1 of the source of each fragment template (fragments of an older template aren't reused)
+_template_digests = {}
+
+def cached_fragments(template_name, items):
+    '''
+    Renders a template once per item of a loop, items are (key, context)
+    pairs: the fragments whose key (what they show, like the updated_at of
+    their object) is unchanged come from the cache in one get_many, the
+    others are rendered and cached in one set_many. Returns the fragments
+    (safe strings) in the order of the items.
+    '''
+    template = get_template(template_name)
+    digest = _template_digests.get(template_name)
+    if digest is None:
+        digest = _template_digests[template_name] = hashlib.sha1(template.template.source.encode()).hexdigest()[:12]
+
+    keys = [
+        'hub:fragment:{0}:{1}'.format(digest, hashlib.sha1(repr(key).encode()).hexdigest())
+        for key, context in items
+    ]
+    cached = cache.get_many(keys)
+
+    fragments = []
+    rendered = {}
+    for key, (item_key, context) in zip(keys, items):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment_cache_stats.miss()
+            fragment = rendered[key] = template.render(context)
+        else:
+            fragment_cache_stats.hit()
+        fragments.append(mark_safe(fragment))
+
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+
+    return fragments
@@ -0,0 +1,122 @@
+'''
+Conditional GET of the HTML pages
+
+The validators (ETag and Last-Modified) of a page are computed before its
+view renders anything, from the cache versions that the signals bump
+(they follow deletions and the names of commenters too) and from the
+latest updated_at of its rows (it follows writes that skip the signals,
+like bulk imports). Unchanged pages then get a 304 without any rendering.
+The relative times of the feed ("last comment 5 minutes ago") are
+followed by the ETag too (see text_start()).
+
+Pages differ for logged in users (the sidebar, the comment form) and
+carry a CSRF token, so the ETag includes the viewer and the CSRF cookie,
+and the responses are private.
+'''
+import datetime
+import hashlib
+from functools import wraps
+
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.timesince import TIMESINCE_CHUNKS
+from django.views.decorators.http import condition
+from hub.models import *
+from hub.caching import feed_version, resume_version
+from hub.feed import feed_queryset
+
+
+def make_etag(*parts):
+    ''' strong ETag of the parts of a representation '''
+    return '"{0}"'.format(hashlib.sha1(repr(parts).encode()).hexdigest()[:32])
+
+def version_time(version):
+    ''' time of a cache version (see hub.caching.new_version) '''
+    return datetime.datetime.fromtimestamp(version / 10**6, tz=timezone.utc)
+
+def latest(*times):
+    return max(time for time in times if time is not None)
+
+def text_start(since):
+    '''
+    Time at which the current text of timesince(since) (like "1 day, 3
+    hours") appeared: it changes every unit of its second part, counted
+    from since (every minute for a day, then every hour for a week, ...)
+    '''
+    if since is None:
+        return None
+
+    age = (timezone.now() - since).total_seconds()
+    units = [seconds for seconds, name in TIMESINCE_CHUNKS]
+    step = next((units[min(i + 1, len(units) - 1)] for i, seconds in enumerate(units) if age >= seconds), units[-1])
+
+    return since + datetime.timedelta(seconds=age // step * step)
+
+def viewer(request):
+    ''' what the pages show of the user who requests them, and the CSRF cookie of their forms '''
+    # the token of the forms (the cookie that the response sets on a first visit)
+    get_token(request)
+    csrf_cookie = request.META['CSRF_COOKIE']
+
+    user = request.user
+    if not user.is_authenticated:
+        return (None, csrf_cookie)
+
+    profile = UserProfile.objects.filter(user=user).values_list('picture', 'picture_variants', 'is_special').first()
+    return (user.pk, user.first_name, profile, csrf_cookie)
+
+
+def conditional_page(validators):
+    '''
+    Decorator of the views of pages: validators(request, *args, **kwargs)
+    returns the (ETag, Last-Modified) of the page, or (None, None) to
+    render it anyway
+    '''
+    def decorator(view):
+        def cached_validators(request, *args, **kwargs):
+            # condition() asks for the ETag and the Last-Modified separately
+            if not hasattr(request, 'page_validators'):
+                request.page_validators = validators(request, *args, **kwargs)
+            return request.page_validators
+
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: cached_validators(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: cached_validators(request, *args, **kwargs)[1],
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # browsers revalidate with the ETag, shared caches don't store the pages of a user
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def index_validators(request):
+    ''' validators of the pages of the feed (any order and cursor) '''
+    version = feed_version()
+    # the newest resume and the latest comment, both from an index
+    updated_at = feed_queryset('recent').order_by('-updated_at', '-id').values_list('updated_at', flat=True).first()
+    commented_at = feed_queryset('active').order_by('-last_comment_at', '-id').values_list('last_comment_at', flat=True).first()
+
+    # the cards show how long ago their last comment was, the text of the newest one changes the most often
+    shown_since = text_start(commented_at)
+
+    etag = make_etag('index', request.get_full_path(), version, updated_at, commented_at, shown_since, viewer(request))
+    return etag, latest(version_time(version), updated_at, commented_at, shown_since)
+
+def resume_validators(request, user_profile_id):
+    ''' validators of the page of a resume, None for missing resumes (the view returns the 404) '''
+    times = UserProfile.objects.filter(pk=user_profile_id).values_list('updated_at', 'last_comment_at').first()
+    if times is None:
+        return None, None
+
+    version = resume_version(user_profile_id)
+    etag = make_etag('resume', user_profile_id, version, times, viewer(request))
+    return etag, latest(version_time(version), *times)
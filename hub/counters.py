@@ -0,0 +1,44 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from hub.models import *
+
+
+def latest_comment_time(resume):
+    ''' subquery of the time of the latest comment on a resume (an OuterRef) '''
+    return Subquery(
+        Comment.objects.filter(resume_id=resume).order_by('-created_at').values('created_at')[:1]
+    )
+
+def comment_added(comment):
+    ''' counts a new comment on its resume, in one UPDATE (no lost updates between requests) '''
+    UserProfile.objects.filter(pk=comment.resume_id).update(
+        comment_count=F('comment_count') + 1,
+        last_comment_at=latest_comment_time(OuterRef('pk')),
+    )
+
+def comment_deleted(comment):
+    UserProfile.objects.filter(pk=comment.resume_id).update(
+        comment_count=F('comment_count') - 1,
+        last_comment_at=latest_comment_time(OuterRef('pk')),
+    )
+
+def recount_comments(profiles):
+    '''
+    Recomputes comment_count and last_comment_at of the profiles of a
+    queryset from the comments, returns the number of profiles that were wrong
+    '''
+    counts = Comment.objects.filter(resume=OuterRef('pk')).order_by().values('resume')
+    count = Coalesce(Subquery(counts.annotate(count=Count('id')).values('count')), 0)
+    latest = latest_comment_time(OuterRef('pk'))
+
+    rows = profiles.annotate(real_count=count, real_latest=latest).values_list(
+        'pk', 'comment_count', 'last_comment_at', 'real_count', 'real_latest'
+    )
+    wrong = [pk for pk, stored_count, stored_latest, real_count, real_latest in rows
+             if (stored_count, stored_latest) != (real_count, real_latest)]
+
+    if wrong:
+        # recomputed in the UPDATE itself, comments may be added meanwhile
+        UserProfile.objects.filter(pk__in=wrong).update(comment_count=count, last_comment_at=latest)
+
+    return len(wrong)
@@ -0,0 +1,49 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+
+
+def sqlite_pragmas():
+    ''' PRAGMA statements for new SQLite connections (HUB_SQLITE_PRAGMAS) '''
+    return [
+        'PRAGMA {0} = {1}'.format(name, value)
+        for name, value in getattr(settings, 'HUB_SQLITE_PRAGMAS', {}).items()
+    ]
+
+def configure_sqlite(sender, connection, **kwargs):
+    ''' connection_created receiver: applies the pragmas to SQLite connections '''
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+
+def query_plan(sql, params, using='default'):
+    ''' the details of EXPLAIN QUERY PLAN of a query (SQLite only) '''
+    with connections[using].cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+# Scans allowed in the plans of the hot queries: the full-text index, and
+# the walks of the feed indexes in their order (the feed queries have a LIMIT)
+ALLOWED_SCANS = (
+    re.compile(r'^SCAN \S+ VIRTUAL TABLE INDEX '),
+    re.compile(r'^SCAN (TABLE )?hub_userprofile USING INDEX hub_userprofile_(feed|discussed|active)_idx$'),
+)
+
+def plan_problems(plan):
+    '''
+    Steps of a query plan that don't scale with the tables: scans (of a
+    table or of a whole index) but the ALLOWED_SCANS, and sorts of the rows
+    (but the sort by rank of full-text search)
+    '''
+    problems = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and not any(allowed.match(detail) for allowed in ALLOWED_SCANS):
+            problems.append(detail)
+        elif detail.startswith('USE TEMP B-TREE FOR ORDER BY') and not any('VIRTUAL TABLE' in step for step in plan):
+            problems.append(detail)
+
+    return problems
@@ -0,0 +1,145 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Size of the chunks that files are streamed in (bytes)
+CHUNK_SIZE = 64 * 1024
+
+# Header that hands the transfer off to the front web server, e.g.
+# 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache, lighttpd), None to stream from Django
+SENDFILE_HEADER = getattr(settings, 'HUB_SENDFILE_HEADER', None)
+
+# For X-Accel-Redirect: the internal location of nginx that serves MEDIA_ROOT
+SENDFILE_URL_PREFIX = getattr(settings, 'HUB_SENDFILE_URL_PREFIX', '/protected-media/')
+
+
+def file_etag(stat):
+    ''' strong ETag of a file version from its modification time and size '''
+    return '"{0:x}-{1:x}"'.format(int(stat.st_mtime * 10**6), stat.st_size)
+
+def parse_range(header, size):
+    '''
+    Parses a single "bytes=" range of a Range header,
+    returns (start, end) (inclusive), None to serve the whole file,
+    or False if the range can't be satisfied
+    '''
+    match = re.match(r'^bytes=(\d*)-(\d*)$', header.strip())
+    if not match or match.groups() == ('', ''):
+        # multiple or malformed ranges are ignored (the whole file is sent)
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+
+    if start > end or start >= size:
+        return False
+
+    return start, end
+
+def range_iterator(file, start, length):
+    ''' yields `length` bytes of an open file from `start` in chunks, then closes it '''
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+def content_disposition(filename):
+    ''' attachment header with an ASCII fallback and the UTF-8 filename (RFC 6266) '''
+    ascii_name = filename.encode('ascii', 'ignore').decode().replace('"', '') or 'download'
+    return 'attachment; filename="{0}"; filename*=UTF-8\'\'{1}'.format(ascii_name, quote(filename))
+
+def serve_file(request, storage_name, filename=None):
+    '''
+    Serves a file of MEDIA_ROOT for download (as filename): conditional GET
+    (ETag, Last-Modified), single byte ranges, chunked streaming or a
+    sendfile header for the front web server
+    '''
+    path = os.path.join(settings.MEDIA_ROOT, storage_name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404('File not found')
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    # 304 Not Modified / 412 Precondition Failed before opening the file
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if SENDFILE_HEADER:
+        # the web server sends the file (and handles ranges itself)
+        response = HttpResponse(content_type=content_type)
+        if SENDFILE_HEADER == 'X-Accel-Redirect':
+            response[SENDFILE_HEADER] = quote(SENDFILE_URL_PREFIX + storage_name)
+        else:
+            response[SENDFILE_HEADER] = path
+
+    else:
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{0}'.format(stat.st_size)
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                range_iterator(open(path, 'rb'), start, end - start + 1),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, stat.st_size)
+            response['Content-Length'] = end - start + 1
+
+        else:
+            # FileResponse uses wsgi.file_wrapper (sendfile) when the server has one
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response.block_size = CHUNK_SIZE
+            response['Content-Length'] = stat.st_size
+
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition(filename or os.path.basename(storage_name))
+
+    return response
+
+def if_range_matches(request, etag, last_modified):
+    ''' a Range request applies only if its If-Range (if any) matches the current file '''
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+
+    if if_range.startswith('"'):
+        return if_range == etag
+
+    return parse_http_date_safe(if_range) == last_modified
@@ -0,0 +1,114 @@
+'''
+Plain text extraction from uploaded resume files.
+
+Functions of this module run in worker processes, so they must not use
+the database (or import models).
+'''
+import io
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.conf import settings
+
+
+# Files bigger than this are not extracted (bytes)
+MAX_FILE_SIZE = getattr(settings, 'HUB_EXTRACTION_MAX_BYTES', 20 * 1024 * 1024)
+
+# Extracted text is truncated to this many characters
+MAX_TEXT_LENGTH = getattr(settings, 'HUB_EXTRACTION_MAX_CHARS', 200000)
+
+# Only the first pages of long PDF files are extracted
+MAX_PDF_PAGES = getattr(settings, 'HUB_EXTRACTION_MAX_PDF_PAGES', 50)
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class ExtractionError(Exception):
+    ''' The text of a file can't be extracted '''
+
+
+def pdf_text(path):
+    ''' text of a PDF file (needs pdfminer.six) '''
+    try:
+        from pdfminer.high_level import extract_text_to_fp
+        from pdfminer.layout import LAParams
+    except ImportError:
+        raise ExtractionError('pdfminer.six is not installed')
+
+    output = io.StringIO()
+    with open(path, 'rb') as pdf_file:
+        extract_text_to_fp(pdf_file, output, laparams=LAParams(), maxpages=MAX_PDF_PAGES)
+
+    return output.getvalue()
+
+def docx_text(path):
+    ''' text of the paragraphs of a DOCX (Office Open XML) file '''
+    try:
+        with zipfile.ZipFile(path) as docx_file:
+            info = docx_file.getinfo('word/document.xml')
+            if info.file_size > MAX_FILE_SIZE * 10:
+                # protection against zip bombs
+                raise ExtractionError('document.xml is too big')
+
+            paragraphs = []
+            words = []
+            with docx_file.open(info) as document:
+                for event, element in ElementTree.iterparse(document):
+                    if element.tag == WORD_NAMESPACE + 't':
+                        words.append(element.text or '')
+                    elif element.tag == WORD_NAMESPACE + 'tab':
+                        words.append('\t')
+                    elif element.tag == WORD_NAMESPACE + 'p':
+                        paragraphs.append(''.join(words))
+                        words = []
+                        element.clear()
+
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractionError('invalid DOCX file: {0}'.format(e))
+
+    return '\n'.join(paragraphs)
+
+def plain_text(path):
+    with open(path, 'rb') as text_file:
+        return text_file.read(MAX_TEXT_LENGTH * 4).decode('utf-8', errors='replace')
+
+EXTRACTORS = {
+    '.pdf': pdf_text,
+    '.docx': docx_text,
+    '.txt': plain_text,
+}
+
+def extract_text(path):
+    '''
+    Extracts the plain text of a resume file,
+    raises ExtractionError if it isn't possible
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise ExtractionError('unsupported file type: {0}'.format(extension or 'unknown'))
+
+    if os.path.getsize(path) > MAX_FILE_SIZE:
+        raise ExtractionError('file is bigger than {0} bytes'.format(MAX_FILE_SIZE))
+
+    text = extractor(path)
+
+    # collapse runs of spaces and blank lines
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    text = re.sub(r'\s*\n\s*', '\n', text).strip()
+
+    return text[:MAX_TEXT_LENGTH]
+
+def run_extraction(path):
+    '''
+    Worker entry point: returns (text, error) instead of raising,
+    so one bad file doesn't break a whole batch
+    '''
+    try:
+        return extract_text(path), ''
+    except ExtractionError as e:
+        return '', str(e)
+    except Exception as e:
+        return '', '{0}: {1}'.format(type(e).__name__, e)
@@ -0,0 +1,134 @@
+import re
+from datetime import datetime, timezone
+
+from django.db import models
+from django.db.models import Q
+from hub.models import *
+
+
+# Number of resumes on each page of the feed
+FEED_SIZE = 20
+
+# Number of comments on each page of a resume
+COMMENTS_PAGE_SIZE = 20
+
+# Columns needed to render a resume card (the full description is not needed)
+CARD_FIELDS = (
+    'id', 'picture', 'picture_variants', 'resume_file', 'summary', 'updated_at',
+    'comment_count', 'last_comment_at',
+    'user__id', 'user__first_name', 'user__last_name',
+)
+
+# Orders of the feed: the field that each one sorts by (each has an index)
+FEED_ORDERS = {
+    'recent': 'updated_at',
+    'discussed': 'comment_count',
+    'active': 'last_comment_at',
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(value, pk):
+    '''
+    Encodes the sort key of the last item of a page as an opaque url-safe cursor
+    '''
+    if isinstance(value, datetime):
+        # datetimes are stored as microseconds since epoch (UTC)
+        delta = value - EPOCH
+        value = (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+    return '{0}_{1}'.format(value, pk)
+
+def clean_cursor(cursor):
+    ''' returns the cursor if it looks like one made by encode_cursor(), else None '''
+    if cursor and re.match(r'^-?\d{1,20}_\d{1,20}$', cursor):
+        return cursor
+
+    return None
+
+def decode_cursor(cursor, field):
+    '''
+    Decodes a cursor made by encode_cursor() for the given model field,
+    returns None for missing or malformed cursors
+    '''
+    if not cursor:
+        return None
+
+    try:
+        value, pk = cursor.split('_')
+        value, pk = int(value), int(pk)
+    except ValueError:
+        return None
+
+    if isinstance(field, models.DateTimeField):
+        try:
+            value = datetime.fromtimestamp(value // 10**6, tz=timezone.utc).replace(microsecond=value % 10**6)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    return value, pk
+
+def keyset_page(queryset, field_name, cursor=None, size=FEED_SIZE):
+    '''
+    Returns one page of queryset ordered by (field_name, id) descending,
+    starting right after cursor, and the cursor of the next page (or None).
+
+    The cost of a page doesn't depend on how deep the cursor is because
+    the database seeks to the cursor instead of counting OFFSET rows.
+    '''
+    field = queryset.model._meta.get_field(field_name)
+
+    queryset = queryset.order_by('-' + field_name, '-id')
+
+    position = decode_cursor(cursor, field)
+    if position:
+        value, pk = position
+        # the <= term lets the database seek the index to the cursor
+        queryset = queryset.filter(
+            Q(**{field_name + '__lte': value}),
+            Q(**{field_name + '__lt': value}) | Q(id__lt=pk)
+        )
+
+    # fetch one extra row to know whether there is a next page
+    items = list(queryset[:size + 1])
+
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        if isinstance(last, dict):
+            # rows of .values()
+            next_cursor = encode_cursor(last[field_name], last['id'])
+        else:
+            next_cursor = encode_cursor(getattr(last, field_name), last.id)
+
+    return items, next_cursor
+
+def feed_queryset(order='recent'):
+    ''' profiles of the feed in an order of FEED_ORDERS (unordered, see keyset_page()) '''
+    queryset = UserProfile.objects.exclude(resume_file='')
+    if order == 'active':
+        # only resumes with comments
+        queryset = queryset.filter(last_comment_at__isnull=False)
+
+    return queryset
+
+def recent_resumes(cursor=None, size=FEED_SIZE, order='recent'):
+    '''
+    Resumes of the feed (only profiles that have a resume file) with their
+    users, in one query. order is one of FEED_ORDERS: most recently updated,
+    most commented, or most recently commented (only resumes with comments).
+    '''
+    queryset = feed_queryset(order).select_related('user').only(*CARD_FIELDS)
+
+    return keyset_page(queryset, FEED_ORDERS[order], cursor, size)
+
+def resume_comments(resume_id, cursor=None, size=COMMENTS_PAGE_SIZE):
+    '''
+    Comments on a resume, newest first, with their users and the users'
+    profiles (for pictures) in one query
+    '''
+    queryset = Comment.objects.filter(resume_id=resume_id).select_related('user__userprofile')
+
+    return keyset_page(queryset, 'created_at', cursor, size)
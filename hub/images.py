@@ -0,0 +1,135 @@
+'''
+Fixed-size variants of profile pictures.
+
+Functions of this module run in worker processes, so they must not use
+the database (or import models).
+'''
+import os
+import warnings
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+
+# Width (and height) in pixels of the variant of each avatar slot,
+# twice the CSS size of the slot for high density screens
+AVATAR_SIZES = {
+    'small': 100,  # .profile-pic-small (comments)
+    'normal': 300,  # .profile-pic (index, sidebar)
+    'big': 600,  # .profile-pic-big (resume page)
+}
+
+AVATAR_FORMATS = ('jpg', 'webp')
+
+# Directory of the variants in MEDIA_ROOT
+AVATAR_DIRECTORY = 'avatars'
+
+# Images with more pixels than this are rejected (decompression bomb protection)
+MAX_IMAGE_PIXELS = getattr(settings, 'HUB_AVATAR_MAX_PIXELS', 40 * 1000 * 1000)
+
+# EXIF tag of the orientation of the camera
+EXIF_ORIENTATION = 0x0112
+
+
+class ImageError(Exception):
+    ''' A picture can't be processed '''
+
+
+def avatar_name(picture_name, slot, extension):
+    '''
+    Storage name of a variant of a picture,
+    e.g. user_3/me.png -> avatars/user_3/me_small.webp
+    '''
+    root = os.path.splitext(picture_name)[0]
+    return '{0}/{1}_{2}.{3}'.format(AVATAR_DIRECTORY, root, slot, extension)
+
+def exif_transpose(image):
+    ''' rotates/flips an image according to its EXIF orientation '''
+    try:
+        if hasattr(image, 'getexif'):
+            orientation = image.getexif().get(EXIF_ORIENTATION)
+        else:
+            # Pillow < 6
+            orientation = image._getexif().get(EXIF_ORIENTATION)
+    except Exception:
+        # no (or broken) EXIF data
+        return image
+
+    method = {
+        2: Image.FLIP_LEFT_RIGHT,
+        3: Image.ROTATE_180,
+        4: Image.FLIP_TOP_BOTTOM,
+        5: Image.TRANSPOSE,
+        6: Image.ROTATE_270,
+        7: Image.TRANSVERSE,
+        8: Image.ROTATE_90,
+    }.get(orientation)
+
+    return image.transpose(method) if method is not None else image
+
+def open_image(path):
+    '''
+    opens an image, refusing decompression bombs (of more than
+    MAX_IMAGE_PIXELS) before decoding it. The limit of Pillow (global to
+    the process) is left alone, past twice of it Pillow refuses them too.
+    '''
+    try:
+        with warnings.catch_warnings():
+            # the size is checked below against our own limit
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            image = Image.open(path)
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ImageError('image is too big ({0}x{1})'.format(width, height))
+
+            # decode only as much as the biggest variant needs (JPEG)
+            biggest = max(AVATAR_SIZES.values())
+            image.draft('RGB', (biggest, biggest))
+            image.load()
+
+    except Image.DecompressionBombError as e:
+        raise ImageError(str(e))
+    except (IOError, SyntaxError) as e:
+        raise ImageError('invalid image: {0}'.format(e))
+
+    return image
+
+def to_rgb(image):
+    ''' converts an image to RGB, transparent parts become white '''
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+
+    return image.convert('RGB')
+
+def save_atomically(image, path, **options):
+    ''' saves an image to a temp file and renames it, so readers never see half a file '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    image.save(temp_path, **options)
+    os.replace(temp_path, path)
+
+def make_avatars(media_root, picture_name):
+    '''
+    Worker entry point: writes the JPEG and WebP variants of every slot for
+    a picture, returns an error message or '' on success
+    '''
+    try:
+        image = to_rgb(exif_transpose(open_image(os.path.join(media_root, picture_name))))
+
+        for slot, size in sorted(AVATAR_SIZES.items(), key=lambda item: -item[1]):
+            # square crop from the center like "object-fit: cover"
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            save_atomically(image, os.path.join(media_root, avatar_name(picture_name, slot, 'jpg')),
+                            format='JPEG', quality=85, optimize=True, progressive=True)
+            save_atomically(image, os.path.join(media_root, avatar_name(picture_name, slot, 'webp')),
+                            format='WEBP', quality=80, method=4)
+
+    except ImageError as e:
+        return str(e)
+    except Exception as e:
+        return '{0}: {1}'.format(type(e).__name__, e)
+
+    return ''
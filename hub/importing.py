@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from hub.storage import blob_storage
+
+
+# Fields of the imported and exported records (files are paths relative to a files directory)
+RECORD_FIELDS = (
+    'username', 'email', 'first_name', 'last_name', 'password', 'password_hash',
+    'is_special', 'description', 'resume_file', 'picture',
+)
+
+FORMATS = ('jsonl', 'csv')
+
+
+class RecordError(Exception):
+    ''' invalid record of an import '''
+
+
+def record_format(path, default='jsonl'):
+    ''' format of a records file from its extension '''
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+
+    return default
+
+def read_records(file, format):
+    ''' yields the records of an open JSONL or CSV file one at a time '''
+    if format == 'csv':
+        for record in csv.DictReader(file):
+            yield record
+        return
+
+    for line_number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield RecordError('line {0}: {1}'.format(line_number, error))
+
+def clean_record(record):
+    ''' a record with the known fields only (as strings), raises RecordError '''
+    if isinstance(record, RecordError):
+        raise record
+    if not isinstance(record, dict):
+        raise RecordError('a record must be an object')
+
+    record = {field: record.get(field) or '' for field in RECORD_FIELDS}
+    for field in RECORD_FIELDS:
+        if field != 'is_special':
+            record[field] = str(record[field]).strip() if field != 'password' else str(record[field])
+
+    if not record['username']:
+        raise RecordError('username is missing')
+    if len(record['username']) > 150:
+        raise RecordError('{0}: username is too long'.format(record['username']))
+
+    special = record['is_special']
+    record['is_special'] = special is True or str(special).strip().lower() in ('1', 'true', 'yes')
+
+    return record
+
+
+class RecordWriter():
+    ''' writes records to an open file as JSONL or CSV '''
+
+    def __init__(self, file, format, fields=RECORD_FIELDS):
+        self.file = file
+        self.format = format
+        self.fields = fields
+
+        if format == 'csv':
+            self.csv = csv.DictWriter(file, fieldnames=fields)
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.format == 'csv':
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def hash_password(password):
+    ''' hash of a password for User.password, unusable if there's no password '''
+    return make_password(password or None)
+
+def store_file(path):
+    '''
+    Saves a file to the blob storage (the same content is stored once),
+    returns its storage name
+    '''
+    with open(path, 'rb') as file:
+        return blob_storage.save(os.path.basename(path), File(file))
@@ -0,0 +1,238 @@
+'''
+Job queue in the database (no broker): work deferred from the requests
+and the signals, run by the worker processes of the run_workers command
+
+Jobs are functions registered with @job and queued with enqueue() in the
+current transaction, so they exist only if it commits (and the rows they
+need are committed too). Workers claim the ready jobs by priority with a
+conditional UPDATE, so each job is run by one worker at a time. Failed
+jobs are retried with an exponential backoff up to their max_attempts,
+and the jobs of workers that died are queued again after JOB_TIMEOUT:
+jobs may run more than once and must be idempotent.
+
+With HUB_JOB_WORKERS = 0 jobs run in the web process right after the
+transaction that queues them (for development and tests), and so they do
+when the cache isn't shared by the processes: the cache versions that
+the jobs bump must be the ones the web processes read.
+'''
+import datetime
+import json
+import logging
+import os
+import signal
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from hub.models import *
+from hub.bench import percentile
+from hub.caching import shared_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Delay of the first retry of a failed job, doubled on each attempt up to MAX_RETRY_DELAY (seconds)
+RETRY_DELAY = getattr(settings, 'HUB_JOB_RETRY_DELAY', 10)
+MAX_RETRY_DELAY = getattr(settings, 'HUB_JOB_MAX_RETRY_DELAY', 60 * 60)
+
+# Jobs running for longer than this are assumed lost (their worker died) and queued again (seconds)
+JOB_TIMEOUT = getattr(settings, 'HUB_JOB_TIMEOUT', 10 * 60)
+
+# Done jobs are deleted after this time, failed ones are kept (seconds)
+KEEP_DONE = getattr(settings, 'HUB_JOB_KEEP_DONE', 24 * 60 * 60)
+
+# Seconds that idle workers wait before looking for ready jobs again
+POLL_INTERVAL = getattr(settings, 'HUB_JOB_POLL_INTERVAL', 1)
+
+# Registered jobs: {name: (function, priority, max_attempts)}
+JOBS = {}
+
+
+def job(name=None, priority=0, max_attempts=5):
+    ''' decorator registering a function as a job, called with the arguments given to enqueue() '''
+    def register(function):
+        JOBS[name or function.__name__] = (function, priority, max_attempts)
+        return function
+
+    return register
+
+def enqueue(name, arguments=None, priority=None, key=None, delay=0):
+    '''
+    Queues the job name(**arguments) in the current transaction (the
+    arguments must be JSON serializable), returns the Job, or the queued
+    job with the same key (a running job may have missed the changes that
+    queue it again, its key is cleared when it starts)
+    '''
+    function, default_priority, max_attempts = JOBS[name]
+
+    fields = {
+        'name': name,
+        'arguments': json.dumps(arguments or {}, sort_keys=True),
+        'priority': default_priority if priority is None else priority,
+        'max_attempts': max_attempts,
+        'key': key,
+        'run_at': timezone.now() + datetime.timedelta(seconds=delay),
+    }
+
+    if key is None:
+        queued = Job.objects.create(**fields)
+    else:
+        queued = Job.objects.filter(key=key).first()
+        if queued is not None:
+            return queued
+
+        try:
+            with transaction.atomic():
+                queued = Job.objects.create(**fields)
+        except IntegrityError:
+            # queued by another process meanwhile
+            return Job.objects.filter(key=key).first()
+
+    if run_in_web_process() and not delay:
+        transaction.on_commit(lambda: run_now(queued.id))
+
+    return queued
+
+def run_in_web_process():
+    ''' whether the jobs run in the process that queues them (see the docstring of the module) '''
+    return not getattr(settings, 'HUB_JOB_WORKERS', 2) or not shared_cache()
+
+
+def worker_name():
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+def retry_delay(attempts):
+    ''' seconds before the next attempt of a job that failed `attempts` times '''
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+def claim(worker, job_id=None):
+    ''' the next ready job (by priority, then age), marked as running by `worker`, or None '''
+    while True:
+        now = timezone.now()
+        ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        if job_id is not None:
+            ready = ready.filter(pk=job_id)
+
+        candidates = list(ready.order_by('-priority', 'run_at', 'id').values_list('id', flat=True)[:10])
+        if not candidates:
+            return None
+
+        for candidate in candidates:
+            # only one worker updates a queued job, the others look at the next one
+            claimed = Job.objects.filter(pk=candidate, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, key=None, started_at=now, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(pk=candidate)
+
+def run(claimed):
+    '''
+    Runs a claimed job, then marks it done, or queues it again with a
+    backoff (failed after max_attempts). Returns whether it succeeded.
+    '''
+    try:
+        if claimed.name not in JOBS:
+            raise LookupError('Unknown job {0}'.format(claimed.name))
+        JOBS[claimed.name][0](**json.loads(claimed.arguments))
+    except Exception:
+        logger.exception('job %s %s (attempt %s) failed', claimed.name, claimed.id, claimed.attempts)
+        error = traceback.format_exc()[-4000:]
+        now = timezone.now()
+
+        if claimed.attempts < claimed.max_attempts:
+            Job.objects.filter(pk=claimed.pk).update(
+                status=Job.QUEUED, worker='', last_error=error,
+                run_at=now + datetime.timedelta(seconds=retry_delay(claimed.attempts)),
+            )
+        else:
+            Job.objects.filter(pk=claimed.pk).update(
+                status=Job.FAILED, worker='', last_error=error, finished_at=now,
+            )
+        return False
+
+    Job.objects.filter(pk=claimed.pk).update(status=Job.DONE, worker='', finished_at=timezone.now())
+    return True
+
+def run_now(job_id):
+    ''' runs a queued job in this process (if no worker claimed it first) '''
+    claimed = claim(worker_name(), job_id)
+    if claimed is not None:
+        run(claimed)
+
+def work(worker=None, burst=False, stop=lambda: False):
+    '''
+    Runs the ready jobs one after the other until stop() returns True, or
+    until there are no ready jobs with burst. Returns (done, failed).
+    '''
+    worker = worker or worker_name()
+    done = failed = 0
+
+    while not stop():
+        claimed = claim(worker)
+        if claimed is None:
+            if burst:
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if run(claimed):
+            done += 1
+        else:
+            failed += 1
+
+    return done, failed
+
+def worker_process(burst, stop_event):
+    ''' entry point of the processes of the run_workers command '''
+    # Ctrl-C reaches the whole process group, the command stops the workers after their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        work(burst=burst, stop=stop_event.is_set)
+    finally:
+        connection.close()
+
+
+def requeue_lost_jobs():
+    ''' queues again the jobs running for longer than JOB_TIMEOUT (failed if they have no attempt left), returns their number '''
+    lost = Job.objects.filter(status=Job.RUNNING, started_at__lt=timezone.now() - datetime.timedelta(seconds=JOB_TIMEOUT))
+    error = 'Lost: running for more than {0} seconds'.format(JOB_TIMEOUT)
+
+    failed = lost.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, worker='', last_error=error, finished_at=timezone.now(),
+    )
+    return failed + lost.update(status=Job.QUEUED, worker='', last_error=error)
+
+def purge_done_jobs():
+    ''' deletes the jobs done for longer than KEEP_DONE, returns their number '''
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, finished_at__lt=timezone.now() - datetime.timedelta(seconds=KEEP_DONE),
+    ).delete()
+    return deleted
+
+def queue_stats(since):
+    '''
+    Depth of the queue (jobs by status, and the queued ones that are ready)
+    and latencies of the jobs finished since a time: from queued to
+    finished (latency) and the run time of their last attempt (seconds)
+    '''
+    stats = {status: 0 for status, label in Job.STATUS_CHOICES}
+    stats.update(Job.objects.order_by().values_list('status').annotate(Count('id')))
+    stats['ready'] = Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now()).count()
+
+    finished = Job.objects.filter(finished_at__gte=since).values_list('created_at', 'started_at', 'finished_at')
+    latencies = []
+    run_times = []
+    for created_at, started_at, finished_at in finished:
+        latencies.append((finished_at - created_at).total_seconds())
+        run_times.append((finished_at - started_at).total_seconds())
+
+    stats['finished'] = len(latencies)
+    stats['latency_p50'] = percentile(latencies, 50) or 0
+    stats['latency_p95'] = percentile(latencies, 95) or 0
+    stats['run_p95'] = percentile(run_times, 95) or 0
+
+    return stats
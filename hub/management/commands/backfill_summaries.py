@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from hub.models import *
+
+
+class Command(BaseCommand):
+    help = 'Computes the stored summary of existing resumes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of profiles per batch')
+        parser.add_argument('--all', action='store_true', help='Recompute summaries that are already filled')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        profiles = UserProfile.objects.order_by('id').only('id', 'description', 'summary')
+        if not options['all']:
+            profiles = profiles.filter(summary='').exclude(description='')
+
+        updated = 0
+        last_id = 0
+        while True:
+            # walk the table by primary key so every batch is an index range scan
+            batch = list(profiles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                for profile in batch:
+                    summary = summarize(profile.description)
+                    if summary != profile.summary:
+                        # update() doesn't touch updated_at so the feed order is kept
+                        UserProfile.objects.filter(pk=profile.pk).update(summary=summary)
+                        updated += 1
+
+            last_id = batch[-1].id
+            self.stdout.write('{0} summaries updated (up to profile {1})'.format(updated, last_id))
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} summaries updated.'.format(updated)))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from hub.bench import percentile
+from hub.bench.cold_start import measure_cold_start
+
+
+class Command(BaseCommand):
+    help = 'Measures the time from process start to the first request served by the WSGI application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Number of new processes to measure')
+        parser.add_argument('--path', default='/', help='Path of the first request')
+        parser.add_argument('--host', default='localhost', help='Host header of the first request')
+        parser.add_argument('--max-ms', type=float, help='Fail if the median time to the first response is bigger')
+
+    def handle(self, *args, **options):
+        loads = []
+        first_responses = []
+
+        for run in range(options['runs']):
+            result = measure_cold_start(options['path'], options['host'])
+            loads.append(result['load'] * 1000)
+            first_responses.append(result['first_response'] * 1000)
+            self.stdout.write('run {0}: application loaded in {1:.0f} ms, first response ({2}) in {3:.0f} ms'.format(
+                run + 1, loads[-1], result['status'], first_responses[-1]
+            ))
+
+        median = percentile(first_responses, 50)
+        self.stdout.write('median: application loaded in {0:.0f} ms, first response in {1:.0f} ms (max {2:.0f} ms)'.format(
+            percentile(loads, 50), median, max(first_responses)
+        ))
+
+        if options['max_ms'] is not None and median > options['max_ms']:
+            raise CommandError('Cold start is {0:.0f} ms, more than {1:.0f} ms.'.format(median, options['max_ms']))
@@ -0,0 +1,152 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from hub.models import *
+from hub.bench import percentile
+from hub.feed import recent_resumes, resume_comments
+
+
+# Pragmas of the tuned mode (as in the production profile of the settings)
+TUNED_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+COMMENT_SQL = 'INSERT INTO hub_comment (user_id, resume_id, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)'
+
+
+def captured_queries(function, *args):
+    ''' (sql, params) of the queries that function(*args) runs, for the sqlite3 module '''
+    queries = []
+
+    def capture(execute, sql, params, many, context):
+        queries.append((sql.replace('%s', '?'), params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        function(*args)
+
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Measures concurrent read/write throughput on copies of the database with default and tuned SQLite settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+        parser.add_argument('--readers', type=int, default=8, help='Number of threads running the queries of index and resume')
+        parser.add_argument('--writers', type=int, default=2, help='Number of threads posting comments')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+
+        resume_ids = list(UserProfile.objects.exclude(resume_file='').values_list('id', flat=True)[:100])
+        if not resume_ids:
+            raise CommandError('There are no resumes, see the generate_dataset command.')
+
+        # the queries of the index and resume views (the replica isn't used here)
+        self.reads = captured_queries(recent_resumes)
+        for resume_id in resume_ids:
+            self.reads += captured_queries(resume_comments, resume_id)
+        self.resume_ids = resume_ids
+        self.user_id = UserProfile.objects.values_list('user_id', flat=True).first()
+
+        directory = tempfile.mkdtemp()
+        try:
+            for mode, pragmas in (('default', {}), ('tuned', TUNED_PRAGMAS)):
+                path = os.path.join(directory, '{0}.sqlite3'.format(mode))
+                self.copy_database(path)
+
+                result = self.run(path, pragmas, options)
+                self.stdout.write(
+                    '{0:<8} reads {1:>8.1f}/s (p95 {2:>6.1f} ms)  writes {3:>7.1f}/s (p95 {4:>6.1f} ms)  locked errors {5}'.format(
+                        mode, result['reads'] / options['seconds'], result['read_p95'],
+                        result['writes'] / options['seconds'], result['write_p95'], result['locked'],
+                    )
+                )
+        finally:
+            shutil.rmtree(directory)
+
+    def copy_database(self, path):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(path)
+        source.backup(target)
+        target.close()
+        source.close()
+
+    def connect(self, path, pragmas):
+        ''' a connection like Django opens it (autocommit, explicit transactions) '''
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for name, value in pragmas.items():
+            db.execute('PRAGMA {0} = {1}'.format(name, value))
+        return db
+
+    def run(self, path, pragmas, options):
+        stop = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        result = {'reads': 0, 'writes': 0, 'locked': 0}
+        read_timings = []
+        write_timings = []
+
+        def reader(seed):
+            rng = random.Random(seed)
+            db = self.connect(path, pragmas)
+            while time.perf_counter() < stop:
+                sql, params = rng.choice(self.reads)
+                started = time.perf_counter()
+                try:
+                    db.execute(sql, params).fetchall()
+                except sqlite3.OperationalError:
+                    with lock:
+                        result['locked'] += 1
+                    continue
+                with lock:
+                    read_timings.append(time.perf_counter() - started)
+                    result['reads'] += 1
+            db.close()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            db = self.connect(path, pragmas)
+            while time.perf_counter() < stop:
+                now = time.strftime('%Y-%m-%d %H:%M:%S')
+                started = time.perf_counter()
+                try:
+                    db.execute('BEGIN')
+                    db.execute(COMMENT_SQL, (self.user_id, rng.choice(self.resume_ids), 'benchmark comment', now, now))
+                    db.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    with lock:
+                        result['locked'] += 1
+                    continue
+                with lock:
+                    write_timings.append(time.perf_counter() - started)
+                    result['writes'] += 1
+            db.close()
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result['read_p95'] = (percentile(read_timings, 95) or 0) * 1000
+        result['write_p95'] = (percentile(write_timings, 95) or 0) * 1000
+
+        return result
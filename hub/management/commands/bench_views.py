@@ -0,0 +1,90 @@
+import json
+import platform
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from hub.bench.dataset import USERNAME_PREFIX
+from hub.bench.views import SCENARIOS, ClientRunner, LiveRunner, benchmark_context, run_benchmark, compare
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the views (latency percentiles, throughput, SQL queries) and compares with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Number of measured requests per view')
+        parser.add_argument('--warmup', type=int, default=5, help='Number of unmeasured requests per view first')
+        parser.add_argument('--views', nargs='+', choices=[scenario.name for scenario in SCENARIOS], help='Only these views')
+        parser.add_argument('--url', help='Base URL of a running server, its host must be in ALLOWED_HOSTS (default: the test client in this process)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent clients (with --url)')
+        parser.add_argument('--username', help='User of the views that need login (default: the first generated user)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random requests')
+        parser.add_argument('--output', help='Save the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+        parser.add_argument('--threshold', type=float, default=10, help='Allowed regression against the baseline (percent)')
+        parser.add_argument('--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'], help='Latency compared with the baseline')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['username']) if options['username'] else \
+            User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to log in with, run generate_dataset or pass --username.')
+
+        try:
+            context = benchmark_context()
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['url']:
+            runner = LiveRunner(options['url'], user, options['concurrency'])
+        else:
+            runner = ClientRunner(user)
+
+        self.stdout.write('{0:<20} {1:>8} {2:>8} {3:>8} {4:>10} {5:>8} {6:>7}'.format(
+            'view', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'errors'
+        ))
+        views = run_benchmark(
+            runner, context,
+            names=options['views'],
+            count=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            progress=self.report,
+        )
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'mode': 'live' if options['url'] else 'client',
+            'url': options['url'],
+            'concurrency': options['concurrency'] if options['url'] else 1,
+            'requests': options['requests'],
+            'python': platform.python_version(),
+            'views': views,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write('Results saved to {0}'.format(options['output']))
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                baseline = json.load(baseline)
+
+            regressions = compare(baseline['views'], views, options['threshold'], options['metric'])
+            for name, metric, old, new in regressions:
+                self.stderr.write('{0}: {1} {2:.1f} -> {3:.1f}'.format(name, metric, old, new))
+
+            if regressions:
+                raise CommandError('{0} regressions against {1} (threshold {2}%).'.format(
+                    len(regressions), options['baseline'], options['threshold']
+                ))
+            self.stdout.write(self.style.SUCCESS('No regressions against {0}.'.format(options['baseline'])))
+
+    def report(self, name, result):
+        self.stdout.write('{0:<20} {1:>8.1f} {2:>8.1f} {3:>8.1f} {4:>10.1f} {5:>8} {6:>7}'.format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['throughput_rps'],
+            '-' if result['queries_max'] is None else '{0:.1f}'.format(result['queries_mean']),
+            result['errors'],
+        ))
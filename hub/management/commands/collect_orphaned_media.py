@@ -0,0 +1,238 @@
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from hub.models import *
+from hub.blobs import BLOB_GRACE_SECONDS
+from hub.images import AVATAR_DIRECTORY, AVATAR_FORMATS, AVATAR_SIZES
+from hub.storage import BLOB_DIRECTORY
+
+
+# Directories of MEDIA_ROOT with uploads (the other files are left alone)
+UPLOAD_DIRECTORY = re.compile(r'^user_\d+$')
+
+# Variants of a picture (see hub.images.avatar_name): its name without extension, slot and format
+AVATAR_VARIANT = re.compile(r'^{0}/(.+)_(?:{1})\.(?:{2})$'.format(
+    AVATAR_DIRECTORY, '|'.join(AVATAR_SIZES), '|'.join(AVATAR_FORMATS),
+))
+
+# Temp files of uploads being stored (see hub.storage)
+TEMP_DIRECTORY = BLOB_DIRECTORY + '/tmp/'
+
+
+def scan(root, directories, files, workers, batch_size):
+    '''
+    Walks directories (relative to root) in `workers` threads with
+    os.scandir, and puts batches of the (name, size, mtime) of their files
+    in the files queue, then None. The directories to scan are shared by
+    the threads, so big trees are walked in parallel.
+    '''
+    pending = queue.Queue()
+    for directory in directories:
+        pending.put(directory)
+
+    def walk():
+        # filled across directories, the blobs are spread over many small ones
+        batch = []
+        while True:
+            directory = pending.get()
+            if directory is None:
+                if batch:
+                    files.put(batch)
+                return
+
+            try:
+                with os.scandir(os.path.join(root, directory)) as entries:
+                    for entry in entries:
+                        name = '{0}/{1}'.format(directory, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.put(name)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            batch.append((name, stat.st_size, stat.st_mtime))
+                            if len(batch) >= batch_size:
+                                # blocks while the database queries are behind, which bounds the memory
+                                files.put(batch)
+                                batch = []
+            except OSError:
+                # deleted meanwhile, or not readable
+                pass
+            finally:
+                pending.task_done()
+
+    threads = [threading.Thread(target=walk, daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        pending.join()
+        for thread in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+    finally:
+        files.put(None)
+
+# Names per query (below the 999 host parameters of older SQLite builds), whatever the batch size
+NAMES_PER_QUERY = 400
+
+# Roots per query of pictures_with_roots(): two parameters each, and a
+# chain of OR that must stay below the expression depth limit of SQLite (1000)
+ROOTS_PER_QUERY = 100
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def referenced_names(names):
+    ''' the names of the files of resumes and pictures of profiles, and of the referenced blobs '''
+    referenced = set()
+    for chunk in chunks(names, NAMES_PER_QUERY):
+        referenced.update(UserProfile.objects.filter(resume_file__in=chunk).values_list('resume_file', flat=True))
+        referenced.update(UserProfile.objects.filter(picture__in=chunk).values_list('picture', flat=True))
+        # reference counts are trusted too, an upload may be about to use the blob
+        referenced.update(Blob.objects.filter(name__in=chunk, refcount__gt=0).values_list('name', flat=True))
+
+    return referenced
+
+def pictures_with_roots(roots):
+    ''' the names without extension of the pictures of profiles among roots '''
+    pictures = set()
+    for chunk in chunks(roots, ROOTS_PER_QUERY):
+        # a picture named root.<any extension>: root + '.' <= picture < root + '/'
+        condition = Q()
+        for root in chunk:
+            condition |= Q(picture__gte=root + '.', picture__lt=root + '/')
+
+        pictures.update(os.path.splitext(picture)[0] for picture in UserProfile.objects.filter(condition).values_list('picture', flat=True))
+
+    return pictures
+
+
+class Command(BaseCommand):
+    help = 'Deletes (or quarantines) the files of MEDIA_ROOT that no profile uses: replaced uploads, old avatars, temp files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=400, help='Number of files per batch of queries')
+        parser.add_argument('--workers', type=int, default=4, help='Number of threads walking the directories')
+        parser.add_argument('--min-age', type=float, default=BLOB_GRACE_SECONDS, help='Files modified more recently than this (seconds) are kept')
+        parser.add_argument('--quarantine', help='Move the orphaned files to this directory (same relative paths) instead of deleting them')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the orphaned files and their bytes')
+
+    def handle(self, *args, **options):
+        self.root = settings.MEDIA_ROOT
+        self.verbosity = options['verbosity']
+        self.dry_run = options['dry_run']
+        self.quarantine = options['quarantine'] and os.path.abspath(options['quarantine'])
+        self.max_mtime = time.time() - options['min_age']
+        if self.quarantine and self.quarantine.startswith(os.path.abspath(self.root) + os.sep):
+            raise CommandError('The quarantine directory must be outside of MEDIA_ROOT.')
+
+        directories = self.upload_directories()
+        self.scanned = self.orphans = self.orphan_bytes = self.removed = 0
+
+        # at most two batches per thread wait for their queries
+        files = queue.Queue(maxsize=2 * options['workers'])
+        scanner = threading.Thread(target=scan, args=(self.root, directories, files, options['workers'], options['batch_size']), daemon=True)
+        scanner.start()
+
+        batches = 0
+        while True:
+            batch = files.get()
+            if batch is None:
+                break
+
+            self.collect(batch)
+            batches += 1
+            if batches % 100 == 0:
+                self.report()
+
+        scanner.join()
+        self.report()
+
+        action = 'reclaimable' if self.dry_run else ('quarantined' if self.quarantine else 'reclaimed')
+        self.stdout.write(self.style.SUCCESS('Done, {0} files scanned, {1} orphaned files, {2} bytes {3}.'.format(
+            self.scanned, self.orphans, self.orphan_bytes, action,
+        )))
+
+    def upload_directories(self):
+        ''' the directories of MEDIA_ROOT written by hub (blobs, avatars and the old user_<id> ones) '''
+        if not os.path.isdir(self.root):
+            return []
+
+        with os.scandir(self.root) as entries:
+            return [
+                entry.name for entry in entries
+                if entry.is_dir(follow_symlinks=False) and (
+                    entry.name in (BLOB_DIRECTORY, AVATAR_DIRECTORY) or UPLOAD_DIRECTORY.match(entry.name)
+                )
+            ]
+
+    def collect(self, batch):
+        ''' removes the orphans of a batch of (name, size, mtime) with a few queries '''
+        self.scanned += len(batch)
+        # recent files may belong to uploads whose profile isn't committed yet
+        old = [(name, size) for name, size, mtime in batch if mtime <= self.max_mtime]
+
+        temp_files = [(name, size) for name, size in old if name.startswith(TEMP_DIRECTORY)]
+        variants = [(name, size, AVATAR_VARIANT.match(name)) for name, size in old if name.startswith(AVATAR_DIRECTORY + '/')]
+        uploads = [(name, size) for name, size in old if not name.startswith((TEMP_DIRECTORY, AVATAR_DIRECTORY + '/'))]
+
+        orphans = list(temp_files)
+
+        referenced = referenced_names([name for name, size in uploads])
+        orphans += [(name, size) for name, size in uploads if name not in referenced]
+
+        # files of the avatars directory that aren't variants are left alone
+        roots = pictures_with_roots({match.group(1) for name, size, match in variants if match})
+        orphans += [(name, size) for name, size, match in variants if match and match.group(1) not in roots]
+
+        for name, size in orphans:
+            self.orphans += 1
+            self.orphan_bytes += size
+            if self.verbosity >= 2:
+                self.stdout.write('  {0} ({1} bytes)'.format(name, size))
+            if not self.dry_run:
+                self.remove(name)
+
+        if not self.dry_run:
+            # their rows were kept at 0 references when the files were too recent to delete
+            for chunk in chunks([name for name, size in orphans if name.startswith(BLOB_DIRECTORY + '/')], NAMES_PER_QUERY):
+                Blob.objects.filter(name__in=chunk, refcount__lte=0).delete()
+
+    def remove(self, name):
+        ''' deletes or quarantines an orphaned file, unless it was used again since the scan '''
+        path = os.path.join(self.root, name)
+        try:
+            # an upload of the same content touches the blob before its profile is saved
+            if os.stat(path).st_mtime > self.max_mtime:
+                return
+
+            if self.quarantine:
+                target = os.path.join(self.quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            return
+
+        self.removed += 1
+        try:
+            # directories of the old uploads and of the blobs are made again when needed
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+    def report(self):
+        line = '{0} files scanned, {1} orphaned ({2} bytes)'.format(self.scanned, self.orphans, self.orphan_bytes)
+        if not self.dry_run:
+            line += ', {0} {1}'.format(self.removed, 'quarantined' if self.quarantine else 'deleted')
+        self.stdout.write(line)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from hub.models import *
+from hub.importing import FORMATS, RecordWriter, record_format
+from hub.storage import clean_extension
+
+
+class Command(BaseCommand):
+    help = 'Writes the users with profiles (and copies their files) in the format of import_users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='JSONL or CSV file to write, - for stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Format of the output (default: from its extension, else jsonl)')
+        parser.add_argument('--files-dir', help='Copy the resume files and pictures to this directory (default: no files)')
+        parser.add_argument('--with-passwords', action='store_true', help='Export the password hashes')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of profiles per batch')
+        parser.add_argument('--file-threads', type=int, default=8, help='Number of threads copying files')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        format = options['format'] or record_format(output)
+        files_dir = options['files_dir']
+        if files_dir:
+            os.makedirs(files_dir, exist_ok=True)
+            # file paths are relative to the output (as import_users reads them)
+            base_dir = os.path.dirname(os.path.abspath(output)) if output != '-' else os.getcwd()
+
+        profiles = UserProfile.objects.select_related('user').order_by('id').only(
+            'id', 'is_special', 'description', 'resume_file', 'picture',
+            'user__username', 'user__email', 'user__first_name', 'user__last_name', 'user__password',
+        )
+
+        exported = copied = 0
+        started = time.time()
+        last_id = 0
+
+        file = sys.stdout if output == '-' else open(output, 'w', newline='', encoding='utf-8')
+        writer = RecordWriter(file, format)
+        # progress goes to stderr when the records go to stdout
+        log = self.stderr if output == '-' else self.stdout
+
+        with ThreadPoolExecutor(max_workers=options['file_threads']) as copiers:
+            while True:
+                batch = list(profiles.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+
+                copies = []
+                for profile in batch:
+                    user = profile.user
+                    record = {
+                        'username': user.username,
+                        'email': user.email,
+                        'first_name': user.first_name,
+                        'last_name': user.last_name,
+                        'password': '',
+                        'password_hash': user.password if options['with_passwords'] else '',
+                        'is_special': profile.is_special,
+                        'description': profile.description,
+                        'resume_file': '',
+                        'picture': '',
+                    }
+
+                    if files_dir:
+                        for field, suffix in (('resume_file', 'resume'), ('picture', 'picture')):
+                            name = getattr(profile, field).name
+                            if name:
+                                path = os.path.join(files_dir, '{0}_{1}{2}'.format(user.username, suffix, clean_extension(name)))
+                                record[field] = os.path.relpath(path, base_dir)
+                                copies.append(copiers.submit(shutil.copyfile, getattr(profile, field).path, path))
+
+                    writer.write(record)
+
+                for future in copies:
+                    try:
+                        future.result()
+                        copied += 1
+                    except OSError as error:
+                        self.stderr.write(str(error))
+
+                exported += len(batch)
+                last_id = batch[-1].id
+                log.write('{0} profiles exported, {1} files ({2:.1f} profiles/s)'.format(
+                    exported, copied, exported / (time.time() - started)
+                ))
+
+        if file is not sys.stdout:
+            file.close()
+
+        log.write(self.style.SUCCESS('Done, {0} profiles exported, {1} files.'.format(exported, copied)))
@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from hub.models import *
+from hub.extraction import run_extraction
+from hub.tasks import save_extracted_text
+
+
+class Command(BaseCommand):
+    help = 'Extracts the plain text of uploaded resume files in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes (default: number of cores)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of profiles per batch')
+        parser.add_argument('--all', action='store_true', help='Extract all resumes again (default: the ones without text)')
+        parser.add_argument('--failed', action='store_true', help='Only retry the failed ones')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(resume_file='').order_by('id').only('id', 'resume_file')
+        if options['failed']:
+            profiles = profiles.filter(text_status=UserProfile.TEXT_FAILED)
+        elif not options['all']:
+            profiles = profiles.exclude(text_status=UserProfile.TEXT_DONE)
+
+        done = failed = 0
+        started = time.time()
+        last_id = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # one batch at a time keeps memory bounded on big tables
+                batch = list(profiles.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+
+                paths = [profile.resume_file.path for profile in batch]
+                results = pool.map(run_extraction, paths, chunksize=max(1, len(batch) // (options['workers'] * 4)))
+
+                for profile, result in zip(batch, results):
+                    save_extracted_text(profile.id, profile.resume_file.name, result)
+                    if result[1]:
+                        failed += 1
+                        self.stderr.write('profile {0}: {1}'.format(profile.id, result[1]))
+                    else:
+                        done += 1
+
+                last_id = batch[-1].id
+                self.stdout.write('{0} extracted, {1} failed ({2:.1f} files/s)'.format(
+                    done, failed, (done + failed) / (time.time() - started)
+                ))
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} extracted, {1} failed.'.format(done, failed)))
@@ -0,0 +1,53 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from hub.models import *
+from hub.images import make_avatars
+from hub.tasks import save_avatars
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized variants of existing profile pictures in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes (default: number of cores)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of profiles per batch')
+        parser.add_argument('--all', action='store_true', help='Generate all variants again (default: the missing ones)')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(picture='').order_by('id').only('id', 'picture')
+        if not options['all']:
+            profiles = profiles.exclude(picture_variants=F('picture'))
+
+        done = failed = 0
+        started = time.time()
+        last_id = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(profiles.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+
+                names = [profile.picture.name for profile in batch]
+                errors = pool.map(partial(make_avatars, settings.MEDIA_ROOT), names)
+
+                for profile, error in zip(batch, errors):
+                    save_avatars(profile.id, profile.picture.name, error)
+                    if error:
+                        failed += 1
+                        self.stderr.write('profile {0}: {1}'.format(profile.id, error))
+                    else:
+                        done += 1
+
+                last_id = batch[-1].id
+                self.stdout.write('{0} pictures done, {1} failed ({2:.1f} pictures/s)'.format(
+                    done, failed, (done + failed) / (time.time() - started)
+                ))
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} pictures done, {1} failed.'.format(done, failed)))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from hub.bench.dataset import generate_dataset, clear_dataset, USERNAME_PREFIX, PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Bulk-creates users, profiles and comments (with Zipf skew) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users (with profiles)')
+        parser.add_argument('--comments', type=int, default=10000, help='Number of comments')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of comments per resume and per user (0: uniform)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of rows per INSERT')
+        parser.add_argument('--clear', action='store_true', help='Delete the generated users first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write('{0} generated objects deleted.'.format(clear_dataset()))
+
+        started = time.time()
+        profile_ids = generate_dataset(
+            users=options['users'],
+            comments=options['comments'],
+            skew=options['skew'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=self.stdout.write,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            'Done in {0:.1f} s, {1} users ({2}*, password {3}), most commented resume: {4}.'.format(
+                time.time() - started, len(profile_ids), USERNAME_PREFIX, PASSWORD, profile_ids[0] if profile_ids else None
+            )
+        ))
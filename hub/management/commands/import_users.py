@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from hub.models import *
+from hub.blobs import acquire
+from hub.importing import FORMATS, RecordError, record_format, read_records, clean_record, hash_password, store_file
+from hub.search import index_profile
+
+
+class Command(BaseCommand):
+    help = 'Creates users with profiles (and their resume files and pictures) from a JSONL or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file of the users, - for stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Format of the file (default: from its extension, else jsonl)')
+        parser.add_argument('--files-dir', help='Directory that resume_file and picture paths are relative to (default: the directory of the file)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of users per batch')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of password hashing processes (default: number of cores)')
+        parser.add_argument('--file-threads', type=int, default=8, help='Number of threads copying files')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and hash everything but write nothing, report the throughput')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or record_format(path)
+        self.files_dir = options['files_dir'] or (os.path.dirname(os.path.abspath(path)) if path != '-' else os.getcwd())
+        self.dry_run = options['dry_run']
+
+        self.created = self.skipped = self.invalid = self.files = 0
+        self.seen = set()
+        started = time.time()
+
+        if path == '-':
+            file = sys.stdin
+        else:
+            try:
+                file = open(path, newline='', encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+
+        records = read_records(file, format)
+
+        with file, ProcessPoolExecutor(max_workers=options['workers']) as hashers, \
+                ThreadPoolExecutor(max_workers=options['file_threads']) as copiers:
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+
+                self.import_batch(batch, hashers, copiers, options['workers'])
+                self.stdout.write('{0} users {1}, {2} skipped, {3} invalid ({4:.1f} users/s)'.format(
+                    self.created, 'would be created' if self.dry_run else 'created',
+                    self.skipped, self.invalid, self.created / (time.time() - started),
+                ))
+
+        elapsed = time.time() - started
+        rate = self.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS('Done in {0:.1f} s, {1} users {2} ({3:.1f} users/s), {4} files, {5} skipped, {6} invalid.'.format(
+            elapsed, self.created, 'would be created' if self.dry_run else 'created', rate, self.files, self.skipped, self.invalid
+        )))
+        if self.dry_run and rate:
+            self.stdout.write('At this rate 50000 users take {0:.1f} minutes.'.format(50000 / rate / 60))
+        if self.created and not self.dry_run:
+            self.stdout.write('Run extract_resume_text, generate_avatars and rebuild_similar_resumes for the text, thumbnails and similar resumes of the new files.')
+
+    def clean_batch(self, batch):
+        ''' valid records of a batch whose usernames are new '''
+        records = []
+        for record in batch:
+            try:
+                record = clean_record(record)
+            except RecordError as error:
+                self.invalid += 1
+                self.stderr.write(str(error))
+                continue
+
+            if record['username'] in self.seen:
+                self.skipped += 1
+                self.stderr.write('{0}: username is repeated in the file'.format(record['username']))
+                continue
+
+            self.seen.add(record['username'])
+            records.append(record)
+
+        existing = set(User.objects.filter(username__in=[record['username'] for record in records]).values_list('username', flat=True))
+        for username in existing:
+            self.stderr.write('{0}: user exists'.format(username))
+        self.skipped += len(existing)
+
+        return [record for record in records if record['username'] not in existing]
+
+    def file_path(self, record, field):
+        ''' absolute path of a file of a record, or None '''
+        if not record[field]:
+            return None
+
+        path = os.path.join(self.files_dir, record[field])
+        if not os.path.isfile(path):
+            self.stderr.write('{0}: {1} {2} is missing'.format(record['username'], field, path))
+            return None
+
+        return path
+
+    def import_batch(self, batch, hashers, copiers, workers):
+        records = self.clean_batch(batch)
+        if not records:
+            return
+
+        # the slow part: hash the passwords on all cores while the files are copied
+        passwords = [record['password'] for record in records if not record['password_hash']]
+        hashes = hashers.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+
+        file_jobs = []
+        for record in records:
+            for field in ('resume_file', 'picture'):
+                path = self.file_path(record, field)
+                record[field] = ''
+                if path:
+                    # the size only, for a dry run
+                    future = copiers.submit(os.path.getsize if self.dry_run else store_file, path)
+                    file_jobs.append((record, field, future))
+
+        hashes = iter(list(hashes))
+        for record in records:
+            if not record['password_hash']:
+                record['password_hash'] = next(hashes)
+
+        for record, field, future in file_jobs:
+            try:
+                name = future.result()
+            except OSError as error:
+                self.stderr.write('{0}: {1} could not be copied: {2}'.format(record['username'], field, error))
+                continue
+            record[field] = name if not self.dry_run else ''
+            self.files += 1
+
+        self.created += len(records)
+        if self.dry_run:
+            return
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(
+                    username=record['username'],
+                    email=record['email'],
+                    first_name=record['first_name'][:30],
+                    last_name=record['last_name'][:150],
+                    password=record['password_hash'],
+                )
+                for record in records
+            ])
+
+            # bulk_create() doesn't set the ids on all databases
+            user_ids = dict(User.objects.filter(username__in=[record['username'] for record in records]).values_list('username', 'id'))
+
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user_id=user_ids[record['username']],
+                    is_special=record['is_special'],
+                    description=record['description'],
+                    summary=summarize(record['description']),
+                    resume_file=record['resume_file'],
+                    picture=record['picture'],
+                )
+                for record in records
+            ])
+
+            # bulk_create() doesn't send post_save, do what its receivers do
+            for profile in UserProfile.objects.filter(user_id__in=user_ids.values()).select_related('user'):
+                acquire(profile.resume_file.name)
+                acquire(profile.picture.name)
+                index_profile(profile)
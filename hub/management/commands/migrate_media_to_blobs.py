@@ -0,0 +1,110 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from hub.models import *
+from hub.blobs import acquire
+from hub.images import AVATAR_SIZES, AVATAR_FORMATS, avatar_name
+from hub.signals import invalidate_resumes, commented_resume_ids, showing_resume_ids
+from hub.storage import blob_storage, is_blob_name
+
+
+class Command(BaseCommand):
+    help = 'Moves existing uploads (user_<id>/<filename>) to the content-addressed blob storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of profiles per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.moved = self.missing = 0
+        self.bytes_before = 0
+        self.new_blobs = set()
+
+        profiles = UserProfile.objects.order_by('id').only('id', 'user_id', 'resume_file', 'picture', 'picture_variants')
+
+        last_id = 0
+        while True:
+            batch = list(profiles.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+
+            for profile in batch:
+                changed = [self.migrate(profile, field) for field in ('resume_file', 'picture')]
+                if any(changed) and not self.dry_run:
+                    invalidate_resumes([profile.id] + list(commented_resume_ids(profile.user_id)) + list(showing_resume_ids([profile.id])))
+
+            last_id = batch[-1].id
+            self.stdout.write('{0} files moved (up to profile {1})'.format(self.moved, last_id))
+
+        bytes_after = sum(blob_storage.size(name) for name in self.new_blobs) if not self.dry_run else None
+        self.stdout.write(self.style.SUCCESS(
+            'Done, {0} files {1}, {2} missing, {3} bytes before{4}.'.format(
+                self.moved,
+                'would be moved' if self.dry_run else 'moved',
+                self.missing,
+                self.bytes_before,
+                ', {0} bytes in new blobs'.format(bytes_after) if bytes_after is not None else '',
+            )
+        ))
+
+    def migrate(self, profile, field):
+        ''' moves one file of a profile to a blob, returns True if it was moved '''
+        old_name = getattr(profile, field).name
+        if not old_name or is_blob_name(old_name):
+            return False
+
+        old_path = os.path.join(settings.MEDIA_ROOT, old_name)
+        if not os.path.exists(old_path):
+            self.missing += 1
+            self.stderr.write('profile {0}: {1} is missing'.format(profile.id, old_name))
+            return False
+
+        self.bytes_before += os.path.getsize(old_path)
+        self.moved += 1
+        if self.dry_run:
+            return False
+
+        with open(old_path, 'rb') as old_file:
+            new_name = blob_storage.save(old_name, File(old_file))
+        self.new_blobs.add(new_name)
+
+        changes = {field: new_name}
+        has_variants = field == 'picture' and profile.picture_variants == old_name
+        if has_variants:
+            changes['picture_variants'] = new_name
+
+        with transaction.atomic():
+            # unless the profile got a new file meanwhile
+            updated = UserProfile.objects.filter(pk=profile.pk, **{field: old_name}).update(**changes)
+            if updated:
+                acquire(new_name)
+
+        if not updated:
+            return False
+
+        if has_variants:
+            self.move_avatars(old_name, new_name)
+
+        os.remove(old_path)
+
+        return True
+
+    def move_avatars(self, old_name, new_name):
+        ''' renames the resized variants of a picture for its new name '''
+        for slot in AVATAR_SIZES:
+            for extension in AVATAR_FORMATS:
+                old_path = os.path.join(settings.MEDIA_ROOT, avatar_name(old_name, slot, extension))
+                new_path = os.path.join(settings.MEDIA_ROOT, avatar_name(new_name, slot, extension))
+                if not os.path.exists(old_path):
+                    continue
+
+                if os.path.exists(new_path):
+                    # the same picture is used by another profile
+                    os.remove(old_path)
+                else:
+                    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                    os.replace(old_path, new_path)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from hub.search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of resumes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of profiles per batch')
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('Full-text search is only available on SQLite (FTS5).')
+
+        def progress(indexed):
+            self.stdout.write('{0} resumes indexed'.format(indexed))
+
+        # searches keep seeing the old index until the new one is complete
+        with transaction.atomic():
+            indexed = rebuild_index(batch_size=options['batch_size'], progress=progress)
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} resumes indexed.'.format(indexed)))
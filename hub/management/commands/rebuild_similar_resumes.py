@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from hub.similar import rebuild_similar, sparse, SIMILAR_COUNT
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the similar resumes of every resume from the TF-IDF vectors of their words'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of profiles per batch (and rows per block of the similarity matrix)')
+        parser.add_argument('--count', type=int, default=SIMILAR_COUNT, help='Number of similar resumes of each resume')
+
+    def handle(self, *args, **options):
+        if sparse is None:
+            self.stderr.write('SciPy is not installed, the similarities are computed in Python (slower).')
+
+        resumes, words, similar = rebuild_similar(
+            count=options['count'], batch_size=options['batch_size'], progress=self.stdout.write,
+        )
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} resumes, {1} words, {2} similar resumes.'.format(resumes, words, similar)))
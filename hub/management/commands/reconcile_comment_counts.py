@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from hub.models import *
+from hub.counters import recount_comments
+
+
+class Command(BaseCommand):
+    help = 'Recomputes comment_count and last_comment_at of the profiles from the comments in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of profiles per batch')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.order_by('id')
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            ids = list(profiles.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+
+            checked += len(ids)
+            fixed += recount_comments(UserProfile.objects.filter(id__in=ids))
+            last_id = ids[-1]
+            self.stdout.write('{0} profiles checked, {1} fixed'.format(checked, fixed))
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} profiles checked, {1} fixed.'.format(checked, fixed)))
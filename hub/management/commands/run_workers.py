@@ -0,0 +1,97 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from hub.models import *
+from hub import jobs
+from hub.caching import shared_cache
+
+
+class Command(BaseCommand):
+    help = 'Runs the jobs of the queue in worker processes and reports the depth of the queue and the latency of the jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'HUB_JOB_WORKERS', 2) or 1,
+            help='Number of worker processes (default: HUB_JOB_WORKERS), 1 runs the jobs in this process',
+        )
+        parser.add_argument('--burst', action='store_true', help='Stop once there are no ready jobs')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between the reports')
+
+    def handle(self, *args, **options):
+        if not shared_cache():
+            # the jobs bump the cache versions of the pages they change
+            raise CommandError(
+                'The cache is in the memory of each process (LocMemCache), the web processes would not see '
+                'the changes of the jobs: configure a shared cache in CACHES (the web processes run the jobs meanwhile).'
+            )
+
+        self.started = timezone.now()
+        self.interval = options['interval']
+        self.next_report = time.time() + self.interval
+
+        try:
+            if options['workers'] <= 1:
+                self.run_here(options['burst'])
+            else:
+                self.run_processes(options['workers'], options['burst'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+
+        stats = self.report()
+        self.stdout.write(self.style.SUCCESS('Done, {0} jobs finished, {1} queued.'.format(stats['finished'], stats[Job.QUEUED])))
+
+    def run_here(self, burst):
+        def stop():
+            # between the jobs
+            if time.time() >= self.next_report:
+                self.maintain()
+                self.report()
+            return False
+
+        jobs.work(burst=burst, stop=stop)
+
+    def run_processes(self, count, burst):
+        # forked from this process: the workers open their own database connections
+        connections.close_all()
+        stop_event = multiprocessing.Event()
+
+        def start():
+            process = multiprocessing.Process(target=jobs.worker_process, args=(burst, stop_event), daemon=True)
+            process.start()
+            return process
+
+        processes = [start() for i in range(count)]
+        try:
+            while any(process.is_alive() for process in processes):
+                time.sleep(min(1, self.interval))
+
+                if not burst:
+                    # a worker that crashed is replaced, its job is queued again by maintain()
+                    processes = [process if process.is_alive() else start() for process in processes]
+
+                if time.time() >= self.next_report:
+                    self.maintain()
+                    self.report()
+        finally:
+            stop_event.set()
+            for process in processes:
+                process.join()
+
+    def maintain(self):
+        lost = jobs.requeue_lost_jobs()
+        if lost:
+            self.stderr.write('{0} lost jobs queued again'.format(lost))
+        jobs.purge_done_jobs()
+
+    def report(self):
+        stats = jobs.queue_stats(self.started)
+        self.stdout.write(
+            '{queued} queued ({ready} ready), {running} running, {failed} failed; '
+            '{finished} finished, latency p50 {latency_p50:.2f} s, p95 {latency_p95:.2f} s, run time p95 {run_p95:.2f} s'.format(**stats)
+        )
+        self.next_report = time.time() + self.interval
+        return stats
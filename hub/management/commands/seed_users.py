@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from hub.models import *
+
+
+class Command(BaseCommand):
+    help = 'Creates the specific users (admin and teacher) if they don\'t exist'
+
+    def handle(self, *args, **options):
+        init_users()
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
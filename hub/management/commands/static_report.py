@@ -0,0 +1,142 @@
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from hub.models import *
+from hub.staticfiles import OPTIMIZERS, compressed_siblings
+
+
+# References of the pages (the files they load, not links) and of the stylesheets to static files
+PAGE_REFERENCE = re.compile(r'''<(?:script|img|source|link)\b[^>]*?\b(?:src|href)\s*=\s*["']([^"']+)["']''')
+CSS_REFERENCE = re.compile(r'''url\(\s*["']?([^"')]+)["']?\s*\)|@import\s+["']([^"']+)["']''')
+
+
+def source_name(url):
+    ''' name of the static file of a URL (without the fingerprint), or None '''
+    if not url.startswith(settings.STATIC_URL):
+        return None
+
+    name = url[len(settings.STATIC_URL):].split('?')[0].split('#')[0]
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    if hashed_files:
+        for original, hashed in hashed_files.items():
+            if hashed == name:
+                return original
+
+    return name
+
+def stylesheet_references(name, content):
+    ''' names of the static files referenced by a stylesheet '''
+    # commented out references aren't loaded
+    content = re.sub(r'/\*.*?\*/', '', content, flags=re.S)
+
+    names = []
+    for match in CSS_REFERENCE.finditer(content):
+        reference = (match.group(1) or match.group(2)).strip()
+        if reference.startswith(('http:', 'https:', '//', 'data:', '#')):
+            continue
+        names.append(posixpath.normpath(posixpath.join(posixpath.dirname(name), reference.split('?')[0].split('#')[0])))
+
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Reports the bytes of the static files of pages before and after the static build (optimization and precompression)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Paths of the pages (default: index, about and a resume)')
+        parser.add_argument('--username', help='Log in as this user first (for the pages of logged in users)')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        client = Client(HTTP_HOST='localhost')
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError('There is no user {0}.'.format(options['username']))
+            client.force_login(user)
+        self.sizes = {}
+
+        totals = [0, 0, 0, 0]
+        for path in paths:
+            response = client.get(path)
+            if response.status_code != 200:
+                raise CommandError('{0} returned {1}'.format(path, response.status_code))
+
+            names = []
+            for url in PAGE_REFERENCE.findall(response.content.decode('utf-8')):
+                name = source_name(url)
+                if name:
+                    names.append(name)
+            names = self.with_references(names)
+
+            page = [0, 0, 0, 0]
+            self.stdout.write(path)
+            for name in names:
+                sizes = self.file_sizes(name)
+                if sizes is None:
+                    self.stderr.write('  {0}: not found'.format(name))
+                    continue
+                self.stdout.write('  {0:<48} {1:>9} {2:>9} {3:>9} {4:>9}'.format(name, *sizes))
+                page = [total + size for total, size in zip(page, sizes)]
+
+            self.stdout.write('  {0:<48} {1:>9} {2:>9} {3:>9} {4:>9}  saved {5} bytes ({6:.0f}%)'.format(
+                'total (original, optimized, gzip, brotli)', *page,
+                page[0] - min(page[1:]), 100 * (page[0] - min(page[1:])) / (page[0] or 1),
+            ))
+            totals = [total + size for total, size in zip(totals, page)]
+
+        self.stdout.write(self.style.SUCCESS('Done, {0} pages: {1} bytes of static files, {2} after the build.'.format(
+            len(paths), totals[0], min(totals[1:]),
+        )))
+
+    def default_paths(self):
+        paths = [reverse(name) for name in ('hub:index', 'hub:about')]
+        resume_id = UserProfile.objects.exclude(resume_file='').values_list('id', flat=True).first()
+        if resume_id:
+            paths.append(reverse('hub:resume', args=[resume_id]))
+
+        return paths
+
+    def with_references(self, names):
+        ''' the names and the files that their stylesheets load, each once '''
+        found = []
+        pending = list(names)
+        while pending:
+            name = pending.pop(0)
+            if name in found:
+                continue
+            found.append(name)
+
+            if name.endswith('.css'):
+                path = finders.find(name)
+                if path:
+                    with open(path, encoding='utf-8') as file:
+                        pending += stylesheet_references(name, file.read())
+
+        return found
+
+    def file_sizes(self, name):
+        ''' (original, optimized, gzip, brotli) bytes of a static file, the smallest one so far when not compressed '''
+        if name not in self.sizes:
+            path = finders.find(name)
+            if not path:
+                return None
+
+            with open(path, 'rb') as file:
+                content = file.read()
+
+            optimizer = OPTIMIZERS.get(os.path.splitext(name)[1].lower())
+            optimized = (optimizer(content) if optimizer else None) or content
+
+            siblings = compressed_siblings(optimized)
+            gzipped = len(siblings.get('.gz', optimized))
+            self.sizes[name] = (len(content), len(optimized), gzipped, len(siblings.get('.br', b'')) or gzipped)
+
+        return self.sizes[name]
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from hub.db import sqlite_pragmas
+from hub.routers import REPLICA, synced_file
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database to the read replica (once or every --interval seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Copy again every this many seconds (default: once)')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError('There is no "{0}" database, see HUB_DATABASE_PROFILE in the settings.'.format(REPLICA))
+
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES[REPLICA]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite databases are copied, other databases have their own replication.')
+
+        while True:
+            started = time.time()
+            self.sync(primary['NAME'], replica['NAME'])
+            self.stdout.write('{0} copied to {1} in {2:.2f} s'.format(primary['NAME'], replica['NAME'], time.time() - started))
+
+            if not options['interval']:
+                break
+            time.sleep(max(options['interval'] - (time.time() - started), 0))
+
+    def sync(self, primary_name, replica_name):
+        '''
+        Copies the primary to the replica with the online backup API: a
+        consistent snapshot (writers of the primary aren't blocked), written
+        in one transaction, so readers of the replica see the old or the new copy.
+        Then records the time of the snapshot (see hub.caching.replica_behind).
+        '''
+        # before the copy: changes committed during it may be missing
+        synced = int(time.time() * 10**6)
+        source = sqlite3.connect(primary_name)
+        target = sqlite3.connect(replica_name)
+        try:
+            for pragma in sqlite_pragmas():
+                target.execute(pragma)
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        with open(synced_file(replica_name) + '.tmp', 'w') as file:
+            file.write(str(synced))
+        os.replace(synced_file(replica_name) + '.tmp', synced_file(replica_name))
@@ -0,0 +1,195 @@
+import bisect
+import heapq
+import itertools
+import threading
+
+from django.conf import settings
+
+
+# Upper bounds of the latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds of the histogram buckets of SQL queries per request
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Fraction of the requests whose SQL queries are captured (0 to 1), the
+# slowest SLOW_REQUESTS of them are kept for the metrics endpoint
+SLOW_SAMPLE_RATE = getattr(settings, 'HUB_METRICS_SLOW_SAMPLE_RATE', 0.0)
+SLOW_REQUESTS = getattr(settings, 'HUB_METRICS_SLOW_REQUESTS', 20)
+
+# Clients with these addresses (REMOTE_ADDR) can read the metrics without logging in,
+# none by default: behind a local proxy every client is 127.0.0.1
+ALLOWED_ADDRESSES = tuple(getattr(settings, 'HUB_METRICS_ALLOWED_IPS', ()))
+
+
+class Histogram():
+    ''' cumulative-bucket histogram in the Prometheus sense (not thread-safe, see Metrics) '''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        ''' (upper bound, number of observations <= bound) including +Inf '''
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(bounds, itertools.accumulate(self.counts)))
+
+
+class ViewMetrics():
+    ''' aggregated measurements of the requests of one view '''
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_seconds = 0
+        self.template_seconds = 0
+        self.response_bytes = 0
+        self.responses = {}
+
+
+class TemplateMetrics():
+    ''' aggregated render times of one template (self: without the templates it includes) '''
+
+    def __init__(self):
+        self.renders = 0
+        self.seconds = 0
+        self.self_seconds = 0
+
+    def as_dict(self):
+        return {'renders': self.renders, 'seconds': self.seconds, 'self_seconds': self.self_seconds}
+
+
+class Metrics():
+    '''
+    Thread-safe in-process registry of the request measurements per view
+    (each worker process of the web server has its own)
+    '''
+
+    def __init__(self, slow_requests=SLOW_REQUESTS):
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self.views = {}
+        self.templates = {}
+        self.slow_requests = slow_requests
+        self.slowest = []
+
+    def record(self, view, status, duration, queries, query_seconds, template_seconds, response_bytes, captured=None, templates=None):
+        ''' templates: {template name: (renders, seconds, self seconds)} of the request '''
+        with self._lock:
+            metrics = self.views.get(view)
+            if metrics is None:
+                metrics = self.views[view] = ViewMetrics()
+
+            metrics.latency.observe(duration)
+            metrics.queries.observe(queries)
+            metrics.query_seconds += query_seconds
+            metrics.template_seconds += template_seconds
+            metrics.response_bytes += response_bytes
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+            for name, (renders, seconds, self_seconds) in (templates or {}).items():
+                totals = self.templates.get(name)
+                if totals is None:
+                    totals = self.templates[name] = TemplateMetrics()
+                totals.renders += renders
+                totals.seconds += seconds
+                totals.self_seconds += self_seconds
+
+            if captured is not None and self.slow_requests:
+                # min-heap of the slowest sampled requests (the counter breaks ties)
+                entry = (duration, next(self._counter), {
+                    'view': view,
+                    'status': status,
+                    'duration': duration,
+                    'queries': captured,
+                    'templates': {
+                        name: {'renders': renders, 'seconds': seconds, 'self_seconds': self_seconds}
+                        for name, (renders, seconds, self_seconds) in (templates or {}).items()
+                    },
+                })
+                if len(self.slowest) < self.slow_requests:
+                    heapq.heappush(self.slowest, entry)
+                elif duration > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def slowest_requests(self):
+        ''' the sampled slow requests with their SQL queries, slowest first '''
+        with self._lock:
+            return [request for duration, counter, request in sorted(self.slowest, reverse=True)]
+
+    def template_times(self):
+        ''' {template name: render totals}, the templates with the most time of their own first '''
+        with self._lock:
+            totals = sorted(self.templates.items(), key=lambda item: item[1].self_seconds, reverse=True)
+            return [dict(template=name, **metrics.as_dict()) for name, metrics in totals]
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+            self.templates = {}
+            self.slowest = []
+
+    def prometheus(self, cache_stats=None):
+        ''' the metrics in the Prometheus text exposition format '''
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+
+        def histogram(name, help_text, attribute):
+            metric(name, 'histogram', help_text)
+            for view, metrics in views:
+                histogram = getattr(metrics, attribute)
+                for bound, count in histogram.cumulative():
+                    lines.append('{0}_bucket{{view="{1}",le="{2}"}} {3}'.format(name, view, bound, count))
+                lines.append('{0}_sum{{view="{1}"}} {2}'.format(name, view, histogram.sum))
+                lines.append('{0}_count{{view="{1}"}} {2}'.format(name, view, histogram.count))
+
+        def counter(name, help_text, attribute):
+            metric(name, 'counter', help_text)
+            for view, metrics in views:
+                lines.append('{0}{{view="{1}"}} {2}'.format(name, view, getattr(metrics, attribute)))
+
+        with self._lock:
+            views = sorted(self.views.items())
+
+            metric('hub_requests_total', 'counter', 'Responses by view and status code.')
+            for view, metrics in views:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append('hub_requests_total{{view="{0}",status="{1}"}} {2}'.format(view, status, count))
+
+            histogram('hub_request_duration_seconds', 'Time to the response of the view (seconds).', 'latency')
+            histogram('hub_request_queries', 'SQL queries per request.', 'queries')
+            counter('hub_request_query_seconds_total', 'Time spent in SQL queries (seconds).', 'query_seconds')
+            counter('hub_request_template_seconds_total', 'Time spent rendering templates (seconds).', 'template_seconds')
+            counter('hub_response_bytes_total', 'Size of the response bodies (bytes).', 'response_bytes')
+
+            templates = sorted(self.templates.items())
+            for name, attribute, help_text in (
+                ('hub_template_renders_total', 'renders', 'Renders of each template (includes and inclusion tags too).'),
+                ('hub_template_seconds_total', 'seconds', 'Time rendering each template, with the templates it includes (seconds).'),
+                ('hub_template_self_seconds_total', 'self_seconds', 'Time rendering each template, without the templates it includes (seconds).'),
+            ):
+                metric(name, 'counter', help_text)
+                for template, metrics in templates:
+                    lines.append('{0}{{template="{1}"}} {2}'.format(name, template, getattr(metrics, attribute)))
+
+        for cache_name, stats in sorted((cache_stats or {}).items()):
+            stats = stats.as_dict()
+            metric('hub_{0}_cache_hits_total'.format(cache_name), 'counter', 'Hits of the {0} cache.'.format(cache_name))
+            lines.append('hub_{0}_cache_hits_total {1}'.format(cache_name, stats['hits']))
+            metric('hub_{0}_cache_misses_total'.format(cache_name), 'counter', 'Misses of the {0} cache.'.format(cache_name))
+            lines.append('hub_{0}_cache_misses_total {1}'.format(cache_name, stats['misses']))
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
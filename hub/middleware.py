@@ -0,0 +1,242 @@
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse
+from django.middleware.gzip import GZipMiddleware
+from django.template.base import Template
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from hub.metrics import metrics, SLOW_SAMPLE_RATE
+from hub.staticfiles import COMPRESSIBLE_EXTENSIONS, ENCODINGS
+
+
+# Measurements of the request that the current thread is handling
+_local = threading.local()
+
+
+class RequestMeasurements():
+    ''' SQL and template time of one request (and its queries if it is sampled) '''
+
+    def __init__(self, capture):
+        self.queries = 0
+        self.query_seconds = 0
+        self.template_seconds = 0
+        # {template name: [renders, seconds, seconds without the templates it includes]}
+        self.templates = {}
+        # time of the included templates of each template being rendered
+        self.template_stack = []
+        self.captured = [] if capture else None
+
+    def __call__(self, execute, sql, params, many, context):
+        ''' execute wrapper of the database connections '''
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.query_seconds += duration
+            if self.captured is not None:
+                self.captured.append({'sql': sql, 'many': many, 'duration': duration})
+
+    def template_rendered(self, name, duration, included):
+        totals = self.templates.get(name)
+        if totals is None:
+            totals = self.templates[name] = [0, 0, 0]
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] += duration - included
+
+
+def timed_render(render):
+    '''
+    wraps Template.render to time each template (and the templates it
+    includes, inclusion tags too, a base template counts in the one that
+    extends it) during a measured request, the outermost renders add up to
+    the template time of the request
+    '''
+    def wrapper(self, context):
+        measurements = getattr(_local, 'measurements', None)
+        if measurements is None:
+            return render(self, context)
+
+        stack = measurements.template_stack
+        stack.append(0)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            duration = time.perf_counter() - started
+            included = stack.pop()
+            measurements.template_rendered(self.name or '<string>', duration, included)
+            if stack:
+                stack[-1] += duration
+            else:
+                measurements.template_seconds += duration
+
+    wrapper.timed = True
+    return wrapper
+
+
+class MetricsMiddleware():
+    '''
+    Records the latency, SQL query count and time, template render time
+    and response size of each request per URL name in hub.metrics,
+    served by the metrics view
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if not getattr(Template.render, 'timed', False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        measurements = RequestMeasurements(capture=SLOW_SAMPLE_RATE and random.random() < SLOW_SAMPLE_RATE)
+        _local.measurements = measurements
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(measurements))
+                response = self.get_response(request)
+        finally:
+            _local.measurements = None
+
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        if response.streaming:
+            # not read yet, the declared size if any
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+
+        metrics.record(
+            view, response.status_code, duration,
+            measurements.queries, measurements.query_seconds, measurements.template_seconds, size,
+            measurements.captured, measurements.templates,
+        )
+
+        return response
+
+
+# Names fingerprinted by hub.staticfiles.CompressedManifestStaticFilesStorage (name.<md5[:12]>.ext)
+FINGERPRINTED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+# Seconds that browsers may cache the static files (fingerprinted ones never change)
+STATIC_MAX_AGE = getattr(settings, 'HUB_STATIC_MAX_AGE', 60 * 60)
+STATIC_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def accepted_encodings(header):
+    ''' the content codings of an Accept-Encoding header that aren't refused (q=0) '''
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if coding and not (quality and float(quality.group(1) or 0) == 0):
+            encodings.add(coding.strip().lower())
+
+    return encodings
+
+
+class PrecompressedStaticMiddleware():
+    '''
+    Serves the files of STATIC_ROOT (as written by collectstatic) at
+    STATIC_URL: the .br or .gz sibling of a file when the client accepts
+    it, with far-future immutable caching for the fingerprinted names,
+    without going through the rest of the middleware. Other requests
+    (and missing files) pass through.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if not settings.STATIC_ROOT or not settings.STATIC_URL.startswith('/'):
+            # nothing collected to serve, or served from another host
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(settings.STATIC_URL):
+            response = self.serve(request, request.path_info[len(settings.STATIC_URL):])
+            if response is not None:
+                return response
+
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except ValueError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(path)
+        encoding = None
+        compressible = name.endswith(COMPRESSIBLE_EXTENSIONS)
+
+        if compressible:
+            accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            for suffix, coding in ENCODINGS:
+                if coding in accepted and os.path.isfile(path + suffix):
+                    path += suffix
+                    encoding = coding
+                    break
+
+        stat = os.stat(path)
+        etag = '"{0:x}-{1:x}{2}"'.format(int(stat.st_mtime), stat.st_size, '-' + encoding if encoding else '')
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = stat.st_size
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if FINGERPRINTED_NAME.search(name):
+            response['Cache-Control'] = 'public, max-age={0}, immutable'.format(STATIC_IMMUTABLE_MAX_AGE)
+        else:
+            response['Cache-Control'] = 'public, max-age={0}'.format(STATIC_MAX_AGE)
+        if compressible:
+            patch_vary_headers(response, ('Accept-Encoding',))
+
+        return response
+
+
+# Content types of the responses that TextGZipMiddleware compresses
+COMPRESSIBLE_CONTENT_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+# Smaller responses aren't worth compressing (bytes)
+GZIP_MIN_BYTES = getattr(settings, 'HUB_GZIP_MIN_BYTES', 1024)
+
+
+class TextGZipMiddleware(GZipMiddleware):
+    '''
+    GZipMiddleware for the text responses (pages, JSON) of at least
+    HUB_GZIP_MIN_BYTES, streamed ones are compressed as they stream.
+    Files (resume downloads, pictures) are sent as they are.
+    '''
+
+    def process_response(self, request, response):
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+        if not response.streaming and len(response.content) < GZIP_MIN_BYTES:
+            return response
+
+        return super().process_response(request, response)
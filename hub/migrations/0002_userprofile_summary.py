@@ -0,0 +1,18 @@
+# Generated by Django 2.0.7 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='summary',
+            field=models.CharField(blank=True, max_length=180),
+        ),
+    ]
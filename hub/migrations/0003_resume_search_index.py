@@ -0,0 +1,39 @@
+# Generated by Django 2.0.7 on 2026-10-18 16:10
+
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    # rowid of the table is the UserProfile id
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS hub_resume_fts USING fts5("
+        "name, description, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+    # index the existing resumes
+    schema_editor.execute(
+        "INSERT INTO hub_resume_fts (rowid, name, description, body) "
+        "SELECT p.id, trim(u.first_name || ' ' || u.last_name), p.description, '' "
+        "FROM hub_userprofile p JOIN auth_user u ON u.id = p.user_id "
+        "WHERE p.resume_file != ''"
+    )
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute('DROP TABLE IF EXISTS hub_resume_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0002_userprofile_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.7 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0004_userprofile_resume_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_variants',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.0.7 on 2026-10-18 17:10
+
+from django.db import migrations, models
+import hub.models
+import hub.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0005_userprofile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='picture',
+            field=models.ImageField(blank=True, storage=hub.storage.ContentAddressedStorage(), upload_to=hub.models.user_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='resume_file',
+            field=models.FileField(blank=True, storage=hub.storage.ContentAddressedStorage(), upload_to=hub.models.user_directory_path),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.0.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+def create_feed_index(apps, schema_editor):
+    # the feed only lists profiles with a resume file (see hub.feed.recent_resumes)
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(
+            "CREATE INDEX hub_userprofile_feed_idx ON hub_userprofile (updated_at, id) "
+            "WHERE NOT (resume_file = '')"
+        )
+    else:
+        schema_editor.execute('CREATE INDEX hub_userprofile_feed_idx ON hub_userprofile (updated_at, id)')
+
+def drop_feed_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX hub_userprofile_feed_idx ON hub_userprofile')
+    else:
+        schema_editor.execute('DROP INDEX hub_userprofile_feed_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0006_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['resume', 'created_at', 'id'], name='hub_comment_resume_page_idx'),
+        ),
+        migrations.RunPython(create_feed_index, drop_feed_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.0.7 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+def count_comments(apps, schema_editor):
+    schema_editor.execute(
+        "UPDATE hub_userprofile SET "
+        "comment_count = (SELECT COUNT(*) FROM hub_comment WHERE hub_comment.resume_id = hub_userprofile.id), "
+        "last_comment_at = (SELECT MAX(created_at) FROM hub_comment WHERE hub_comment.resume_id = hub_userprofile.id)"
+    )
+
+def create_feed_indexes(apps, schema_editor):
+    partial = schema_editor.connection.vendor in ('sqlite', 'postgresql')
+
+    if schema_editor.connection.vendor == 'sqlite':
+        # adding the fields rebuilt the table without the index of migration 0007
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS hub_userprofile_feed_idx ON hub_userprofile (updated_at, id) "
+            "WHERE NOT (resume_file = '')"
+        )
+
+    # the "discussed" and "active" orders of the feed (see hub.feed.FEED_ORDERS)
+    schema_editor.execute(
+        "CREATE INDEX hub_userprofile_discussed_idx ON hub_userprofile (comment_count, id)" +
+        (" WHERE NOT (resume_file = '')" if partial else '')
+    )
+    schema_editor.execute(
+        "CREATE INDEX hub_userprofile_active_idx ON hub_userprofile (last_comment_at, id)" +
+        (" WHERE NOT (resume_file = '') AND last_comment_at IS NOT NULL" if partial else '')
+    )
+
+def drop_feed_indexes(apps, schema_editor):
+    for name in ('hub_userprofile_discussed_idx', 'hub_userprofile_active_idx'):
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute('DROP INDEX {0} ON hub_userprofile'.format(name))
+        else:
+            schema_editor.execute('DROP INDEX {0}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0007_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+        migrations.RunPython(create_feed_indexes, drop_feed_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.0.7 on 2026-10-18 21:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=30, unique=True)),
+                ('idf', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarResume',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('resume', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_resumes', to='hub.UserProfile')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='hub.UserProfile')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similarresume',
+            index=models.Index(fields=['resume', '-score'], name='hub_similar_resume_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarresume',
+            unique_together={('resume', 'similar')},
+        ),
+    ]
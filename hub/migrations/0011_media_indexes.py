@@ -0,0 +1,21 @@
+# Generated by Django 2.0.7 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0010_similar_resumes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['resume_file'], name='hub_profile_resume_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['picture'], name='hub_profile_picture_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.0.7 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+FEED_INDEXES = ('hub_userprofile_feed_idx', 'hub_userprofile_discussed_idx', 'hub_userprofile_active_idx')
+
+def drop_raw_feed_indexes(apps, schema_editor):
+    # created with SQL by 0007 and 0008, the migration state didn't know them:
+    # they are added again below as indexes of the model (rebuilt with the table)
+    for name in FEED_INDEXES:
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute('DROP INDEX {0} ON hub_userprofile'.format(name))
+        else:
+            schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(name))
+
+def create_raw_feed_indexes(apps, schema_editor):
+    partial = schema_editor.connection.vendor in ('sqlite', 'postgresql')
+
+    schema_editor.execute(
+        "CREATE INDEX hub_userprofile_feed_idx ON hub_userprofile (updated_at, id)" +
+        (" WHERE NOT (resume_file = '')" if partial else '')
+    )
+    schema_editor.execute(
+        "CREATE INDEX hub_userprofile_discussed_idx ON hub_userprofile (comment_count, id)" +
+        (" WHERE NOT (resume_file = '')" if partial else '')
+    )
+    schema_editor.execute(
+        "CREATE INDEX hub_userprofile_active_idx ON hub_userprofile (last_comment_at, id)" +
+        (" WHERE NOT (resume_file = '') AND last_comment_at IS NOT NULL" if partial else '')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0011_media_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_raw_feed_indexes, create_raw_feed_indexes),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['updated_at', 'id'], name='hub_userprofile_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['comment_count', 'id'], name='hub_userprofile_discussed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['last_comment_at', 'id'], name='hub_userprofile_active_idx'),
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
+from hub.storage import blob_storage
+
+
+# Maximum length of the resume summaries shown on the index page
+SUMMARY_LENGTH = 180
 
 
 def user_directory_path(instance, filename):
@@ -9,6 +15,22 @@ def user_directory_path(instance, filename):
     # file will be uploaded to MEDIA_ROOT/user_<id>/<filename>
     return 'user_{0}/{1}'.format(instance.user.id, filename)
 
+def summarize(text, length=SUMMARY_LENGTH):
+    '''
+    Summarizes a long text to at most `length` characters (cut at a whitespace if possible)
+    '''
+    text = text.strip()
+    if len(text) <= length:
+        return text
+
+    # keep the words that fit in `length` characters
+    head = text[:length + 1].rsplit(None, 1)
+    if len(head) == 2:
+        return head[0].rstrip()
+
+    # there is no whitespace to cut at
+    return text[:length]
+
 
 class UserProfile(models.Model):
     ''' 
@@ -19,14 +41,53 @@ class UserProfile(models.Model):
     # For detect special users (for example teacher user)
     is_special = models.BooleanField(default=False)
 
-    picture = models.ImageField(upload_to=user_directory_path, blank=True)
+    # Files are stored once per content (see hub.storage)
+    picture = models.ImageField(upload_to=user_directory_path, storage=blob_storage, blank=True)
+    # Name of the picture whose resized variants are generated (see hub.images)
+    picture_variants = models.CharField(max_length=100, blank=True)
 
-    resume_file = models.FileField(upload_to=user_directory_path, blank=True)
+    resume_file = models.FileField(upload_to=user_directory_path, storage=blob_storage, blank=True)
     description = models.TextField(blank=True)
+    # Summary of the description, computed when the description is saved
+    summary = models.CharField(max_length=SUMMARY_LENGTH, blank=True)
+
+    # Plain text of the resume file, extracted in the background after upload
+    TEXT_PENDING = 'pending'
+    TEXT_DONE = 'done'
+    TEXT_FAILED = 'failed'
+    TEXT_STATUS_CHOICES = (
+        (TEXT_PENDING, 'Pending'),
+        (TEXT_DONE, 'Done'),
+        (TEXT_FAILED, 'Failed'),
+    )
+    resume_text = models.TextField(blank=True)
+    text_status = models.CharField(max_length=10, choices=TEXT_STATUS_CHOICES, blank=True)
+    text_error = models.CharField(max_length=255, blank=True)
+    text_extracted_at = models.DateTimeField(null=True, blank=True)
+
+    # Comments on the resume, kept up to date by hub.counters (on each
+    # comment) and by the reconcile_comment_counts command
+    comment_count = models.IntegerField(default=0)
+    last_comment_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # The orders of the feed (profiles with a resume file by updated_at,
+    # comment_count or last_comment_at) use partial indexes made by
+    # migrations 0007 and 0008 (models.Index has no condition in Django 2.0)
+
+    class Meta:
+        indexes = [
+            # the files in MEDIA_ROOT that are still used (see the collect_orphaned_media command)
+            models.Index(fields=['resume_file'], name='hub_profile_resume_file_idx'),
+            models.Index(fields=['picture'], name='hub_profile_picture_idx'),
+            # the orders of the feed (see hub.feed.FEED_ORDERS)
+            models.Index(fields=['updated_at', 'id'], name='hub_userprofile_feed_idx'),
+            models.Index(fields=['comment_count', 'id'], name='hub_userprofile_discussed_idx'),
+            models.Index(fields=['last_comment_at', 'id'], name='hub_userprofile_active_idx'),
+        ]
+
 
 class Comment(models.Model):
     ''' 
@@ -40,23 +101,108 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # pages of the comments of a resume (see hub.feed.resume_comments)
+            models.Index(fields=['resume', 'created_at', 'id'], name='hub_comment_resume_page_idx'),
+        ]
 
-def init_users():
+
+class Blob(models.Model):
+    ''' 
+    Reference count of a file of the content-addressed storage (see hub.blobs)
     '''
-    Function for insert specific users in User Model
+    name = models.CharField(max_length=100, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class SimilarResume(models.Model):
+    ''' 
+    A resume among the most similar ones to another resume (see hub.similar)
+    '''
+    resume = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='similar_resumes', db_index=False)
+    similar = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='similar_to')
+    # Cosine similarity of their TF-IDF vectors
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = [('resume', 'similar')]
+        indexes = [
+            # the similar resumes shown on the page of a resume
+            models.Index(fields=['resume', '-score'], name='hub_similar_resume_idx'),
+        ]
+
+
+class ResumeTerm(models.Model):
+    ''' 
+    Inverse document frequency of a word of the resumes, as of the last
+    rebuild of the similar resumes (see hub.similar)
     '''
-    try:
-        # Admin User
-        admin = User.objects.create_superuser(username='admin', email='admin@resume-hub.com', password='changeit', first_name='Admin')
-        admin_user_profile = UserProfile(user=admin, is_special=True)
-        admin_user_profile.save()
+    term = models.CharField(max_length=30, unique=True)
+    idf = models.FloatField()
 
-        # Teacher User
-        teacher_user = User.objects.create_user(username='teacher', email='habiballah_khosravi@yahoo.com', password='changeit', first_name='Habiballah', last_name='Khosravi')
-        teacher_user_profile = UserProfile(user=teacher_user, is_special=True)
-        teacher_user_profile.save()
 
-    except:
-        pass
+class Job(models.Model):
+    ''' 
+    Work deferred from the requests, run by the run_workers command (see hub.jobs)
+    '''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    # Name of a function registered with @hub.jobs.job, and its keyword arguments (JSON)
+    name = models.CharField(max_length=100)
+    arguments = models.TextField(default='{}')
+    # Jobs with a higher priority run first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # A job with the key of a queued job is not queued again (cleared when it starts)
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    # Not run before this time (failed attempts are retried later and later)
+    run_at = models.DateTimeField(default=timezone.now)
+    # The worker running the job
+    worker = models.CharField(max_length=100, blank=True)
 
-init_users()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the next job to claim (see hub.jobs.claim)
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='hub_job_claim_idx'),
+            # latencies of the finished jobs (see hub.jobs.queue_stats)
+            models.Index(fields=['finished_at'], name='hub_job_finished_idx'),
+        ]
+
+
+def init_users():
+    '''
+    Function for insert specific users in User Model (if they don't exist),
+    used by the seed_users command and after the first migration
+    '''
+    with transaction.atomic():
+        if not User.objects.filter(username='admin').exists():
+            # Admin User
+            admin = User.objects.create_superuser(username='admin', email='admin@resume-hub.com', password='changeit', first_name='Admin')
+            admin_user_profile = UserProfile(user=admin, is_special=True)
+            admin_user_profile.save()
+
+        if not User.objects.filter(username='teacher').exists():
+            # Teacher User
+            teacher_user = User.objects.create_user(username='teacher', email='habiballah_khosravi@yahoo.com', password='changeit', first_name='Habiballah', last_name='Khosravi')
+            teacher_user_profile = UserProfile(user=teacher_user, is_special=True)
+            teacher_user_profile.save()
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+# Alias of the read replica in DATABASES
+REPLICA = 'replica'
+
+# Views whose reads go to the replica (URL names)
+REPLICA_VIEWS = getattr(settings, 'HUB_REPLICA_VIEWS', ('hub:index', 'hub:resume', 'hub:about'))
+
+# Seconds that the reads of a user who wrote something go to the primary
+# (longer than the sync interval, so they see their own changes)
+READ_PRIMARY_AFTER_WRITE = getattr(settings, 'HUB_READ_PRIMARY_AFTER_WRITE', 2 * 60)
+
+# Cookie with the time of the last write of the client
+WRITE_COOKIE = 'hub_wrote'
+
+# Whether the current thread is handling a request of a read-only view
+_local = threading.local()
+
+
+def replica_available():
+    ''' the replica is configured and was copied from the primary (see sync_replica) '''
+    if REPLICA not in settings.DATABASES:
+        return False
+
+    name = settings.DATABASES[REPLICA]['NAME']
+    return connections[REPLICA].vendor != 'sqlite' or os.path.exists(name)
+
+def reading_from_replica():
+    return getattr(_local, 'use_replica', False)
+
+def synced_file(name):
+    ''' file with the time of the snapshot of a SQLite replica (written by sync_replica) '''
+    return name + '.synced'
+
+def replica_synced_at():
+    '''
+    Time (microseconds, like the cache versions) of the primary that the
+    replica is a copy of, 0 if unknown, None for other databases (they
+    have their own replication)
+    '''
+    if connections[REPLICA].vendor != 'sqlite':
+        return None
+
+    try:
+        with open(synced_file(settings.DATABASES[REPLICA]['NAME'])) as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return 0
+
+
+class ReplicaRouter():
+    '''
+    Sends the reads of hub models in read-only views (REPLICA_VIEWS, marked
+    by ReplicaMiddleware) to the replica database, everything else to the
+    primary. The replica is a copy of the primary made by the sync_replica
+    command, so it may be behind by the sync interval. Sessions and users
+    are always read from the primary, a user who just logged in is not in
+    the replica yet.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica() and model._meta.app_label == 'hub':
+            return REPLICA
+
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the same tables in both
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema from the copy
+        return db == 'default'
+
+
+class ReplicaMiddleware():
+    '''
+    Marks the GET requests of REPLICA_VIEWS to read from the replica,
+    except for the clients that wrote something in the last
+    READ_PRIMARY_AFTER_WRITE seconds (the replica may not have it yet)
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.use_replica = False
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_available():
+            response.set_cookie(WRITE_COOKIE, str(int(time.time())), max_age=READ_PRIMARY_AFTER_WRITE, httponly=True)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in REPLICA_VIEWS
+            and not self.wrote_recently(request)
+            and replica_available()
+        )
+
+    def wrote_recently(self, request):
+        try:
+            return time.time() - int(request.COOKIES[WRITE_COOKIE]) < READ_PRIMARY_AFTER_WRITE
+        except (KeyError, ValueError):
+            return False
@@ -0,0 +1,146 @@
+import re
+
+from django.db import connection
+from hub.models import *
+from hub.feed import CARD_FIELDS
+
+
+# FTS5 virtual table of searchable resumes (rowid is the UserProfile id)
+SEARCH_TABLE = 'hub_resume_fts'
+
+# Number of results on each page of search results
+SEARCH_PAGE_SIZE = 20
+
+# Pages after this one are empty (deep offsets are slow, and must fit in an SQL integer)
+MAX_SEARCH_PAGE = 1000
+
+# bm25() weights of the name, description and body columns
+COLUMN_WEIGHTS = (10.0, 2.0, 1.0)
+
+# Maximum number of words of a search query
+MAX_QUERY_TERMS = 10
+
+
+def search_enabled():
+    ''' full-text search needs the FTS5 table (SQLite only) '''
+    return connection.vendor == 'sqlite'
+
+def document(profile):
+    '''
+    Columns of the search document of a profile (with its user selected)
+    '''
+    return (
+        profile.user.get_full_name(),
+        profile.description,
+        getattr(profile, 'resume_text', ''),
+    )
+
+def index_profile(profile):
+    '''
+    Adds (or replaces) the search document of a profile,
+    profiles without a resume file are removed from the index
+    '''
+    if not search_enabled():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(SEARCH_TABLE), [profile.id])
+
+        if profile.resume_file:
+            cursor.execute(
+                'INSERT INTO {0} (rowid, name, description, body) VALUES (%s, %s, %s, %s)'.format(SEARCH_TABLE),
+                [profile.id] + list(document(profile))
+            )
+
+def remove_profile(profile_id):
+    ''' Removes the search document of a profile '''
+    if not search_enabled():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(SEARCH_TABLE), [profile_id])
+
+def rebuild_index(batch_size=1000, progress=None):
+    '''
+    Rebuilds the whole search index from UserProfile in batches of primary keys,
+    returns the number of indexed profiles
+    '''
+    profiles = UserProfile.objects.exclude(resume_file='').select_related('user').order_by('id')
+
+    indexed = 0
+    last_id = 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0}'.format(SEARCH_TABLE))
+
+        while True:
+            batch = list(profiles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, name, description, body) VALUES (%s, %s, %s, %s)'.format(SEARCH_TABLE),
+                [[profile.id] + list(document(profile)) for profile in batch]
+            )
+
+            indexed += len(batch)
+            last_id = batch[-1].id
+            if progress:
+                progress(indexed)
+
+        # merge the b-trees of the index for faster queries
+        cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(SEARCH_TABLE))
+
+    return indexed
+
+def match_expression(query):
+    '''
+    Converts a user query to an FTS5 expression that matches all of its words
+    (as prefixes), the FTS5 query syntax of the user is not trusted
+    '''
+    terms = re.findall(r'\w+', query)[:MAX_QUERY_TERMS]
+
+    return ' '.join('"{0}"*'.format(term) for term in terms)
+
+def search_resumes(query, page=1, size=SEARCH_PAGE_SIZE):
+    '''
+    Resumes matching the query ordered by relevance (one page of them),
+    returns the resumes and whether there is a next page
+    '''
+    expression = match_expression(query)
+    if not expression or page > MAX_SEARCH_PAGE or not search_enabled():
+        return [], False
+
+    # rank and paginate inside the FTS index, hub_userprofile is only read by primary key
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, {1}) LIMIT %s OFFSET %s'.format(
+                SEARCH_TABLE, ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+            ),
+            [expression, size + 1, (page - 1) * size]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    has_next = len(ids) > size
+    ids = ids[:size]
+
+    profiles = UserProfile.objects.select_related('user').only(*CARD_FIELDS).in_bulk(ids)
+
+    return [profiles[pk] for pk in ids if pk in profiles], has_next
+
+def resumes_sharing_words(words, limit, exclude=None):
+    '''
+    Ids of the resumes that contain any of the words, the most relevant
+    first (candidates of hub.similar), empty without the search index
+    '''
+    terms = [word for word in words if re.match(r'^\w+$', word)]
+    if not terms or not search_enabled():
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s AND rowid != %s ORDER BY bm25({0}, {1}) LIMIT %s'.format(
+                SEARCH_TABLE, ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+            ),
+            [' OR '.join('"{0}"'.format(term) for term in terms), exclude or 0, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
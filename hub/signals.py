@@ -0,0 +1,128 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from hub.models import *
+from hub.caching import bump_resume_versions
+from hub.jobs import enqueue
+from hub.search import index_profile, remove_profile
+from hub import blobs, counters
+
+
+def invalidate_resumes(profile_ids):
+    ''' bumps the cache versions of resumes once the current transaction is committed '''
+    profile_ids = list(profile_ids)
+    if profile_ids:
+        transaction.on_commit(lambda: bump_resume_versions(profile_ids))
+
+def commented_resume_ids(user_id):
+    ''' ids of the resumes that a user has commented on (they show the user's name and picture) '''
+    return Comment.objects.filter(user_id=user_id).values_list('resume_id', flat=True).distinct()
+
+def showing_resume_ids(profile_ids):
+    ''' ids of the resumes that show the profiles among their similar resumes '''
+    return SimilarResume.objects.filter(similar_id__in=list(profile_ids)).values_list('resume_id', flat=True)
+
+def queue_similar_update(profile_id):
+    ''' refreshes the similar resumes of a profile whose words may have changed (see hub.similar) '''
+    enqueue('update_similar', {'profile_id': profile_id}, key='update_similar:{0}'.format(profile_id))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    invalidate_resumes([instance.id] + list(commented_resume_ids(instance.user_id)))
+
+@receiver(post_save, sender=UserProfile)
+def update_similar_resumes(sender, instance, **kwargs):
+    # the pages that show its name, picture and summary
+    invalidate_resumes(showing_resume_ids([instance.id]))
+
+    # only when its words changed, profiles without a resume file have no similar resumes
+    old_values = getattr(instance, '_old_values', {})
+    if any(changed(instance, old_values, field) for field in WORD_FIELDS):
+        if instance.resume_file or old_values.get('resume_file'):
+            queue_similar_update(instance.id)
+
+@receiver(pre_delete, sender=UserProfile)
+def remove_from_similar_resumes(sender, instance, **kwargs):
+    # their rows are deleted with it
+    invalidate_resumes(showing_resume_ids([instance.id]))
+
+@receiver(post_save, sender=UserProfile)
+def update_search_index(sender, instance, **kwargs):
+    index_profile(instance)
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_profile(instance.id)
+
+# File fields that reference blobs of the content-addressed storage
+BLOB_FIELDS = ('resume_file', 'picture')
+
+# Fields with the words of a resume (see hub.similar)
+WORD_FIELDS = ('description', 'resume_file', 'resume_text')
+
+# Fields whose old values are compared after a save
+TRACKED_FIELDS = ('resume_file', 'picture', 'description', 'resume_text')
+
+def field_value(instance, field):
+    value = getattr(instance, field)
+    # the name of a file
+    return getattr(value, 'name', value) or ''
+
+def changed(instance, old_values, field):
+    ''' whether a saved field changed, old_values only has the fields that were saved '''
+    return field in old_values and old_values[field] != field_value(instance, field)
+
+@receiver(pre_save, sender=UserProfile)
+def remember_old_values(sender, instance, update_fields=None, **kwargs):
+    ''' the old values of the saved TRACKED_FIELDS (no query when update_fields has none of them) '''
+    fields = [field for field in TRACKED_FIELDS if update_fields is None or field in update_fields]
+
+    old_values = None
+    if instance.pk and fields:
+        old_values = UserProfile.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._old_values = old_values or {field: '' for field in fields}
+
+@receiver(post_save, sender=UserProfile)
+def update_blob_references(sender, instance, **kwargs):
+    old_values = getattr(instance, '_old_values', {})
+    for field in BLOB_FIELDS:
+        if changed(instance, old_values, field):
+            blobs.acquire(field_value(instance, field))
+            blobs.release(old_values[field])
+
+@receiver(post_delete, sender=UserProfile)
+def release_blobs(sender, instance, **kwargs):
+    for field in BLOB_FIELDS:
+        blobs.release(getattr(instance, field).name)
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate_resumes([instance.resume_id])
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_deleted(instance)
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields == frozenset(['last_login']):
+        # new users have no resume or comment yet, and logins don't change any page
+        return
+
+    profiles = list(UserProfile.objects.filter(user=instance))
+    for profile in profiles:
+        # the name of the user is searchable
+        profile.user = instance
+        index_profile(profile)
+
+    profile_ids = [profile.id for profile in profiles]
+    invalidate_resumes(profile_ids + list(commented_resume_ids(instance.id)) + list(showing_resume_ids(profile_ids)))
@@ -0,0 +1,295 @@
+'''
+Similar resumes: the nearest neighbours of each resume by the cosine
+similarity of the TF-IDF vectors of their descriptions and file texts
+
+rebuild_similar() computes them all in batch (with sparse matrices when
+NumPy and SciPy are installed) and stores the SIMILAR_COUNT most similar
+resumes of each one in SimilarResume, and the IDF of the words in
+ResumeTerm. When a profile changes, update_similar() refreshes its
+similar resumes from the ones that share its most weighted words (found
+with the search index) and its place among theirs, with the IDF of the
+last rebuild: run the rebuild_similar_resumes command periodically.
+
+The pages only read SimilarResume (see similar_resumes()).
+'''
+import heapq
+import math
+import re
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from hub.models import *
+from hub.caching import bump_resume_versions
+from hub.feed import CARD_FIELDS
+from hub.search import resumes_sharing_words
+from hub.signals import invalidate_resumes
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    # optional: the similarities are then computed with an inverted index in Python (for small sites)
+    numpy = sparse = None
+
+
+# Number of similar resumes of each resume, and their minimum similarity (0 to 1)
+SIMILAR_COUNT = getattr(settings, 'HUB_SIMILAR_RESUMES', 5)
+MIN_SIMILARITY = getattr(settings, 'HUB_SIMILAR_MIN_SCORE', 0.1)
+
+# Words in more than this fraction of the resumes don't tell them apart
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+# Candidates of update_similar(): the resumes that share the QUERY_WORDS most weighted words of the resume
+QUERY_WORDS = 20
+CANDIDATES = 100
+
+WORD = re.compile(r'[^\W\d_]{2,30}')
+
+STOP_WORDS = frozenset('''
+    a about after all also am an and any are as at be been before being between both but by can
+    could did do does for from had has have he her here him his how i if in into is it its me more
+    most my no not of on once only or other our out over own same she should so some such than
+    that the their them then there these they this those through to too under until up very was
+    we were what when where which while who whom why will with would you your
+'''.split())
+
+
+def term_counts(description, resume_text):
+    ''' the words of a resume (its description and file text) and their counts '''
+    words = WORD.findall('{0}\n{1}'.format(description, resume_text).lower())
+    return Counter(word for word in words if word not in STOP_WORDS)
+
+def tfidf_vector(counts, idf):
+    ''' {word: weight} of a resume: sublinear TF times IDF, of unit length (the words of idf only) '''
+    vector = {word: (1 + math.log(count)) * idf[word] for word, count in counts.items() if word in idf}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+
+    return {word: weight / norm for word, weight in vector.items()} if norm else {}
+
+def cosine(first, second):
+    ''' similarity of two vectors of unit length '''
+    if len(first) > len(second):
+        first, second = second, first
+
+    return sum(weight * second.get(word, 0) for word, weight in first.items())
+
+def best(pairs, count):
+    ''' the `count` most similar (id, score) pairs, the similar enough ones '''
+    return heapq.nlargest(count, (pair for pair in pairs if pair[1] >= MIN_SIMILARITY), key=lambda pair: pair[1])
+
+def load_idf(words):
+    ''' {word: idf} of the words (as of the last rebuild) '''
+    words = list(words)
+    idf = {}
+    for start in range(0, len(words), 500):
+        idf.update(ResumeTerm.objects.filter(term__in=words[start:start + 500]).values_list('term', 'idf'))
+
+    return idf
+
+
+def similar_resumes(resume_id):
+    ''' The similar resumes of a resume (with their users), the most similar first '''
+    return list(
+        UserProfile.objects.filter(similar_to__resume_id=resume_id)
+        .select_related('user').only(*CARD_FIELDS).order_by('-similar_to__score')
+    )
+
+
+def resume_documents(batch_size):
+    ''' (id, word counts) of the resumes (profiles with a resume file), read in batches of primary keys '''
+    profiles = UserProfile.objects.exclude(resume_file='').order_by('id').values_list('id', 'description', 'resume_text')
+
+    last_id = 0
+    while True:
+        batch = list(profiles.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+
+        for profile_id, description, resume_text in batch:
+            yield profile_id, term_counts(description, resume_text)
+        last_id = batch[-1][0]
+
+def inverse_document_frequencies(batch_size):
+    ''' {word: idf} of the words in two resumes or more (but not in most of them) '''
+    frequencies = Counter()
+    total = 0
+    for profile_id, counts in resume_documents(batch_size):
+        frequencies.update(counts.keys())
+        total += 1
+
+    limit = max(MAX_DOCUMENT_FREQUENCY * total, 2)
+    return {
+        word: math.log((1 + total) / (1 + frequency)) + 1
+        for word, frequency in frequencies.items() if 2 <= frequency <= limit
+    }
+
+def vectorize(idf, batch_size, progress=None):
+    '''
+    Ids and TF-IDF vectors of the resumes: the rows of a CSR matrix with
+    SciPy (the words are the columns), else a list of dicts
+    '''
+    ids = []
+    vectors = []
+    columns = {word: column for column, word in enumerate(idf)}
+    # the matrix is built in compact arrays, not in Python objects
+    indptr, indices, data = array('q', [0]), array('q'), array('f')
+
+    for profile_id, counts in resume_documents(batch_size):
+        vector = tfidf_vector(counts, idf)
+        ids.append(profile_id)
+        if sparse is None:
+            vectors.append(vector)
+        else:
+            indices.extend(columns[word] for word in vector)
+            data.extend(vector.values())
+            indptr.append(len(indices))
+
+        if progress and len(ids) % batch_size == 0:
+            progress('{0} resumes vectorized'.format(len(ids)))
+
+    if sparse is not None:
+        vectors = sparse.csr_matrix(
+            (numpy.frombuffer(data, dtype=numpy.float32), numpy.frombuffer(indices, dtype=numpy.int64), numpy.frombuffer(indptr, dtype=numpy.int64)),
+            shape=(len(ids), len(idf)),
+        )
+
+    return ids, vectors
+
+def matrix_neighbours(ids, matrix, count, batch_size):
+    ''' (id, similar resumes) of each row of the matrix, by products of blocks of rows with the whole matrix '''
+    transposed = matrix.T.tocsr()
+
+    for start in range(0, len(ids), batch_size):
+        scores = matrix[start:start + batch_size].dot(transposed).tocsr()
+
+        for row in range(scores.shape[0]):
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            columns, values = scores.indices[begin:end], scores.data[begin:end]
+
+            keep = (values >= MIN_SIMILARITY) & (columns != start + row)
+            columns, values = columns[keep], values[keep]
+            if len(values) > count:
+                top = numpy.argpartition(-values, count)[:count]
+                columns, values = columns[top], values[top]
+
+            order = numpy.argsort(-values)
+            yield ids[start + row], [(ids[column], float(value)) for column, value in zip(columns[order], values[order])]
+
+def index_neighbours(ids, vectors, count):
+    ''' (id, similar resumes) of each vector, by an inverted index of the words (without SciPy) '''
+    postings = defaultdict(list)
+    for position, vector in enumerate(vectors):
+        for word, weight in vector.items():
+            postings[word].append((position, weight))
+
+    for position, vector in enumerate(vectors):
+        scores = defaultdict(float)
+        for word, weight in vector.items():
+            for other, other_weight in postings[word]:
+                scores[other] += weight * other_weight
+        scores.pop(position, None)
+
+        yield ids[position], [(ids[other], score) for other, score in best(scores.items(), count)]
+
+def rebuild_similar(count=SIMILAR_COUNT, batch_size=1000, progress=None):
+    '''
+    Recomputes the similar resumes of every resume and the IDF of the
+    words, returns the numbers of resumes, words and similar resumes
+    '''
+    idf = inverse_document_frequencies(batch_size)
+    ids, vectors = vectorize(idf, batch_size, progress)
+
+    if sparse is None:
+        neighbours = index_neighbours(ids, vectors, count)
+    else:
+        neighbours = matrix_neighbours(ids, vectors, count, batch_size)
+
+    old = defaultdict(list)
+    for resume_id, similar_id in SimilarResume.objects.order_by('resume_id', '-score').values_list('resume_id', 'similar_id'):
+        old[resume_id].append(similar_id)
+
+    # computed before the writes, which lock the database
+    rows = []
+    changed = []
+    for done, (resume_id, similar) in enumerate(neighbours, 1):
+        rows += [(resume_id, similar_id, score) for similar_id, score in similar]
+        if [similar_id for similar_id, score in similar] != old.pop(resume_id, []):
+            changed.append(resume_id)
+
+        if progress and done % batch_size == 0:
+            progress('{0} resumes compared'.format(done))
+
+    # the pages keep showing the old ones until the new ones are complete
+    with transaction.atomic():
+        SimilarResume.objects.all().delete()
+        for start in range(0, len(rows), batch_size):
+            SimilarResume.objects.bulk_create([
+                SimilarResume(resume_id=resume_id, similar_id=similar_id, score=score)
+                for resume_id, similar_id, score in rows[start:start + batch_size]
+            ])
+
+        ResumeTerm.objects.all().delete()
+        ResumeTerm.objects.bulk_create([ResumeTerm(term=word, idf=value) for word, value in idf.items()])
+
+    # the resumes that aren't resumes anymore have lost theirs
+    bump_resume_versions(changed + list(old))
+
+    return len(ids), len(idf), len(rows)
+
+
+def update_similar(profile_id, count=SIMILAR_COUNT):
+    '''
+    Refreshes the similar resumes of a changed resume, and its place among
+    the similar resumes of the ones that share its most weighted words (or
+    that showed it). The resumes that don't show it anymore have one less
+    similar resume until the next rebuild.
+    '''
+    showing = set(SimilarResume.objects.filter(similar_id=profile_id).values_list('resume_id', flat=True))
+    changed = showing | {profile_id}
+
+    profile = UserProfile.objects.exclude(resume_file='').filter(pk=profile_id).values_list('description', 'resume_text').first()
+    counts = term_counts(*profile) if profile else Counter()
+    vector = tfidf_vector(counts, load_idf(counts))
+
+    if not vector:
+        # not a resume anymore, or none of its words is in the others
+        SimilarResume.objects.filter(Q(resume_id=profile_id) | Q(similar_id=profile_id)).delete()
+        invalidate_resumes(changed)
+        return
+
+    candidate_ids = set(resumes_sharing_words(heapq.nlargest(QUERY_WORDS, vector, key=vector.get), CANDIDATES, exclude=profile_id))
+    candidates = {
+        candidate_id: term_counts(description, resume_text)
+        for candidate_id, description, resume_text in UserProfile.objects.exclude(resume_file='').filter(
+            pk__in=(candidate_ids | showing) - {profile_id}
+        ).values_list('id', 'description', 'resume_text')
+    }
+    idf = load_idf(set().union(*candidates.values()))
+    scores = {candidate_id: cosine(vector, tfidf_vector(candidate, idf)) for candidate_id, candidate in candidates.items()}
+
+    with transaction.atomic():
+        SimilarResume.objects.filter(Q(resume_id=profile_id) | Q(similar_id=profile_id)).delete()
+        SimilarResume.objects.bulk_create([
+            SimilarResume(resume_id=profile_id, similar_id=similar_id, score=score)
+            for similar_id, score in best(scores.items(), count)
+        ])
+
+        # its place among theirs: [(score, row id)] of the similar resumes of each candidate
+        lists = defaultdict(list)
+        for row_id, resume_id, score in SimilarResume.objects.filter(resume_id__in=list(scores)).values_list('id', 'resume_id', 'score'):
+            lists[resume_id].append((score, row_id))
+
+        for candidate_id, score in scores.items():
+            others = lists[candidate_id]
+            if score < MIN_SIMILARITY or (len(others) >= count and score <= min(others)[0]):
+                continue
+
+            SimilarResume.objects.create(resume_id=candidate_id, similar_id=profile_id, score=score)
+            if len(others) >= count:
+                SimilarResume.objects.filter(pk=min(others)[1]).delete()
+            changed.add(candidate_id)
+
+    invalidate_resumes(changed)
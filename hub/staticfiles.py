@@ -0,0 +1,128 @@
+import gzip
+import io
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    # optional: only gzip siblings are written without it
+    brotli = None
+
+
+# Extensions of the files that get gzip/brotli siblings (the others are compressed already)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.xml', '.map', '.ico')
+
+# Precompressed siblings of a file, in order of preference: (suffix, Content-Encoding)
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+# Siblings smaller than this fraction of the file are kept
+MIN_COMPRESSION_RATIO = 0.95
+
+
+def optimize_png(content):
+    ''' losslessly smaller PNG (or None): optimized deflate, palette when there are few colors '''
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(content))
+    image.load()
+
+    if image.mode == 'RGB' and image.getcolors(256) is not None:
+        # 256 colors or less fit a palette without any loss
+        image = image.convert('P', palette=Image.ADAPTIVE, colors=256)
+
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    optimized = output.getvalue()
+
+    return optimized if len(optimized) < len(content) else None
+
+def optimize_svg(content):
+    ''' SVG without comments, editor metadata and whitespace between tags (or None) '''
+    text = content.decode('utf-8')
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.S)
+    text = re.sub(r'<metadata\b.*?</metadata>', '', text, flags=re.S)
+    text = re.sub(r'<sodipodi:namedview\b[^>]*?(/>|>.*?</sodipodi:namedview>)', '', text, flags=re.S)
+    text = re.sub(r'>\s+<', '><', text).strip()
+
+    optimized = text.encode('utf-8')
+    return optimized if len(optimized) < len(content) else None
+
+OPTIMIZERS = {
+    '.png': optimize_png,
+    '.svg': optimize_svg,
+}
+
+def compressed_siblings(content):
+    ''' {suffix: compressed content} of the encodings worth serving '''
+    siblings = {'.gz': gzip.compress(content, compresslevel=9)}
+    if brotli is not None:
+        siblings['.br'] = brotli.compress(content, quality=11)
+
+    return {
+        suffix: compressed for suffix, compressed in siblings.items()
+        if len(compressed) < len(content) * MIN_COMPRESSION_RATIO
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    '''
+    Static files storage of collectstatic for production: optimizes PNG
+    and SVG files before they are hashed, fingerprints the file names
+    (ManifestStaticFilesStorage) and writes .gz and .br siblings of the
+    text files, served by hub.middleware.PrecompressedStaticMiddleware.
+    '''
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self.optimize(paths)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        # the final names only (files with references are hashed again in each pass),
+        # and the unhashed copies which are served too
+        names = set(self.hashed_files.values()) | set(paths)
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def optimize(self, paths):
+        '''
+        Optimizes the collected copies of the images, the hashes are then
+        computed from the optimized content (read from this storage)
+        '''
+        paths = dict(paths)
+        for name in paths:
+            optimizer = OPTIMIZERS.get(os.path.splitext(name)[1].lower())
+            if optimizer is None:
+                continue
+
+            with self.open(name) as file:
+                content = file.read()
+            try:
+                optimized = optimizer(content)
+            except Exception:
+                # not a valid image, left as it is
+                continue
+
+            if optimized is not None:
+                self.delete(name)
+                self._save(name, ContentFile(optimized))
+                paths[name] = (self, name)
+
+        return paths
+
+    def compress(self, name):
+        with self.open(name) as file:
+            content = file.read()
+
+        for suffix, compressed in compressed_siblings(content).items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
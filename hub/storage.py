@@ -0,0 +1,99 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Directory of the blobs in MEDIA_ROOT
+BLOB_DIRECTORY = 'blobs'
+
+
+def blob_name(digest, extension):
+    ''' storage name of a blob, e.g. blobs/9f/86/9f86d08...0a08.pdf '''
+    return '{0}/{1}/{2}/{3}{4}'.format(BLOB_DIRECTORY, digest[:2], digest[2:4], digest, extension)
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_DIRECTORY + '/')
+
+def clean_extension(name):
+    ''' lowercase extension of a file name, without unsafe characters '''
+    extension = os.path.splitext(name)[1].lower()
+    return re.sub(r'[^a-z0-9.]', '', extension)[:10]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    File system storage that stores every file once under the SHA-256 digest
+    of its content (see blob_name()), whatever name it was uploaded with.
+
+    The upload is hashed while it is copied to a temp file next to the
+    blobs, so it is read only once. Blobs are shared between profiles and
+    reference-counted (see hub.blobs), so deleting a file is up to the
+    reference counting, never to the model fields.
+    '''
+
+    def get_available_name(self, name, max_length=None):
+        # the name is chosen by _save() from the content
+        return name
+
+    def _save(self, name, content):
+        extension = clean_extension(name)
+
+        if getattr(content, 'sha256', None) and hasattr(content, 'temporary_file_path'):
+            # hashed by hub.uploads.BoundedUploadHandler while it arrived
+            return self._save_hashed(blob_name(content.sha256, extension), content.temporary_file_path())
+
+        # copy the upload next to the blobs and hash it on the way
+        temp_directory = self.path(os.path.join(BLOB_DIRECTORY, 'tmp'))
+        os.makedirs(temp_directory, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        descriptor, temp_path = tempfile.mkstemp(dir=temp_directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    temp_file.write(chunk)
+
+            name = blob_name(sha256.hexdigest(), extension)
+            path = self.path(name)
+
+            if os.path.exists(path):
+                # the same content is stored already, mark it as recently used (see Blob.release())
+                os.utime(path)
+                return name
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+
+            return name
+
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _save_hashed(self, name, temp_path):
+        path = self.path(name)
+        if os.path.exists(path):
+            os.utime(path)
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # identical content may have been moved there meanwhile, overwriting it is harmless
+        file_move_safe(temp_path, path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+        return name
+
+
+blob_storage = ContentAddressedStorage()
@@ -0,0 +1,101 @@
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+from hub.models import *
+from hub.extraction import run_extraction
+from hub.images import make_avatars
+from hub.jobs import job, enqueue
+from hub.search import index_profile
+from hub.signals import invalidate_resumes, commented_resume_ids, showing_resume_ids, queue_similar_update
+from hub import similar
+from hub.storage import blob_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+def save_extracted_text(profile_id, file_name, result):
+    '''
+    Stores the result of run_extraction() on a profile (unless its resume
+    file was replaced meanwhile) and updates its search document
+    '''
+    text, error = result
+
+    updated = UserProfile.objects.filter(pk=profile_id, resume_file=file_name).update(
+        resume_text=text,
+        text_status=UserProfile.TEXT_FAILED if error else UserProfile.TEXT_DONE,
+        text_error=error[:255],
+        text_extracted_at=timezone.now(),
+    )
+
+    if updated:
+        # update() doesn't send post_save
+        profile = UserProfile.objects.select_related('user').get(pk=profile_id)
+        index_profile(profile)
+        queue_similar_update(profile_id)
+
+@job()
+def extract_text(profile_id, file_name):
+    ''' job of extract_resume_text() '''
+    if not UserProfile.objects.filter(pk=profile_id, resume_file=file_name).exists():
+        # replaced (or deleted) meanwhile
+        return
+
+    save_extracted_text(profile_id, file_name, run_extraction(blob_storage.path(file_name)))
+
+def extract_resume_text(profile):
+    '''
+    Queues the extraction of the text of the resume file of a profile
+    (run by a worker once the current transaction is committed)
+    '''
+    if not profile.resume_file:
+        return
+
+    UserProfile.objects.filter(pk=profile.pk).update(text_status=UserProfile.TEXT_PENDING, text_error='')
+
+    file_name = profile.resume_file.name
+    enqueue('extract_text', {'profile_id': profile.pk, 'file_name': file_name}, key='extract_text:{0}:{1}'.format(profile.pk, file_name))
+
+def save_avatars(profile_id, picture_name, error):
+    '''
+    Marks the variants of a picture as ready (unless the picture was
+    replaced meanwhile) and invalidates the pages that show it
+    '''
+    if error:
+        logger.warning('avatars of %s (profile %s) failed: %s', picture_name, profile_id, error)
+        return
+
+    updated = UserProfile.objects.filter(pk=profile_id, picture=picture_name).update(picture_variants=picture_name)
+
+    if updated:
+        # update() doesn't send post_save
+        user_id = UserProfile.objects.filter(pk=profile_id).values_list('user_id', flat=True).get()
+        invalidate_resumes([profile_id] + list(commented_resume_ids(user_id)) + list(showing_resume_ids([profile_id])))
+
+# pictures are shown on the pages, before that their original is sent to every visitor
+@job(priority=10)
+def resize_picture(profile_id, picture_name):
+    ''' job of generate_avatars() '''
+    if not UserProfile.objects.filter(pk=profile_id, picture=picture_name).exists():
+        # replaced (or deleted) meanwhile
+        return
+
+    save_avatars(profile_id, picture_name, make_avatars(settings.MEDIA_ROOT, picture_name))
+
+def generate_avatars(profile):
+    '''
+    Queues the generation of the resized variants of the picture of a
+    profile (run by a worker once the current transaction is committed)
+    '''
+    if not profile.picture:
+        return
+
+    picture_name = profile.picture.name
+    enqueue('resize_picture', {'profile_id': profile.pk, 'picture_name': picture_name}, key='resize_picture:{0}:{1}'.format(profile.pk, picture_name))
+
+# only the similar resumes of a profile that changed are late
+@job(priority=-10)
+def update_similar(profile_id):
+    ''' job of hub.signals.queue_similar_update() '''
+    similar.update_similar(profile_id)
@@ -0,0 +1,34 @@
+from django import template
+from django.conf import settings
+from hub.images import avatar_name
+
+
+register = template.Library()
+
+# CSS class of the <img> of each avatar slot
+AVATAR_CLASSES = {
+    'small': 'profile-pic-small',
+    'normal': 'profile-pic',
+    'big': 'profile-pic-big',
+}
+
+
+@register.inclusion_tag('hub/avatar.html')
+def avatar(picture, slot='normal'):
+    '''
+    Renders a profile picture for a slot (small, normal or big) with its
+    resized JPEG/WebP variants, or the original until the variants exist
+    '''
+    data = {
+        'css_class': AVATAR_CLASSES[slot],
+    }
+
+    if picture:
+        profile = picture.instance
+        if getattr(profile, 'picture_variants', '') == picture.name:
+            data['jpg'] = settings.MEDIA_URL + avatar_name(picture.name, slot, 'jpg')
+            data['webp'] = settings.MEDIA_URL + avatar_name(picture.name, slot, 'webp')
+        else:
+            data['original'] = picture.url
+
+    return data
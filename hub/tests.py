@@ -1,3 +1,1453 @@
-from django.test import TestCase
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse, resolve
+from django.utils import timezone
+from hub.models import *
+from hub.apps import seed_users
+from hub.signals import invalidate_resumes
+from hub.feed import recent_resumes, resume_comments
+from hub.caching import resume_cache_stats, cached_resume_fragment, new_version
+from hub.search import search_resumes
+from hub.extraction import extract_text, ExtractionError
+from hub.images import make_avatars, avatar_name
+from hub.templatetags.hub_tags import avatar
+from hub.uploads import RESUME_UPLOAD
+from hub.metrics import metrics
+from hub.middleware import TextGZipMiddleware
+from hub.db import configure_sqlite, query_plan, plan_problems
+from hub import jobs, routers, similar
+from hub.bench.dataset import generate_dataset
+from hub.bench.views import ClientRunner, benchmark_context, run_benchmark, compare
+from PIL import Image
+
+
+def create_profile(username, resume_file='resume.pdf', description='', **kwargs):
+    ''' creates a user with a UserProfile for tests '''
+    user = User.objects.create_user(username=username, password='changeit', first_name=username.title())
+    return UserProfile.objects.create(user=user, resume_file=resume_file, description=description, **kwargs)
+
+
+class FeedTests(TestCase):
+    ''' Tests of the index feed '''
+
+    def setUp(self):
+        self.profiles = [create_profile('user{0}'.format(i)) for i in range(5)]
+        create_profile('noresume', resume_file='')
+
+    def test_skips_profiles_without_resume_file(self):
+        resumes, next_cursor = recent_resumes(size=10)
+        self.assertEqual(len(resumes), 5)
+        self.assertIsNone(next_cursor)
+
+    def test_keyset_pages_cover_feed_in_order(self):
+        # same updated_at for two profiles so that the id breaks the tie
+        UserProfile.objects.filter(pk=self.profiles[1].pk).update(updated_at=self.profiles[2].updated_at)
+
+        seen = []
+        cursor = None
+        while True:
+            resumes, cursor = recent_resumes(cursor=cursor, size=2)
+            seen += resumes
+            if cursor is None:
+                break
+
+        expected = list(UserProfile.objects.exclude(resume_file='').order_by('-updated_at', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_feed_is_one_query(self):
+        with self.assertNumQueries(1):
+            resumes, _ = recent_resumes()
+            [resume.user.get_full_name() for resume in resumes]
+
+    def test_index_ignores_malformed_cursor(self):
+        response = self.client.get(reverse('hub:index'), {'before': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cards']), 5)
+
+
+class SummaryTests(TestCase):
+    ''' Tests of the stored resume summaries '''
+
+    def test_summarize_cuts_at_whitespace(self):
+        text = 'word ' * 100
+        summary = summarize(text)
+        self.assertLessEqual(len(summary), SUMMARY_LENGTH)
+        self.assertTrue(summary.endswith('word'))
+        self.assertEqual(summarize('short text '), 'short text')
+
+    def test_summarize_text_without_whitespace(self):
+        self.assertEqual(summarize('x' * 500), 'x' * SUMMARY_LENGTH)
+
+    def test_backfill_command(self):
+        profile = create_profile('old', description='an old resume description')
+        updated_at = profile.updated_at
+
+        call_command('backfill_summaries', batch_size=1, stdout=StringIO())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.summary, 'an old resume description')
+        self.assertEqual(profile.updated_at, updated_at)
+
+    def test_feed_does_not_load_description(self):
+        create_profile('user', description='a long description')
+        resumes, _ = recent_resumes()
+        self.assertIn('description', resumes[0].get_deferred_fields())
+
+
+class ResumeCacheTests(TransactionTestCase):
+    ''' Tests of the cached resume page fragments (invalidation runs on commit) '''
+
+    def setUp(self):
+        cache.clear()
+        self.profile = create_profile('owner', description='my resume')
+        self.commenter = create_profile('commenter')
+        self.url = reverse('hub:resume', kwargs={'user_profile_id': self.profile.id})
+
+    def comment(self, content):
+        return Comment.objects.create(user=self.commenter.user, resume=self.profile, content=content)
+
+    def test_hit_only_looks_up_the_validators(self):
+        self.comment('first comment')
+        self.client.get(self.url)
+
+        hits = resume_cache_stats.hits
+        # the updated_at of the ETag of the page
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'first comment')
+        self.assertEqual(resume_cache_stats.hits, hits + 1)
+
+    def test_new_comment_invalidates(self):
+        self.client.get(self.url)
+        self.comment('new comment')
+        self.assertContains(self.client.get(self.url), 'new comment')
+
+    def test_deleted_comment_invalidates(self):
+        comment = self.comment('deleted comment')
+        self.assertContains(self.client.get(self.url), 'deleted comment')
+        comment.delete()
+        self.assertNotContains(self.client.get(self.url), 'deleted comment')
+
+    def test_commenter_name_change_invalidates(self):
+        self.comment('a comment')
+        self.client.get(self.url)
+
+        user = self.commenter.user
+        user.first_name = 'Renamed'
+        user.save()
+        self.assertContains(self.client.get(self.url), 'Renamed')
+
+    def test_unchanged_page_is_not_modified(self):
+        comment = self.comment('a comment')
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # deletions don't change updated_at, the version of the resume changes
+        comment.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_resume(self):
+        response = self.client.get(reverse('hub:resume', kwargs={'user_profile_id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentPageTests(TestCase):
+    ''' Tests of the paginated comments of a resume '''
+
+    def setUp(self):
+        cache.clear()
+        self.profile = create_profile('owner')
+        self.commenters = [create_profile('commenter{0}'.format(i), picture='user_{0}/pic.png'.format(i)) for i in range(3)]
+        for i in range(25):
+            Comment.objects.create(user=self.commenters[i % 3].user, resume=self.profile, content='comment {0}'.format(i))
+
+    def test_comments_in_one_query(self):
+        with self.assertNumQueries(1):
+            comments, _ = resume_comments(self.profile.id)
+            [(c.user.get_full_name(), c.user.userprofile.picture.url) for c in comments]
+
+    def test_load_more_returns_next_slice(self):
+        url = reverse('hub:comments', kwargs={'user_profile_id': self.profile.id})
+        first = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(first['comments']), 20)
+        self.assertEqual(first['comments'][0]['content'], 'comment 24')
+
+        second = self.client.get(url, {'format': 'json', 'after': first['next_cursor']}).json()
+        self.assertEqual([c['content'] for c in second['comments']], ['comment {0}'.format(i) for i in range(4, -1, -1)])
+        self.assertIsNone(second['next_cursor'])
+
+        fragment = self.client.get(url, {'after': first['next_cursor']})
+        self.assertContains(fragment, 'comment 4')
+        self.assertNotContains(fragment, 'comment 5<')
+        self.assertNotContains(fragment, 'load_more_comments')
+
+    def test_comments_of_missing_resume_are_not_found(self):
+        url = reverse('hub:comments', kwargs={'user_profile_id': 999999})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {'format': 'json'}).status_code, 404)
+
+
+class SearchTests(TestCase):
+    ''' Tests of the full-text search of resumes '''
+
+    def setUp(self):
+        self.python = create_profile('alice', description='Senior Python developer with Django experience')
+        self.java = create_profile('bob', description='Java engineer, some python scripting')
+        create_profile('carol', resume_file='', description='python but no resume file')
+
+    def test_ranks_and_skips_profiles_without_resume(self):
+        resumes, has_next = search_resumes('python')
+        self.assertEqual(set(resumes), {self.python, self.java})
+        self.assertFalse(has_next)
+
+        resumes, _ = search_resumes('djan')
+        self.assertEqual(resumes, [self.python])
+
+    def test_searches_author_name(self):
+        resumes, _ = search_resumes('Alice')
+        self.assertEqual(resumes, [self.python])
+
+        user = self.java.user
+        user.last_name = 'Pythonista'
+        user.save()
+        resumes, _ = search_resumes('pythonista')
+        self.assertEqual(resumes, [self.java])
+
+    def test_index_follows_profile_changes(self):
+        self.java.description = 'Go developer'
+        self.java.save()
+        self.assertEqual(search_resumes('java')[0], [])
+
+        self.python.delete()
+        self.assertEqual(search_resumes('django')[0], [])
+
+    def test_query_syntax_is_not_trusted(self):
+        self.assertEqual(search_resumes('python" OR NEAR(')[0], [])
+        self.assertEqual(search_resumes('"*')[0], [])
+
+    def test_rebuild_and_pagination(self):
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        first, has_next = search_resumes('python', page=1, size=1)
+        second, _ = search_resumes('python', page=2, size=1)
+        self.assertTrue(has_next)
+        self.assertEqual(set(first + second), {self.python, self.java})
+
+    def test_search_view(self):
+        response = self.client.get(reverse('hub:search'), {'q': 'django', 'format': 'json'})
+        self.assertEqual([r['id'] for r in response.json()['resumes']], [self.python.id])
+        self.assertContains(self.client.get(reverse('hub:search'), {'q': 'django'}), 'Alice')
+
+    def test_pages_past_the_last_one_are_empty(self):
+        response = self.client.get(reverse('hub:search'), {'q': 'django', 'page': '9' * 20, 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resumes'], [])
+
+
+def write_docx(path, paragraphs):
+    ''' writes a minimal DOCX file '''
+    body = ''.join('<w:p><w:r><w:t>{0}</w:t></w:r></w:p>'.format(p) for p in paragraphs)
+    with zipfile.ZipFile(path, 'w') as docx_file:
+        docx_file.writestr(
+            'word/document.xml',
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            '<w:body>{0}</w:body></w:document>'.format(body)
+        )
+
+
+class TextExtractionTests(TestCase):
+    ''' Tests of the text extraction of resume files '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def test_docx_text(self):
+        path = os.path.join(self.media_root, 'resume.docx')
+        write_docx(path, ['Experienced   Kubernetes operator', 'Second paragraph'])
+        self.assertEqual(extract_text(path), 'Experienced Kubernetes operator\nSecond paragraph')
+
+    def test_unsupported_and_broken_files(self):
+        path = os.path.join(self.media_root, 'resume.docx')
+        with open(path, 'wb') as broken:
+            broken.write(b'not a zip file')
+        self.assertRaises(ExtractionError, extract_text, path)
+        self.assertRaises(ExtractionError, extract_text, os.path.join(self.media_root, 'image.bmp'))
+
+    def test_command_stores_text_and_indexes_it(self):
+        os.makedirs(os.path.join(self.media_root, 'user_1'))
+        write_docx(os.path.join(self.media_root, 'user_1', 'cv.docx'), ['Fortran numerical methods'])
+        with open(os.path.join(self.media_root, 'user_1', 'cv.odt'), 'wb') as odt:
+            odt.write(b'?')
+
+        with override_settings(MEDIA_ROOT=self.media_root):
+            profile = create_profile('writer', resume_file='user_1/cv.docx')
+            broken = create_profile('broken', resume_file='user_1/cv.odt')
+            call_command('extract_resume_text', workers=2, stdout=StringIO(), stderr=StringIO())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.text_status, UserProfile.TEXT_DONE)
+        self.assertEqual(profile.resume_text, 'Fortran numerical methods')
+        self.assertEqual(search_resumes('fortran')[0], [profile])
+
+        broken.refresh_from_db()
+        self.assertEqual(broken.text_status, UserProfile.TEXT_FAILED)
+        self.assertIn('unsupported', broken.text_error)
+
+
+def exif_orientation(orientation):
+    ''' EXIF data (of a JPEG APP1 segment) with only an orientation tag '''
+    # big-endian TIFF header, then an IFD with one SHORT entry (tag 0x0112) and no next IFD
+    return b'Exif\x00\x00MM\x00\x2a\x00\x00\x00\x08' + struct.pack('>HHHIHHI', 1, 0x0112, 3, 1, orientation, 0, 0)
+
+
+class AvatarTests(TestCase):
+    ''' Tests of the resized variants of profile pictures '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'user_1'))
+
+    def test_variants_are_square_and_rotated(self):
+        # a landscape photo taken with the camera rotated (EXIF orientation 6)
+        image = Image.new('RGB', (800, 400), (255, 0, 0))
+        image.paste((0, 0, 255), (0, 0, 400, 400))
+        image.save(os.path.join(self.media_root, 'user_1/me.jpg'), exif=exif_orientation(6))
+
+        self.assertEqual(make_avatars(self.media_root, 'user_1/me.jpg'), '')
+
+        for slot, size in (('small', 100), ('big', 600)):
+            for extension in ('jpg', 'webp'):
+                variant = Image.open(os.path.join(self.media_root, avatar_name('user_1/me.jpg', slot, extension)))
+                self.assertEqual(variant.size, (size, size))
+
+        # after rotation the blue half is on top
+        variant = Image.open(os.path.join(self.media_root, avatar_name('user_1/me.jpg', 'big', 'jpg'))).convert('RGB')
+        self.assertGreater(variant.getpixel((300, 10))[2], 200)
+
+    def test_decompression_bomb_is_refused(self):
+        Image.new('1', (10000, 10000)).save(os.path.join(self.media_root, 'user_1/bomb.png'))
+
+        from hub import images
+        limit, images.MAX_IMAGE_PIXELS = images.MAX_IMAGE_PIXELS, 1000
+        self.addCleanup(setattr, images, 'MAX_IMAGE_PIXELS', limit)
+
+        pillow_limit = Image.MAX_IMAGE_PIXELS
+        self.assertNotEqual(make_avatars(self.media_root, 'user_1/bomb.png'), '')
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'avatars')))
+        # the limit of the other uses of Pillow
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, pillow_limit)
+
+    def test_command_and_template_tag(self):
+        Image.new('RGBA', (50, 80)).save(os.path.join(self.media_root, 'user_1/me.png'))
+
+        with override_settings(MEDIA_ROOT=self.media_root):
+            profile = create_profile('pictured', picture='user_1/me.png')
+            self.assertEqual(avatar(profile.picture, 'small')['original'], '/media/user_1/me.png')
+
+            call_command('generate_avatars', workers=1, stdout=StringIO())
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.picture_variants, 'user_1/me.png')
+        self.assertEqual(avatar(profile.picture, 'small')['webp'], '/media/avatars/user_1/me_small.webp')
+
+
+class DownloadTests(TestCase):
+    ''' Tests of the resume download view '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'user_1'))
+        self.content = bytes(range(256)) * 1000
+        with open(os.path.join(self.media_root, 'user_1', 'cv.pdf'), 'wb') as pdf:
+            pdf.write(self.content)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.profile = create_profile('owner', resume_file='user_1/cv.pdf')
+        self.url = reverse('hub:download_resume', kwargs={'user_profile_id': self.profile.id})
+
+    def test_full_download_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('Owner resume.pdf', response['Content-Disposition'])
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/{0}'.format(len(self.content)))
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes={0}-'.format(len(self.content)))
+        self.assertEqual(response.status_code, 416)
+
+        # a stale If-Range gets the whole (new) file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_header(self):
+        from hub import downloads
+        header, downloads.SENDFILE_HEADER = downloads.SENDFILE_HEADER, 'X-Accel-Redirect'
+        self.addCleanup(setattr, downloads, 'SENDFILE_HEADER', header)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/user_1/cv.pdf')
+        self.assertEqual(response.content, b'')
+
+
+class BlobStorageTests(TransactionTestCase):
+    ''' Tests of the content-addressed storage of uploads (reference counts change on commit) '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, HUB_JOB_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        from hub import blobs
+        grace, blobs.BLOB_GRACE_SECONDS = blobs.BLOB_GRACE_SECONDS, -1
+        self.addCleanup(setattr, blobs, 'BLOB_GRACE_SECONDS', grace)
+
+    def upload(self, username, content, filename='cv.pdf'):
+        user = User.objects.create_user(username=username, password='changeit')
+        self.client.force_login(user)
+        self.client.post(reverse('hub:dashboard'), {
+            'description': 'resume',
+            'resume_file': SimpleUploadedFile(filename, content),
+        })
+        return UserProfile.objects.get(user=user)
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload('first', b'%PDF-1.4 same content')
+        second = self.upload('second', b'%PDF-1.4 same content', filename='other.PDF')
+
+        self.assertEqual(first.resume_file.name, second.resume_file.name)
+        self.assertTrue(first.resume_file.name.startswith('blobs/'))
+        self.assertEqual(Blob.objects.get(name=first.resume_file.name).refcount, 2)
+
+        first.delete()
+        self.assertEqual(Blob.objects.get(name=second.resume_file.name).refcount, 1)
+        self.assertTrue(os.path.exists(second.resume_file.path))
+
+    def test_replaced_file_is_deleted(self):
+        profile = self.upload('owner', b'%PDF-1.4 version 1')
+        old_path = profile.resume_file.path
+
+        self.client.post(reverse('hub:dashboard'), {
+            'description': 'resume',
+            'resume_file': SimpleUploadedFile('cv.pdf', b'%PDF-1.4 version 2'),
+        })
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(Blob.objects.filter(name=profile.resume_file.name).exists())
+
+    def test_migration_command(self):
+        os.makedirs(os.path.join(self.media_root, 'user_1'))
+        for name in ('user_1/a.pdf', 'user_1/b.pdf'):
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(b'%PDF same template')
+        first = create_profile('first', resume_file='user_1/a.pdf')
+        second = create_profile('second', resume_file='user_1/b.pdf')
+
+        call_command('migrate_media_to_blobs', stdout=StringIO(), stderr=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.resume_file.name, second.resume_file.name)
+        self.assertEqual(Blob.objects.get(name=first.resume_file.name).refcount, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'user_1/a.pdf')))
+
+
+@override_settings(HUB_JOB_WORKERS=0)
+class UploadTests(TestCase):
+    ''' Tests of the bounded upload handling '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='uploader', password='changeit')
+        self.client.force_login(self.user)
+
+    def upload(self, content, filename='cv.pdf'):
+        return self.client.post(reverse('hub:dashboard') + '?X-Progress-ID=abc', {
+            'description': 'resume',
+            'resume_file': SimpleUploadedFile(filename, content),
+        })
+
+    def test_valid_upload_is_hashed_on_the_way(self):
+        content = b'%PDF-1.4 ' + b'x' * 200000
+        self.upload(content)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertIn(hashlib.sha256(content).hexdigest(), profile.resume_file.name)
+        with open(profile.resume_file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+        progress = self.client.get(reverse('hub:upload_progress'), {'X-Progress-ID': 'abc'}).json()
+        self.assertTrue(progress['done'])
+        self.assertEqual(progress['received'], len(content))
+
+    def test_stored_extension_is_the_one_of_the_detected_type(self):
+        self.upload(b'%PDF-1.4 <script>alert(1)</script>', filename='cv.html')
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertTrue(profile.resume_file.name.endswith('.pdf'))
+
+    def test_wrong_type_is_rejected(self):
+        response = self.upload(b'MZ\x90\x00 an executable', filename='cv.pdf')
+        self.assertContains(response, 'must be a file of type')
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_oversize_upload_is_stopped(self):
+        max_size, RESUME_UPLOAD['max_size'] = RESUME_UPLOAD['max_size'], 100 * 1024
+        self.addCleanup(RESUME_UPLOAD.__setitem__, 'max_size', max_size)
+
+        response = self.upload(b'%PDF-1.4 ' + b'x' * 300 * 1024)
+        self.assertContains(response, 'must be smaller than')
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+
+
+class BenchmarkTests(TestCase):
+    ''' Tests of the synthetic dataset and the view benchmarks '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_dataset_comments_are_skewed(self):
+        profile_ids = generate_dataset(users=50, comments=1000, skew=1.2, batch_size=100)
+
+        self.assertEqual(UserProfile.objects.filter(id__in=profile_ids).count(), 50)
+        self.assertEqual(Comment.objects.count(), 1000)
+        # the most popular resume gets far more than an even share (20 comments)
+        self.assertGreater(Comment.objects.filter(resume_id=profile_ids[0]).count(), 100)
+        self.assertEqual(Blob.objects.get().refcount, 50)
+
+    def test_benchmark_reports_queries_and_regressions(self):
+        generate_dataset(users=5, comments=20)
+        runner = ClientRunner(User.objects.filter(username__startswith='bench_').first())
+
+        results = run_benchmark(runner, benchmark_context(), names=['index', 'dashboard'], count=3, warmup=1)
+
+        self.assertEqual(set(results), {'index', 'dashboard'})
+        self.assertEqual(results['index']['requests'], 3)
+        self.assertEqual(results['index']['errors'], 0)
+        # the feed and the validators of the page
+        self.assertEqual(results['index']['queries_max'], 3)
+
+        slower = dict(results['index'], p95_ms=results['index']['p95_ms'] * 2 + 1)
+        self.assertEqual([regression[0] for regression in compare(results, {'index': slower}, threshold=10)], ['index'])
+        self.assertEqual(compare(results, results), [])
+
+
+class MetricsTests(TestCase):
+    ''' Tests of the request metrics middleware and endpoint '''
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        create_profile('someone')
+
+        # the scraper of the tests
+        patcher = mock.patch('hub.views.ALLOWED_ADDRESSES', ('127.0.0.1',))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_are_measured_per_view(self):
+        self.client.get(reverse('hub:index'))
+        self.client.get(reverse('hub:index'))
+
+        index = metrics.views['hub:index']
+        self.assertEqual(index.latency.count, 2)
+        self.assertEqual(index.responses, {200: 2})
+        self.assertEqual(index.queries.sum, 6)
+        self.assertGreater(index.template_seconds, 0)
+        self.assertGreater(index.response_bytes, 0)
+
+        text = self.client.get(reverse('hub:metrics')).content.decode()
+        self.assertIn('hub_requests_total{view="hub:index",status="200"} 2', text)
+        self.assertIn('hub_request_duration_seconds_count{view="hub:index"} 2', text)
+        self.assertIn('hub_resume_cache_hits_total', text)
+
+    def test_slowest_sampled_requests_keep_their_queries(self):
+        from hub import middleware
+        rate, middleware.SLOW_SAMPLE_RATE = middleware.SLOW_SAMPLE_RATE, 1
+        self.addCleanup(setattr, middleware, 'SLOW_SAMPLE_RATE', rate)
+
+        self.client.get(reverse('hub:index'))
+
+        slowest = self.client.get(reverse('hub:metrics'), {'format': 'json'}).json()['slowest_requests']
+        self.assertEqual(slowest[0]['view'], 'hub:index')
+        self.assertIn('hub_userprofile', slowest[0]['queries'][0]['sql'])
+
+    def test_render_time_is_attributed_to_each_template(self):
+        cache.clear()
+        self.client.get(reverse('hub:index'))
+
+        templates = {row['template']: row for row in self.client.get(reverse('hub:metrics'), {'format': 'json'}).json()['templates']}
+        self.assertEqual(templates['hub/index.html']['renders'], 1)
+        # the card includes the avatar
+        card = templates['hub/resume_card.html']
+        self.assertEqual(card['renders'], 1)
+        self.assertLess(card['self_seconds'], card['seconds'])
+        self.assertIn('hub_template_self_seconds_total{template="hub/avatar.html"}', self.client.get(reverse('hub:metrics')).content.decode())
+
+    def test_metrics_are_restricted_to_special_users_and_allowed_clients(self):
+        self.assertEqual(self.client.get(reverse('hub:metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+        with mock.patch('hub.views.ALLOWED_ADDRESSES', ()):
+            # loopback is a local proxy as well
+            self.assertEqual(self.client.get(reverse('hub:metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+        special = create_profile('special', is_special=True)
+        self.client.force_login(special.user)
+        self.assertEqual(self.client.get(reverse('hub:metrics'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedUsersTests(TestCase):
+    ''' Tests of the specific users created by the seed_users command and after the first migration '''
+
+    def test_seeding_again_keeps_the_users_and_their_passwords(self):
+        # created by the migrations of the test database
+        admin = User.objects.get(username='admin')
+        admin.set_password('new admin password')
+        admin.save()
+        teacher_password = User.objects.get(username='teacher').password
+
+        initial = MigrationLoader(connection).get_migration('hub', '0001_initial')
+        for i in range(2):
+            call_command('seed_users', stdout=StringIO())
+            seed_users(sender=None, plan=[(initial, False)])
+            call_command('migrate', verbosity=0)
+
+        self.assertEqual(User.objects.filter(username__in=['admin', 'teacher']).count(), 2)
+        self.assertEqual(UserProfile.objects.filter(user__username__in=['admin', 'teacher'], is_special=True).count(), 2)
+        self.assertTrue(User.objects.get(username='admin').check_password('new admin password'))
+        self.assertEqual(User.objects.get(username='teacher').password, teacher_password)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportExportTests(TestCase):
+    ''' Tests of the import_users and export_resumes commands '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(self.directory, 'media'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        with open(os.path.join(self.directory, 'cv.pdf'), 'wb') as resume_file:
+            resume_file.write(b'%PDF-1.4 resume')
+
+        self.path = os.path.join(self.directory, 'users.jsonl')
+        with open(self.path, 'w') as records:
+            records.write('{"username": "sara", "password": "secret", "first_name": "Sara", "description": "Python developer", "resume_file": "cv.pdf"}\n')
+            records.write('{"username": "reza", "password": "secret", "resume_file": "cv.pdf"}\n')
+            records.write('{"username": "sara"}\n')
+            records.write('not json\n')
+
+    def import_users(self, *args):
+        call_command('import_users', self.path, '--workers', '1', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_creates_users_profiles_and_blobs(self):
+        self.import_users()
+
+        sara = UserProfile.objects.get(user__username='sara')
+        self.assertTrue(sara.user.check_password('secret'))
+        self.assertEqual(sara.summary, 'Python developer')
+        self.assertEqual(UserProfile.objects.get(user__username='reza').resume_file.name, sara.resume_file.name)
+        self.assertEqual(Blob.objects.get(name=sara.resume_file.name).refcount, 2)
+        self.assertEqual(search_resumes('python')[0], [sara])
+
+        # imported again: the existing users are skipped
+        self.import_users()
+        self.assertEqual(User.objects.filter(username__in=['sara', 'reza']).count(), 2)
+
+    def test_dry_run_writes_nothing(self):
+        self.import_users('--dry-run')
+
+        self.assertFalse(User.objects.filter(username='sara').exists())
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'media')))
+
+    def test_export_can_be_imported(self):
+        self.import_users()
+        output = os.path.join(self.directory, 'export.csv')
+        call_command('export_resumes', '--output', output, '--files-dir', os.path.join(self.directory, 'files'), '--with-passwords', stdout=StringIO())
+        User.objects.filter(username__in=['sara', 'reza']).delete()
+
+        call_command('import_users', output, '--workers', '1', stdout=StringIO(), stderr=StringIO())
+
+        sara = UserProfile.objects.get(user__username='sara')
+        self.assertTrue(sara.user.check_password('secret'))
+        self.assertTrue(sara.resume_file)
+
+
+class DatabaseTests(TestCase):
+    ''' Tests of the SQLite pragmas and the read replica router '''
+
+    def test_pragmas_are_applied_to_sqlite_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            cache_size = cursor.fetchone()[0]
+
+            with self.settings(HUB_SQLITE_PRAGMAS={'cache_size': -1234}):
+                configure_sqlite(sender=None, connection=connection)
+            self.addCleanup(connection.cursor().execute, 'PRAGMA cache_size = {0}'.format(cache_size))
+
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+    def test_only_hub_reads_of_read_only_views_go_to_the_replica(self):
+        middleware = routers.ReplicaMiddleware(lambda request: HttpResponse())
+        router = routers.ReplicaRouter()
+        factory = RequestFactory()
+
+        def view_reads(request, model):
+            middleware.process_view(request, None, (), {})
+            try:
+                return router.db_for_read(model)
+            finally:
+                middleware(request)
+
+        with mock.patch('hub.routers.replica_available', return_value=True):
+            index = factory.get(reverse('hub:index'))
+            index.resolver_match = resolve(index.path)
+            self.assertEqual(view_reads(index, UserProfile), 'replica')
+            self.assertEqual(view_reads(index, User), 'default')
+
+            comment = factory.post(reverse('hub:comment'))
+            comment.resolver_match = resolve(comment.path)
+            self.assertEqual(view_reads(comment, UserProfile), 'default')
+
+        # reset after the response
+        self.assertEqual(router.db_for_read(UserProfile), 'default')
+        self.assertEqual(router.db_for_write(UserProfile), 'default')
+
+    def test_writers_read_from_the_primary_until_the_replica_has_their_changes(self):
+        middleware = routers.ReplicaMiddleware(lambda request: HttpResponse())
+        index = RequestFactory().get(reverse('hub:index'))
+        index.resolver_match = resolve(index.path)
+
+        with mock.patch('hub.routers.replica_available', return_value=True):
+            response = middleware(RequestFactory().post(reverse('hub:comment')))
+            self.assertIn(routers.WRITE_COOKIE, response.cookies)
+
+            middleware.process_view(index, None, (), {})
+            self.assertTrue(routers.reading_from_replica())
+            middleware(index)
+
+            index.COOKIES[routers.WRITE_COOKIE] = response.cookies[routers.WRITE_COOKIE].value
+            middleware.process_view(index, None, (), {})
+            self.assertFalse(routers.reading_from_replica())
+            middleware(index)
+
+    def test_fragments_of_versions_newer_than_the_replica_are_not_cached(self):
+        cache.clear()
+        render = mock.Mock(return_value='fragment')
+        routers._local.use_replica = True
+        self.addCleanup(setattr, routers._local, 'use_replica', False)
+
+        with mock.patch('hub.caching.replica_synced_at', return_value=new_version() - 10**6):
+            cached_resume_fragment(1, render)
+            cached_resume_fragment(1, render)
+        self.assertEqual(render.call_count, 2)
+
+        with mock.patch('hub.caching.replica_synced_at', return_value=new_version()):
+            cached_resume_fragment(1, render)
+            cached_resume_fragment(1, render)
+        self.assertEqual(render.call_count, 3)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'query plans of SQLite')
+class QueryPlanTests(TestCase):
+    ''' Guards the indexes of the hot queries: no full table scans or sorts '''
+
+    def setUp(self):
+        self.profile = create_profile('someone', description='Python developer')
+        Comment.objects.create(user=self.profile.user, resume=self.profile, content='Nice!')
+        cache.clear()
+
+    def test_hot_views_use_indexes(self):
+        cursor = '1700000000000000_{0}'.format(self.profile.id)
+        paths = [
+            reverse('hub:index'),
+            reverse('hub:index') + '?before=' + cursor,
+            reverse('hub:index') + '?order=discussed',
+            reverse('hub:index') + '?order=discussed&before=1_{0}'.format(self.profile.id),
+            reverse('hub:index') + '?order=active',
+            reverse('hub:index') + '?order=active&before=' + cursor,
+            reverse('hub:search') + '?q=python',
+            reverse('hub:resume', args=[self.profile.id]),
+            reverse('hub:comments', args=[self.profile.id]) + '?format=json&after=' + cursor,
+            reverse('hub:download_resume', args=[self.profile.id]),
+            reverse('hub:api_resumes') + '?order=active&before=' + cursor,
+            reverse('hub:api_resume', args=[self.profile.id]),
+            reverse('hub:api_comments', args=[self.profile.id]) + '?after=' + cursor,
+        ]
+
+        queries = []
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            for path in paths:
+                self.client.get(path)
+
+        selects = [(sql, params) for sql, params in queries if sql.startswith('SELECT')]
+        self.assertGreater(len(selects), len(paths))
+        for sql, params in selects:
+            self.assertEqual(plan_problems(query_plan(sql, params)), [], sql)
+
+    def test_scans_of_whole_indexes_are_problems(self):
+        self.assertEqual(plan_problems(['SCAN hub_comment USING INDEX hub_comment_resume_id_idx']), ['SCAN hub_comment USING INDEX hub_comment_resume_id_idx'])
+        self.assertEqual(plan_problems(['SCAN hub_job USING COVERING INDEX hub_job_claim_idx']), ['SCAN hub_job USING COVERING INDEX hub_job_claim_idx'])
+        self.assertEqual(plan_problems(['SCAN hub_userprofile USING INDEX hub_userprofile_feed_idx']), [])
+
+    def test_feed_indexes_exist(self):
+        # indexes of the model: rebuilt with the table by the migrations that alter it
+        self.assertTrue({'hub_userprofile_feed_idx', 'hub_userprofile_discussed_idx', 'hub_userprofile_active_idx'} <= {
+            index.name for index in UserProfile._meta.indexes
+        })
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'hub_userprofile'")
+            names = {row[0] for row in cursor.fetchall()}
+
+        for name in ('hub_userprofile_feed_idx', 'hub_userprofile_discussed_idx', 'hub_userprofile_active_idx'):
+            self.assertIn(name, names)
+
+
+class CommentCountTests(TestCase):
+    ''' Tests of the comment counts of profiles '''
+
+    def setUp(self):
+        self.profile = create_profile('someone')
+        self.writer = User.objects.create_user(username='writer', password='changeit')
+        self.client.force_login(self.writer)
+
+    def post_comment(self, content):
+        self.client.post(reverse('hub:comment'), {'content': content, 'resume_id': self.profile.id})
+        return Comment.objects.latest('id')
+
+    def test_counts_follow_new_and_deleted_comments(self):
+        first = self.post_comment('First')
+        second = self.post_comment('Second')
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.comment_count, 2)
+        self.assertEqual(self.profile.last_comment_at, second.created_at)
+
+        self.client.post(reverse('hub:delete_comment', args=[second.id]))
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.comment_count, 1)
+        self.assertEqual(self.profile.last_comment_at, first.created_at)
+
+    def test_xhr_comment_returns_only_the_new_comment(self):
+        response = self.client.post(
+            reverse('hub:comment'), {'content': 'Posted with XHR', 'resume_id': self.profile.id},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Posted with XHR', status_code=201)
+        self.assertEqual([template.name for template in response.templates], ['hub/comment.html', 'hub/avatar.html'])
+
+        response = self.client.post(
+            reverse('hub:comment'), {'content': 'As JSON', 'resume_id': self.profile.id},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.json()['content'], 'As JSON')
+
+        response = self.client.post(reverse('hub:comment'), {'content': 'Lost', 'resume_id': 0}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Comment.objects.count(), 2)
+
+        # without XHR, the redirect to the resume page
+        response = self.client.post(reverse('hub:comment'), {'content': 'Posted', 'resume_id': self.profile.id})
+        self.assertRedirects(response, reverse('hub:resume', args=[self.profile.id]), fetch_redirect_response=False)
+
+    def test_only_the_writer_can_delete_a_comment(self):
+        comment = self.post_comment('Mine')
+        other = User.objects.create_user(username='other', password='changeit')
+        self.client.force_login(other)
+
+        self.client.post(reverse('hub:delete_comment', args=[comment.id]))
+        self.assertTrue(Comment.objects.filter(pk=comment.pk).exists())
+
+    def test_discussed_order_and_reconciliation(self):
+        quiet = create_profile('quiet')
+        self.post_comment('Hello')
+        UserProfile.objects.filter(pk=quiet.pk).update(comment_count=5)
+
+        resumes, _ = recent_resumes(order='discussed')
+        self.assertEqual(resumes[0], quiet)
+
+        call_command('reconcile_comment_counts', stdout=StringIO())
+
+        resumes, _ = recent_resumes(order='discussed')
+        self.assertEqual(resumes, [self.profile, quiet])
+        self.assertEqual(recent_resumes(order='active')[0], [self.profile])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ApiTests(TestCase):
+    ''' Tests of the JSON API '''
+
+    def setUp(self):
+        cache.clear()
+        self.profiles = [create_profile('user{0}'.format(i), description='Resume {0}'.format(i)) for i in range(25)]
+        self.profile = self.profiles[-1]
+        Comment.objects.create(user=self.profiles[0].user, resume=self.profile, content='Nice!')
+
+    def test_feed_pages_with_sparse_fields(self):
+        response = self.client.get(reverse('hub:api_resumes'), {'fields': 'id,fullname'})
+        data = response.json()
+
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(set(data['results'][0]), {'id', 'fullname'})
+
+        rest = self.client.get(reverse('hub:api_resumes'), {'fields': 'id', 'before': data['next']}).json()
+        self.assertEqual(len(rest['results']), 5)
+        self.assertIsNone(rest['next'])
+
+        self.assertEqual(self.client.get(reverse('hub:api_resumes'), {'fields': 'id,password'}).status_code, 400)
+
+    def test_resume_and_comments(self):
+        data = self.client.get(reverse('hub:api_resume', args=[self.profile.id])).json()
+        self.assertEqual(data['fullname'], 'User24')
+        self.assertEqual(data['description'], 'Resume 24')
+        self.assertEqual(data['comment_count'], 1)
+
+        comments = self.client.get(reverse('hub:api_comments', args=[self.profile.id])).json()
+        self.assertEqual([comment['content'] for comment in comments['results']], ['Nice!'])
+
+        self.assertEqual(self.client.get(reverse('hub:api_resume', args=[0])).status_code, 404)
+
+    def test_unchanged_resources_are_not_modified(self):
+        url = reverse('hub:api_resume', args=[self.profile.id])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # another field set is another representation
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.profile.description = 'Changed'
+        self.profile.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_gzipped_resources_are_not_modified(self):
+        url = reverse('hub:api_resumes')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        # weakened by the compression
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class StaticFilesTests(TestCase):
+    ''' Tests of the static build (hub.staticfiles) and PrecompressedStaticMiddleware '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        source = os.path.join(self.directory, 'static')
+        os.makedirs(os.path.join(source, 'fonts'))
+
+        with open(os.path.join(source, 'style.css'), 'w') as file:
+            file.write('@font-face { src: url("fonts/font.woff2"); }\n' + 'body { color: black; }\n' * 100)
+        with open(os.path.join(source, 'fonts', 'font.woff2'), 'wb') as file:
+            file.write(os.urandom(1000))
+        Image.new('RGB', (200, 200), 'red').save(os.path.join(source, 'red.png'), compress_level=0)
+
+        settings_override = override_settings(
+            STATICFILES_STORAGE='hub.staticfiles.CompressedManifestStaticFilesStorage',
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=os.path.join(self.directory, 'collected'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.collected = os.path.join(self.directory, 'collected')
+
+    def manifest(self):
+        with open(os.path.join(self.collected, 'staticfiles.json')) as file:
+            return json.load(file)['paths']
+
+    def test_collectstatic_fingerprints_optimizes_and_precompresses(self):
+        manifest = self.manifest()
+        style = manifest['style.css']
+        self.assertRegex(style, r'^style\.[0-9a-f]{12}\.css$')
+
+        with open(os.path.join(self.collected, style), 'rb') as file:
+            content = file.read()
+        self.assertIn(manifest['fonts/font.woff2'].encode(), content)
+        with gzip.open(os.path.join(self.collected, style + '.gz')) as file:
+            self.assertEqual(file.read(), content)
+
+        # images are optimized, fonts aren't compressed again
+        self.assertLess(os.path.getsize(os.path.join(self.collected, manifest['red.png'])), 200 * 200 * 3)
+        self.assertFalse(os.path.exists(os.path.join(self.collected, manifest['fonts/font.woff2'] + '.gz')))
+
+    def test_middleware_serves_precompressed_files(self):
+        style = self.manifest()['style.css']
+        url = '/static/' + style
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'body', gzip.decompress(b''.join(response.streaming_content)))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'body', b''.join(response.streaming_content))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # unhashed names are served with a short max-age, missing files go to the views
+        self.assertNotIn('immutable', self.client.get('/static/style.css')['Cache-Control'])
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+
+
+class FragmentCacheTests(TestCase):
+    ''' Tests of the cached cards of the feed and blocks of the comments '''
+
+    def setUp(self):
+        cache.clear()
+        self.profiles = [create_profile('user{0}'.format(i)) for i in range(3)]
+
+    def rendered(self, response):
+        return [template.name for template in response.templates]
+
+    def test_unchanged_cards_come_from_the_cache(self):
+        self.assertEqual(self.rendered(self.client.get(reverse('hub:index'))).count('hub/resume_card.html'), 3)
+
+        response = self.client.get(reverse('hub:index'))
+        self.assertNotIn('hub/resume_card.html', self.rendered(response))
+        self.assertContains(response, 'User2')
+
+        # counts change without updated_at
+        UserProfile.objects.filter(pk=self.profiles[0].pk).update(comment_count=7)
+        response = self.client.get(reverse('hub:index'))
+        self.assertEqual(self.rendered(response).count('hub/resume_card.html'), 1)
+        self.assertContains(response, '7 comments')
+
+    def test_comment_blocks_follow_their_users(self):
+        commenter = self.profiles[1].user
+        Comment.objects.create(user=commenter, resume=self.profiles[0], content='Nice!')
+        url = reverse('hub:comments', args=[self.profiles[0].id])
+        self.client.get(url)
+
+        # the page of comments is cached with the resume, not the blocks
+        cache.delete('hub:resume:{0}:version'.format(self.profiles[0].id))
+        self.assertNotIn('hub/comment.html', self.rendered(self.client.get(url)))
+
+        User.objects.filter(pk=commenter.pk).update(first_name='Renamed')
+        cache.delete('hub:resume:{0}:version'.format(self.profiles[0].id))
+        self.assertContains(self.client.get(url), 'Renamed')
+
+
+class ConditionalPageTests(TestCase):
+    ''' Tests of the ETags of the pages (hub.conditional) and of TextGZipMiddleware '''
+
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            create_profile('user{0}'.format(i), description='resume ' * 100)
+        self.url = reverse('hub:index')
+
+    def test_unchanged_index_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_the_feed_and_the_viewer(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertNotEqual(self.client.get(self.url, {'order': 'discussed'})['ETag'], etag)
+
+        # a bulk import doesn't send signals
+        user = User.objects.create_user(username='imported')
+        UserProfile.objects.bulk_create([UserProfile(user=user, resume_file='resume.pdf')])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_follows_the_relative_time_of_the_last_comment(self):
+        profile = UserProfile.objects.get(user__username='user0')
+        Comment.objects.create(user=profile.user, resume=profile, content='hi')
+        now = timezone.now()
+
+        def revalidate(commented_ago, later):
+            ''' status of the revalidation, `later` after a page that was last commented `commented_ago` '''
+            UserProfile.objects.filter(pk=profile.pk).update(last_comment_at=now - commented_ago)
+            with mock.patch('django.utils.timezone.now', return_value=now):
+                etag = self.client.get(self.url)['ETag']
+            with mock.patch('django.utils.timezone.now', return_value=now + later):
+                return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code
+
+        # "5 minutes", then "6 minutes"
+        self.assertEqual(revalidate(datetime.timedelta(minutes=5, seconds=30), datetime.timedelta(seconds=20)), 304)
+        self.assertEqual(revalidate(datetime.timedelta(minutes=5, seconds=30), datetime.timedelta(seconds=40)), 200)
+
+        # "1 day, 2 hours" until "1 day, 3 hours", whatever the time of the clock
+        self.assertEqual(revalidate(datetime.timedelta(days=1, hours=2, minutes=30), datetime.timedelta(minutes=29)), 304)
+        self.assertEqual(revalidate(datetime.timedelta(days=1, hours=2, minutes=30), datetime.timedelta(minutes=31)), 200)
+
+    def test_streamed_text_is_gzipped_as_it_streams(self):
+        middleware = TextGZipMiddleware(lambda request: None)
+        request = RequestFactory().get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        response = middleware.process_response(request, StreamingHttpResponse(iter([b'a line\n'] * 10), content_type='text/csv'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'a line\n' * 10)
+
+    def test_pages_are_gzipped(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'User0', gzip.decompress(response.content))
+
+        # the ETag is weak once compressed, and still matches
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.assertFalse(self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity').has_header('Content-Encoding'))
+
+
+# jobs of the queue tests, they record their calls
+job_calls = []
+
+@jobs.job(name='test_record')
+def record_job(value):
+    job_calls.append(value)
+
+@jobs.job(name='test_fail', max_attempts=2)
+def failing_job():
+    raise ValueError('broken')
+
+@jobs.job(name='test_describe')
+def describe_job(profile_id, description):
+    # like the jobs of hub.tasks: update() and invalidate the pages
+    UserProfile.objects.filter(pk=profile_id).update(description=description)
+    invalidate_resumes([profile_id])
+
+def file_cache(directory):
+    return {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+
+
+class JobQueueTests(TestCase):
+    ''' Tests of the job queue in the database '''
+
+    def setUp(self):
+        job_calls.clear()
+
+    def test_jobs_run_by_priority_and_keys_are_queued_once(self):
+        jobs.enqueue('test_record', {'value': 'low'})
+        jobs.enqueue('test_record', {'value': 'high'}, priority=5)
+        first = jobs.enqueue('test_record', {'value': 'keyed'}, key='k')
+        self.assertEqual(jobs.enqueue('test_record', {'value': 'again'}, key='k'), first)
+        jobs.enqueue('test_record', {'value': 'later'}, delay=60)
+
+        self.assertEqual(jobs.work(burst=True), (3, 0))
+        self.assertEqual(job_calls, ['high', 'low', 'keyed'])
+
+        # the key of a finished job can be used again
+        self.assertNotEqual(jobs.enqueue('test_record', {'value': 'again'}, key='k'), first)
+        stats = jobs.queue_stats(first.created_at)
+        self.assertEqual((stats['queued'], stats['ready'], stats['done'], stats['finished']), (2, 1, 3, 3))
+
+    def test_changes_during_a_running_job_queue_it_again(self):
+        first = jobs.enqueue('test_record', {'value': 'first'}, key='k')
+        running = jobs.claim('test')
+        self.assertEqual(running, first)
+
+        # the running job may have read the data before this change
+        self.assertNotEqual(jobs.enqueue('test_record', {'value': 'second'}, key='k'), first)
+        jobs.run(running)
+        self.assertEqual(jobs.work(burst=True), (1, 0))
+        self.assertEqual(job_calls, ['first', 'second'])
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        failing = jobs.enqueue('test_fail')
+
+        with self.assertLogs('hub.jobs', 'ERROR'):
+            self.assertEqual(jobs.work(burst=True), (0, 1))
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.QUEUED, 1))
+        self.assertIn('ValueError: broken', failing.last_error)
+        self.assertGreater(failing.run_at, timezone.now() + datetime.timedelta(seconds=jobs.RETRY_DELAY - 1))
+
+        # the last attempt
+        Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+        with self.assertLogs('hub.jobs', 'ERROR'):
+            self.assertEqual(jobs.work(burst=True), (0, 1))
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+
+    def test_lost_jobs_are_queued_again(self):
+        lost = jobs.enqueue('test_record', {'value': 'lost'})
+        jobs.claim('dead worker')
+        Job.objects.filter(pk=lost.pk).update(started_at=timezone.now() - datetime.timedelta(seconds=jobs.JOB_TIMEOUT + 1))
+
+        self.assertEqual(jobs.requeue_lost_jobs(), 1)
+        out = StringIO()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(CACHES=file_cache(directory)):
+            call_command('run_workers', workers=1, burst=True, stdout=out, stderr=StringIO())
+        self.assertEqual(job_calls, ['lost'])
+        self.assertIn('Done, 1 jobs finished, 0 queued.', out.getvalue())
+
+    def test_workers_need_a_shared_cache(self):
+        # the LocMemCache of the tests
+        with self.assertRaisesMessage(CommandError, 'configure a shared cache'):
+            call_command('run_workers', burst=True, stdout=StringIO())
+
+    def test_uploaded_picture_is_resized_by_a_job(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        picture = BytesIO()
+        Image.new('RGB', (300, 200)).save(picture, 'PNG')
+
+        with override_settings(MEDIA_ROOT=media_root):
+            self.client.force_login(User.objects.create_user(username='pictured', password='changeit'))
+            self.client.post(reverse('hub:change_profile_pic'), {'picture': SimpleUploadedFile('me.png', picture.getvalue())})
+            profile = UserProfile.objects.get(user__username='pictured')
+            self.assertEqual(Job.objects.get().name, 'resize_picture')
+
+            self.assertEqual(jobs.work(burst=True), (1, 0))
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.picture_variants, profile.picture.name)
+
+
+class JobCacheTests(TransactionTestCase):
+    ''' Tests of the pages changed by jobs run in other processes (with their own cache connections) '''
+
+    def setUp(self):
+        self.profile = create_profile('owner', description='before the job')
+        self.url = reverse('hub:resume', args=[self.profile.id])
+
+    def test_jobs_of_workers_invalidate_the_pages_of_the_web_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with self.settings(CACHES=file_cache(directory), HUB_JOB_WORKERS=2):
+            self.assertContains(self.client.get(self.url), 'before the job')
+            jobs.enqueue('test_describe', {'profile_id': self.profile.id, 'description': 'after the job'})
+
+            # a worker process: another connection to the shared cache
+            with mock.patch('hub.caching.cache', FileBasedCache(directory, {})):
+                self.assertEqual(jobs.work(burst=True), (1, 0))
+
+            self.assertContains(self.client.get(self.url), 'after the job')
+
+    def test_jobs_run_in_the_web_process_without_a_shared_cache(self):
+        cache.clear()
+        self.assertContains(self.client.get(self.url), 'before the job')
+
+        with self.settings(HUB_JOB_WORKERS=2):
+            # a worker would bump the versions in its own memory
+            jobs.enqueue('test_describe', {'profile_id': self.profile.id, 'description': 'after the job'})
+
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+        self.assertContains(self.client.get(self.url), 'after the job')
+
+
+class SimilarResumeTests(TestCase):
+    ''' Tests of the precomputed similar resumes '''
+
+    def setUp(self):
+        descriptions = {
+            'django': 'Python developer, Django web applications and REST APIs',
+            'flask': 'Backend developer writing Flask web applications in Python',
+            'chef': 'Chef in a French restaurant kitchen, pastry and sauces',
+            'baker': 'Pastry chef, bakery and restaurant desserts',
+            'nurse': 'Nurse in a hospital emergency room',
+            'doctor': 'Doctor of the hospital emergency room',
+        }
+        self.profiles = {name: create_profile(name, description=text) for name, text in descriptions.items()}
+
+    def similar_names(self, name):
+        return [profile.user.username for profile in similar.similar_resumes(self.profiles[name].id)]
+
+    def test_rebuild_and_resume_page(self):
+        out = StringIO()
+        call_command('rebuild_similar_resumes', stdout=out, stderr=StringIO())
+        self.assertIn('Done, 6 resumes', out.getvalue())
+
+        self.assertEqual(self.similar_names('django'), ['flask'])
+        self.assertEqual(self.similar_names('chef'), ['baker'])
+        self.assertEqual(similar.similar_resumes(self.profiles['nurse'].id)[0].summary, self.profiles['doctor'].summary)
+
+        response = self.client.get(reverse('hub:resume', args=[self.profiles['chef'].id]))
+        self.assertContains(response, 'Similar resumes')
+        self.assertContains(response, reverse('hub:resume', args=[self.profiles['baker'].id]))
+
+    def test_changed_resume_is_updated_incrementally(self):
+        similar.rebuild_similar()
+
+        profile = self.profiles['nurse']
+        profile.description = 'Pastry chef of a restaurant'
+        profile.save()
+        self.assertTrue(Job.objects.filter(name='update_similar', key='update_similar:{0}'.format(profile.id)).exists())
+        jobs.work(burst=True)
+
+        self.assertEqual(set(self.similar_names('nurse')), {'chef', 'baker'})
+        self.assertIn('nurse', self.similar_names('chef'))
+        self.assertNotIn('nurse', self.similar_names('doctor'))
+
+    def test_only_changes_of_the_words_queue_an_update(self):
+        profile = self.profiles['nurse']
+        Job.objects.all().delete()
+
+        profile.save()
+        profile.picture = 'user_1/me.png'
+        profile.save(update_fields=['picture'])
+        profile.save(update_fields=['is_special'])
+        self.assertFalse(Job.objects.filter(name='update_similar').exists())
+
+        profile.resume_text = 'Night shifts'
+        profile.save(update_fields=['resume_text'])
+        self.assertTrue(Job.objects.filter(name='update_similar', key='update_similar:{0}'.format(profile.id)).exists())
+
+
+class OrphanedMediaTests(TestCase):
+    ''' Tests of the garbage collection of MEDIA_ROOT '''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        used_blob = 'blobs/aa/bb/{0}.pdf'.format('a' * 64)
+        used_picture = 'blobs/cc/dd/{0}.png'.format('c' * 64)
+
+        self.used = [
+            used_blob, used_picture, 'user_2/cv.pdf',
+            avatar_name(used_picture, 'small', 'jpg'), avatar_name(used_picture, 'big', 'webp'),
+            # not written by hub
+            'robots.txt', 'avatars/README',
+        ]
+        self.orphans = [
+            'blobs/ee/ff/{0}.pdf'.format('e' * 64), 'blobs/tmp/tmpx1y2', 'user_2/old.pdf',
+            avatar_name('blobs/99/99/{0}.jpg'.format('9' * 64), 'normal', 'jpg'),
+        ]
+        for name in self.used + self.orphans + ['blobs/12/34/recent.pdf']:
+            self.write(name, age=0 if name == 'blobs/12/34/recent.pdf' else 7200)
+
+        create_profile('blob', resume_file=used_blob, picture=used_picture)
+        create_profile('legacy', resume_file='user_2/cv.pdf')
+        # a blob released while it was too recent to delete
+        Blob.objects.create(name='blobs/ee/ff/{0}.pdf'.format('e' * 64), refcount=0)
+
+    def write(self, name, age):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'12345')
+        os.utime(path, (time.time() - age, time.time() - age))
+
+    def existing(self):
+        return [name for name in self.used + self.orphans if os.path.exists(os.path.join(self.media_root, name))]
+
+    def test_dry_run_reports_the_orphans(self):
+        out = StringIO()
+        call_command('collect_orphaned_media', dry_run=True, workers=2, batch_size=2, stdout=out)
+
+        self.assertIn('Done, 11 files scanned, 4 orphaned files, 20 bytes reclaimable.', out.getvalue())
+        self.assertEqual(self.existing(), self.used + self.orphans)
+
+    def test_orphans_are_quarantined_or_deleted(self):
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+
+        call_command('collect_orphaned_media', quarantine=quarantine, stdout=StringIO())
+        self.assertEqual(self.existing(), self.used)
+        self.assertTrue(os.path.exists(os.path.join(quarantine, 'user_2/old.pdf')))
+        self.assertFalse(Blob.objects.filter(refcount=0).exists())
+
+        # the recent file is kept until it is old enough
+        call_command('collect_orphaned_media', min_age=0, stdout=StringIO())
+        self.assertEqual(self.existing(), self.used)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'blobs/12/34/recent.pdf')))
+
+    def test_big_batches_are_looked_up_in_chunks(self):
+        from hub.management.commands.collect_orphaned_media import referenced_names, pictures_with_roots
+
+        # more names and roots than SQLite takes parameters and OR terms in a query
+        names = ['user_9/{0}.pdf'.format(i) for i in range(5000)] + ['user_2/cv.pdf']
+        self.assertEqual(referenced_names(names), {'user_2/cv.pdf'})
+
+        roots = ['avatars/{0}'.format(i) for i in range(3000)] + ['blobs/cc/dd/{0}'.format('c' * 64)]
+        self.assertEqual(pictures_with_roots(roots), {'blobs/cc/dd/{0}'.format('c' * 64)})
@@ -0,0 +1,191 @@
+import hashlib
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+# Leading bytes of the accepted file types
+MAGIC_NUMBERS = {
+    'pdf': (b'%PDF-',),
+    'docx': (b'PK\x03\x04',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',),
+}
+
+# Extension of the stored files of each type: never the one they were uploaded
+# with, a PDF named x.html must not be served as HTML
+EXTENSIONS = {
+    'pdf': '.pdf',
+    'docx': '.docx',
+    'doc': '.doc',
+    'png': '.png',
+    'jpeg': '.jpg',
+    'gif': '.gif',
+    'webp': '.webp',
+}
+
+# Number of leading bytes needed to check the type of a file
+MAGIC_LENGTH = 12
+
+RESUME_UPLOAD = {
+    'types': ('pdf', 'docx', 'doc'),
+    'max_size': getattr(settings, 'HUB_UPLOAD_MAX_RESUME_BYTES', 10 * 1024 * 1024),
+}
+
+PICTURE_UPLOAD = {
+    'types': ('png', 'jpeg', 'gif', 'webp'),
+    'max_size': getattr(settings, 'HUB_UPLOAD_MAX_PICTURE_BYTES', 5 * 1024 * 1024),
+}
+
+# Upload progress is reported every this many bytes
+PROGRESS_STEP = 256 * 1024
+
+
+def file_type(head):
+    ''' type of a file from its leading bytes, or None '''
+    for name, magic_numbers in MAGIC_NUMBERS.items():
+        if head.startswith(magic_numbers):
+            if name == 'webp' and head[8:12] != b'WEBP':
+                continue
+            return name
+
+    return None
+
+def progress_key(request, progress_id):
+    ''' cache key of the progress of an upload (only visible to the uploading user) '''
+    return 'hub:upload:{0}:{1}'.format(request.user.pk, progress_id)
+
+
+class BoundedUploadHandler(FileUploadHandler):
+    '''
+    Upload handler that streams each file to a temp file, checks its type
+    from the first bytes and its size while it arrives, and stops reading the
+    request as soon as a file breaks the rules (instead of after the whole
+    body arrived). Files are hashed on the way (file.sha256) for the
+    content-addressed storage, and named with the extension of their type.
+
+    rules maps the accepted file fields to {'types': ..., 'max_size': ...}.
+    The reason of a rejection is set on request.upload_error.
+    '''
+
+    def __init__(self, request, rules):
+        super().__init__(request)
+        self.rules = rules
+        self.progress_id = request.GET.get('X-Progress-ID')
+        self.total = 0
+        self.received = 0
+        self.reported = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.total = content_length
+        self.report(done=False)
+
+    def reject(self, message):
+        self.request.upload_error = message
+        self.report(done=True, error=message)
+        # don't read the rest of the request body
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+
+        self.rule = self.rules.get(field_name)
+        if self.rule is None:
+            self.reject('Unexpected file: {0}'.format(field_name))
+
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+        # the other handlers must not buffer this file
+        raise StopFutureHandlers()
+
+    def check_type(self):
+        self.type = file_type(self.head)
+        if self.type not in self.rule['types']:
+            self.reject('{0} must be a file of type {1}.'.format(self.field_name, ', '.join(self.rule['types'])))
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.rule['max_size']:
+            self.reject('{0} must be smaller than {1} MB.'.format(self.field_name, self.rule['max_size'] // (1024 * 1024)))
+
+        if len(self.head) < MAGIC_LENGTH:
+            self.head += raw_data[:MAGIC_LENGTH]
+            if len(self.head) >= MAGIC_LENGTH:
+                self.check_type()
+
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+        self.received += len(raw_data)
+        if self.received - self.reported >= PROGRESS_STEP:
+            self.report(done=False)
+
+    def file_complete(self, file_size):
+        if len(self.head) < MAGIC_LENGTH:
+            # files smaller than MAGIC_LENGTH
+            self.check_type()
+
+        self.file.name = (os.path.splitext(self.file_name)[0] or self.field_name) + EXTENSIONS[self.type]
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.sha256.hexdigest()
+
+        return self.file
+
+    def upload_complete(self):
+        if not self.request.upload_error:
+            self.report(done=True)
+
+    def report(self, done, error=None):
+        ''' publishes the progress of the upload for the progress endpoint '''
+        if not self.progress_id:
+            return
+
+        self.reported = self.received
+        cache.set(progress_key(self.request, self.progress_id), {
+            'received': self.received,
+            'total': self.total,
+            'done': done,
+            'error': error,
+        }, 60 * 60)
+
+
+def bounded_uploads(**rules):
+    '''
+    Decorator of views that accept uploads: files are handled by
+    BoundedUploadHandler with the rules of each field, e.g.
+    @bounded_uploads(picture=PICTURE_UPLOAD)
+    '''
+    def decorator(view):
+        @csrf_protect
+        def protected_view(request, *args, **kwargs):
+            if request.method == 'POST':
+                # parse the body now (if the CSRF check didn't) so request.upload_error is set
+                request.FILES
+
+            return view(request, *args, **kwargs)
+
+        @wraps(view)
+        @csrf_exempt
+        def wrapper(request, *args, **kwargs):
+            # upload handlers can only be changed before the body is read,
+            # so the CSRF check (which reads it) is done after this
+            request.upload_handlers = [BoundedUploadHandler(request, rules)]
+            request.upload_error = None
+
+            return protected_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,20 +1,33 @@
 from django.urls import path
 from hub.views import *
+from hub import api
 
 
 app_name = 'hub'
 
 urlpatterns = [
     path('', index, name='index'),
+    path('search/', search, name='search'),
     path('register/', register, name='register'),
     path('login/', login, name='login'),
     path('logout/', logout, name='logout'),
     path('change_password/', change_password, name='change_password'),
     path('dashboard/', dashboard, name='dashboard'),
     path('change_profile_pic/', change_profile_pic, name='change_profile_pic'),
+    path('upload_progress/', upload_progress, name='upload_progress'),
     path('resume/<int:user_profile_id>/', resume, name='resume'),
+    path('resume/<int:user_profile_id>/download/', download_resume, name='download_resume'),
+    path('resume/<int:user_profile_id>/comments/', comments, name='comments'),
     path('comment/', comment, name='comment'),
+    path('comment/<int:comment_id>/delete/', delete_comment, name='delete_comment'),
     path('doc/', doc, name='doc'),
     path('about/', about, name='about'),
-    path('error/<error_title>', error, name='error')
+    path('cache/stats/', cache_stats, name='cache_stats'),
+    path('metrics/', metrics, name='metrics'),
+    path('error/<error_title>', error, name='error'),
+
+    # read-only JSON API
+    path('api/v1/resumes/', api.resumes, name='api_resumes'),
+    path('api/v1/resumes/<int:user_profile_id>/', api.resume, name='api_resume'),
+    path('api/v1/resumes/<int:user_profile_id>/comments/', api.comments, name='api_comments'),
 ]
\ No newline at end of file
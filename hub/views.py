@@ -1,11 +1,24 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden, JsonResponse, Http404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+from django.core.cache import cache
 from django.urls import reverse
 from django.contrib.auth import authenticate, login as login_user, logout as logout_user
 from django.contrib.auth.decorators import login_required
-import re
 from hub.models import *
 from hub.forms import *
+from hub.feed import recent_resumes, resume_comments, clean_cursor, FEED_ORDERS
+from hub.search import search_resumes, MAX_SEARCH_PAGE
+from hub.similar import similar_resumes
+from hub.downloads import serve_file
+from hub.storage import clean_extension
+from hub.uploads import bounded_uploads, progress_key, RESUME_UPLOAD, PICTURE_UPLOAD
+from hub.tasks import extract_resume_text, generate_avatars
+from hub.caching import cached_resume_fragment, cached_fragments, resume_cache_stats, fragment_cache_stats
+from hub.conditional import conditional_page, index_validators, resume_validators
+from hub.metrics import metrics as request_metrics, ALLOWED_ADDRESSES
 
 
 # Errors Dictionary!
@@ -17,22 +30,66 @@ ERRORS = {
     'not_same_passwords': 'oops! the two passwords you entered are different!'
 }
 
+@conditional_page(index_validators)
 def index(request):
     ''' Index page of website '''
     data = dict()
 
-    # Fetch resumes from database ordered by time (20 most recent resumes first)
-    resumes = UserProfile.objects.order_by('updated_at')
-    resumes = resumes.reverse()
-    if len(resumes) > 20:
-        resumes = resumes[:20]
+    # order of the feed: recent (default), discussed or active
+    order = request.GET.get('order')
+    if order not in FEED_ORDERS:
+        order = 'recent'
 
-    resumes = [to_dict(resume) for resume in resumes if resume.resume_file]
+    # Fetch resumes from database in that order (20 resumes per page),
+    # "before" is the cursor of the previous page for the next resumes
+    resumes, next_cursor = recent_resumes(cursor=request.GET.get('before'), order=order)
+
+    # the cards of unchanged resumes come from the cache
     if len(resumes) > 0:
-        data['resumes'] = resumes
+        data['cards'] = resume_cards(resumes)
+
+    data['next_cursor'] = next_cursor
+    data['order'] = order
 
     return render(request, 'hub/index.html', context=data)
 
+def search(request):
+    ''' Full-text search of resumes (the JSON endpoint is ?format=json) '''
+    data = dict()
+
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    page = min(page, MAX_SEARCH_PAGE + 1)
+
+    profiles, has_next = search_resumes(query, page=page)
+    resumes = [to_dict(resume, with_description=False) for resume in profiles]
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'page': page,
+            'has_next': has_next,
+            'resumes': [
+                {
+                    'id': resume['id'],
+                    'fullname': resume['fullname'],
+                    'summary': resume['summary'],
+                    'url': reverse('hub:resume', kwargs={'user_profile_id': resume['id']}),
+                }
+                for resume in resumes
+            ],
+        })
+
+    data['query'] = query
+    data['cards'] = resume_cards(profiles)
+    data['page'] = page
+    data['has_next'] = has_next
+
+    return render(request, 'hub/search.html', context=data)
+
 def register(request):
     ''' Register! '''
     data = dict()
@@ -137,11 +194,16 @@ def logout(request):
     return redirect(reverse('hub:index'))
 
 @login_required
+@bounded_uploads(resume_file=RESUME_UPLOAD)
 def dashboard(request):
     ''' Dashboard of the logged-in user for uploading resume file '''
     data = dict()
 
     if request.method == 'POST':
+        if request.upload_error:
+            # the upload was stopped by the upload handler
+            return render(request, 'hub/error.html', context={'error_message_alter': request.upload_error})
+
         # create resume form object from posted data
         resume_form = ResumeForm(data=request.POST)
 
@@ -151,12 +213,18 @@ def dashboard(request):
                 # user has a UserProfile object
                 # save new resume file and description
                 profile.description = resume_form.cleaned_data['description']
+                profile.summary = summarize(profile.description)
 
                 if 'resume_file' in request.FILES:
                     profile.resume_file = request.FILES['resume_file']
+                    profile.resume_text = ''
 
                 profile.save()
 
+                if 'resume_file' in request.FILES:
+                    # extract the text of the new file outside of this request
+                    extract_resume_text(profile)
+
                 data['current_file'] = profile.resume_file
 
             else:
@@ -164,12 +232,18 @@ def dashboard(request):
                 #  create a UserProfile object and save resume file and description in it
                 profile = resume_form.save(commit=False)
                 profile.user = request.user
+                profile.summary = summarize(profile.description)
 
                 if 'resume_file' in request.FILES:
                     profile.resume_file = request.FILES['resume_file']
+                    profile.resume_text = ''
 
                 profile.save()
 
+                if 'resume_file' in request.FILES:
+                    # extract the text of the new file outside of this request
+                    extract_resume_text(profile)
+
                 data['current_file'] = profile.resume_file
 
         else:
@@ -265,6 +339,7 @@ def change_password(request):
     return render(request, 'hub/change_password.html', context=data)
 
 @login_required
+@bounded_uploads(picture=PICTURE_UPLOAD)
 def change_profile_pic(request):
     ''' Changes profile picture of the logged-in user '''
     data = dict()
@@ -275,6 +350,10 @@ def change_profile_pic(request):
     profile_pic_changed = False
 
     if request.method == 'POST':
+        if request.upload_error:
+            # the upload was stopped by the upload handler
+            return render(request, 'hub/error.html', context={'error_message_alter': request.upload_error})
+
         # create profile pic form object from posted data
         change_profile_pic_form = ChangeProfilePicForm(data=request.POST)
 
@@ -287,6 +366,10 @@ def change_profile_pic(request):
 
                 profile.save()
 
+                if 'picture' in request.FILES:
+                    # resize the new picture outside of this request
+                    generate_avatars(profile)
+
                 data['current_picture'] = profile.resume_file
 
             else:
@@ -299,6 +382,10 @@ def change_profile_pic(request):
 
                 profile.save()
 
+                if 'picture' in request.FILES:
+                    # resize the new picture outside of this request
+                    generate_avatars(profile)
+
                 data['current_picture'] = profile.picture
 
             profile_pic_changed = True
@@ -329,30 +416,97 @@ def change_profile_pic(request):
 
     return render(request, 'hub/change_profile_pic.html', context=data)
 
+@conditional_page(resume_validators)
 def resume(request, user_profile_id):
     ''' Webpage of a specific resume '''
     data = dict()
 
-    # get the resume that is requested
-    resume = UserProfile.objects.get(pk=user_profile_id)
-    data['resume'] = to_dict(resume)
-
-    # get the comments on that resume
-    comments = Comment.objects.filter(resume=resume).order_by('created_at')
-    data['comments'] = comments.reverse()
+    # the resume and its comments are served from cache until one of them changes
+    resume_body, commentable = cached_resume_fragment(
+        user_profile_id,
+        lambda: render_resume_body(user_profile_id)
+    )
+    data['resume_body'] = mark_safe(resume_body)
+    data['commentable'] = commentable
+    data['resume_id'] = user_profile_id
 
     # create empty comment form
     data['comment_form'] = CommentForm()
 
     return render(request, 'hub/resume.html', context=data)
 
+def render_resume_body(user_profile_id):
+    ''' Renders a resume and the comments on it (the cached part of the resume page) '''
+    data = dict()
+
+    # get the resume that is requested
+    resume = get_object_or_404(UserProfile.objects.select_related('user').defer('resume_text'), pk=user_profile_id)
+    data['resume'] = to_dict(resume)
+
+    # get the first page of comments on that resume (newest first)
+    data['comments'], data['next_cursor'] = resume_comments(resume.id)
+    data['comment_blocks'] = comment_blocks(data['comments'])
+    data['resume_id'] = resume.id
+
+    # precomputed by hub.similar, one lookup
+    if resume.resume_file:
+        data['similar_resumes'] = [to_dict(similar, with_description=False) for similar in similar_resumes(resume.id)]
+
+    return render_to_string('hub/resume_body.html', context=data), bool(resume.resume_file)
+
+def download_resume(request, user_profile_id):
+    ''' Downloading the resume file of a resume '''
+    resume = get_object_or_404(
+        UserProfile.objects.select_related('user').only('id', 'resume_file', 'user__first_name', 'user__last_name'),
+        pk=user_profile_id
+    )
+    if not resume.resume_file:
+        raise Http404('This resume has no file')
+
+    # stored files are named by their content, the download is named after the user
+    filename = '{0} resume{1}'.format(resume.user.get_full_name() or 'Resume Hub', clean_extension(resume.resume_file.name))
+
+    return serve_file(request, resume.resume_file.name, filename=filename)
+
+def comments(request, user_profile_id):
+    ''' Next page of comments on a resume as an HTML fragment (or JSON) for "load more" '''
+    # no cache versions for ids of missing resumes
+    get_object_or_404(UserProfile.objects.only('id'), pk=user_profile_id)
+    cursor = clean_cursor(request.GET.get('after'))
+
+    if request.GET.get('format') == 'json' or 'application/json' in request.META.get('HTTP_ACCEPT', ''):
+        comments, next_cursor = resume_comments(user_profile_id, cursor=cursor)
+        return JsonResponse({
+            'comments': [comment_to_dict(comment) for comment in comments],
+            'next_cursor': next_cursor,
+        })
+
+    def render_comments():
+        data = dict()
+        comments, data['next_cursor'] = resume_comments(user_profile_id, cursor=cursor)
+        data['comment_blocks'] = comment_blocks(comments)
+        data['resume_id'] = user_profile_id
+        return render_to_string('hub/comments.html', context=data)
+
+    # pages of comments are cached with the resume page
+    fragment = cached_resume_fragment(user_profile_id, render_comments, part='comments:{0}'.format(cursor))
+
+    return HttpResponse(fragment)
+
 @login_required
 def comment(request):
-    ''' Commenting on a resume (login required!) '''
+    '''
+    Commenting on a resume (login required!), script.js posts with XHR
+    and gets only the new comment (an HTML fragment, or JSON if it accepts
+    JSON) instead of the redirect to the whole resume page
+    '''
     # Get current user
     user = request.user
 
     if request.method == 'POST':
+        partial = request.is_ajax()
+        as_json = 'application/json' in request.META.get('HTTP_ACCEPT', '')
+
         # create comment form object from posted data
         comment_form = CommentForm(data=request.POST)
 
@@ -361,10 +515,15 @@ def comment(request):
             comment = comment_form.save(commit=False)
             comment.user = user
             resume_id = request.POST['resume_id']
-            resume = UserProfile.objects.get(pk=resume_id)
-            comment.resume = resume
+            comment.resume = get_object_or_404(UserProfile.objects.only('id'), pk=resume_id)
             comment.save()
 
+            if as_json:
+                return JsonResponse(comment_to_dict(comment), status=201)
+            if partial:
+                # the block of the comment as the page shows it (and caches it for the next render)
+                return HttpResponse(comment_blocks([comment])[0], status=201)
+
             return redirect(
                 reverse(
                     'hub:resume',
@@ -376,6 +535,11 @@ def comment(request):
 
         else:
             # form is not valid
+            if as_json:
+                return JsonResponse({'errors': comment_form.errors}, status=400)
+            if partial:
+                return HttpResponse(comment_form.errors.as_ul(), status=400)
+
             error_data = {
                 'error_message_alter': comment_form.errors.as_ul()
             }
@@ -384,6 +548,41 @@ def comment(request):
     else:
         return redirect(reverse('hub:index'))
 
+@login_required
+def delete_comment(request, comment_id):
+    ''' Deletes a comment (by its writer or a special user) '''
+    comment = get_object_or_404(Comment, pk=comment_id)
+
+    if request.method == 'POST':
+        profile = getattr(request.user, 'userprofile', None)
+        if comment.user_id != request.user.id and not (profile and profile.is_special):
+            return redirect(
+                reverse(
+                    'hub:error',
+                    kwargs={
+                        'error_title': 'restricted_section'
+                    }
+                )
+            )
+
+        comment.delete()
+
+    return redirect(
+        reverse(
+            'hub:resume',
+            kwargs={
+                'user_profile_id': comment.resume_id
+            }
+        )
+    )
+
+@login_required
+def upload_progress(request):
+    ''' Progress of an upload of the logged-in user (polled by script.js) '''
+    progress = cache.get(progress_key(request, request.GET.get('X-Progress-ID', '')))
+
+    return JsonResponse(progress or {'received': 0, 'total': None, 'done': False, 'error': None})
+
 def doc(request):
     ''' serve the documentation of the project for special users '''
     data = dict()
@@ -439,6 +638,48 @@ def about(request):
 
     return render(request, 'hub/about.html', context=data)
 
+def cache_stats(request):
+    ''' hit/miss counters of the resume and fragment caches (of this process) for special users '''
+    profile = getattr(request.user, 'userprofile', None)
+    if not profile or not profile.is_special:
+        return redirect(
+            reverse(
+                'hub:error',
+                kwargs={
+                    'error_title': 'restricted_section'
+                }
+            )
+        )
+
+    return JsonResponse({'resume': resume_cache_stats.as_dict(), 'fragment': fragment_cache_stats.as_dict()})
+
+def metrics(request):
+    '''
+    Request metrics of this process in the Prometheus text format
+    (?format=json: the render times per template and the sampled slowest
+    requests with their SQL queries and templates)
+    for special users, staff and the clients of HUB_METRICS_ALLOWED_IPS
+    '''
+    profile = getattr(request.user, 'userprofile', None)
+    allowed = (
+        request.user.is_staff
+        or (profile and profile.is_special)
+        or request.META.get('REMOTE_ADDR') in ALLOWED_ADDRESSES
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'templates': request_metrics.template_times(),
+            'slowest_requests': request_metrics.slowest_requests(),
+        })
+
+    return HttpResponse(
+        request_metrics.prometheus(cache_stats={'resume': resume_cache_stats, 'fragment': fragment_cache_stats}),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 def error(request, error_title):
     ''' webpage for show errors to user '''
     data = dict()
@@ -449,17 +690,58 @@ def error(request, error_title):
     return render(request, 'hub/error.html', context=data)
 
 
-def summary(post_body):
-    ''' Summerizes a long text with regular expressions '''
-    return re.search(r'^.{0,180}[\s]', post_body).group()
-
-def to_dict(resume):
+def to_dict(resume, with_description=True):
     ''' converts a database object to a dict object '''
-    return {
+    data = {
         'id': resume.id,
         'fullname': resume.user.get_full_name(),
         'picture': resume.picture,
         'resume_file': resume.resume_file,
-        'summary': summary(resume.description + ' '),
-        'description': resume.description,
+        'summary': resume.summary,
+        'comment_count': resume.comment_count,
+        'last_comment_at': resume.last_comment_at,
+        'last_comment_ago': timesince(resume.last_comment_at) if resume.last_comment_at else None,
+    }
+
+    if with_description:
+        data['description'] = resume.description
+
+    return data
+
+def resume_cards(resumes):
+    ''' the rendered cards of resumes (with their users), from the cache when they are unchanged '''
+    items = []
+    for resume in resumes:
+        card = to_dict(resume, with_description=False)
+        # comment counts, names and avatar variants change without updated_at,
+        # the time since the last comment changes as time goes by
+        key = (
+            resume.id, resume.updated_at, card['fullname'], resume.picture.name, resume.picture_variants,
+            card['comment_count'], card['last_comment_ago'],
+        )
+        items.append((key, {'resume': card}))
+
+    return cached_fragments('hub/resume_card.html', items)
+
+def comment_blocks(comments):
+    ''' the rendered comments (with their users and profiles), from the cache when they are unchanged '''
+    items = []
+    for comment in comments:
+        profile = getattr(comment.user, 'userprofile', None)
+        picture = (profile.picture.name, profile.picture_variants) if profile else None
+        key = (comment.id, comment.updated_at, comment.user_id, comment.user.get_full_name(), picture)
+        items.append((key, {'comment': comment}))
+
+    return cached_fragments('hub/comment.html', items)
+
+def comment_to_dict(comment):
+    ''' converts a comment (with its user and profile selected) to a dict object '''
+    profile = getattr(comment.user, 'userprofile', None)
+
+    return {
+        'id': comment.id,
+        'fullname': comment.user.get_full_name(),
+        'picture': profile.picture.url if profile and profile.picture else None,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
     }
@@ -17,3 +17,103 @@ $(document).ready(function(){
     }
   });
 });
+
+// "Load more comments" link: replaces itself with the next page of comments
+$(document).on('click', '.load_more_comments', function(event){
+  event.preventDefault();
+  var link = $(this);
+  $.get(link.attr('href'), function(html){
+    link.closest('p').replaceWith(html);
+    showDeleteButtons();
+  });
+});
+
+// Delete buttons of comments: the comments are cached for everyone,
+// so the buttons of the user's own comments (or all, for special users) are shown here
+function showDeleteButtons() {
+  var page = $('#resume_body');
+  var userId = String(page.data('user-id') || '');
+  if (!userId) {
+    return;
+  }
+  page.find('form.delete_comment').each(function(){
+    if (page.data('special') || String($(this).data('user-id')) === userId) {
+      $(this).show();
+    }
+  });
+}
+
+$(document).ready(showDeleteButtons);
+
+$(document).on('submit', 'form.delete_comment', function(){
+  var token = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+  if (token) {
+    $('<input type="hidden" name="csrfmiddlewaretoken">').val(token[1]).appendTo(this);
+  }
+});
+
+// Submits a form without the submit handlers (its button named "submit" hides form.submit)
+function postForm(form) {
+  HTMLFormElement.prototype.submit.call(form.get(0));
+}
+
+// Comment form: posts the comment with XHR and adds the returned comment
+// at the top of the comments (newest first), without reloading the page
+$(document).on('submit', 'form.comment_form', function(event){
+  event.preventDefault();
+  var form = $(this);
+  var submit = form.find('input[type="submit"]').prop('disabled', true);
+  var errors = form.find('.comment_errors').empty();
+
+  $.ajax({
+    url: form.attr('action'),
+    method: 'POST',
+    data: form.serialize(),
+    dataType: 'html'
+  }).done(function(html, status, xhr){
+    if (xhr.status !== 201) {
+      // redirected (to log in again): the normal post shows what happened
+      postForm(form);
+      return;
+    }
+    $('#comments .no_comments').remove();
+    $('#comments').prepend(html);
+    form.find('textarea').val('');
+    showDeleteButtons();
+  }).fail(function(xhr){
+    if (xhr.status === 400) {
+      errors.html(xhr.responseText);
+    }
+    else {
+      // the normal post (not handled by this script) shows what happened
+      postForm(form);
+    }
+  }).always(function(){
+    submit.prop('disabled', false);
+  });
+});
+
+// Upload forms: show the progress of the upload while the browser sends it
+$(document).on('submit', 'form.progress_upload', function(){
+  var form = $(this);
+  var progressId = Date.now().toString(36) + Math.random().toString(36).substring(2);
+  var action = form.attr('action');
+  form.attr('action', action + (action.indexOf('?') < 0 ? '?' : '&') + 'X-Progress-ID=' + progressId);
+
+  var label = form.find('.upload_progress');
+  var poll = function(){
+    $.getJSON(form.data('progress-url'), {'X-Progress-ID': progressId}, function(progress){
+      if (progress.error) {
+        label.text(progress.error);
+        return;
+      }
+      if (progress.total) {
+        label.text(Math.min(100, Math.round(100 * progress.received / progress.total)) + '%');
+      }
+      if (!progress.done) {
+        setTimeout(poll, 500);
+      }
+    });
+  };
+  setTimeout(poll, 500);
+});